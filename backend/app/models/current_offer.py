@@ -0,0 +1,40 @@
+# current_offer.py - database model for the latest price at each retailer
+# one row per (product, retailer), kept in sync with price_histories on every write
+# so reads don't have to scan the full history
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship, synonym
+from database import Base
+
+
+class CurrentOffer(Base):
+    __tablename__ = "current_offers"
+
+    # one offer per product per retailer
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    retailer = Column(String(100), primary_key=True)
+
+    # copy of the newest price_histories row for this pair
+    price_history_id = Column(Integer, index=True)
+    price = Column(Float)
+    original_price = Column(Float, nullable=True)
+    discount_percent = Column(Float, default=0)
+    url = Column(String(500), nullable=True)
+    in_stock = Column(String(20), default="in_stock")
+    rating = Column(Float, nullable=True)
+    review_count = Column(Integer, nullable=True)
+    created_at = Column(DateTime)
+
+    # lets PriceHistorySchema read .id like it does on a PriceHistory row
+    id = synonym("price_history_id")
+
+    # link to product table
+    product = relationship("Product", back_populates="current_offers")
+
+    # catalog retailer filter / facet: which products a retailer has (in stock)
+    __table_args__ = (
+        Index("ix_current_offers_retailer_stock", "retailer", "in_stock", "product_id"),
+    )
+
+    def __repr__(self):
+        return f"<CurrentOffer(product_id={self.product_id}, retailer={self.retailer}, price={self.price})>"
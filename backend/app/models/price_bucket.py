@@ -0,0 +1,31 @@
+# price_bucket.py - database model for downsampled price history
+# old price_histories rows are rolled up into hourly, then daily, OHLC buckets
+# per (product, retailer) by the compaction job (app/services/compaction.py)
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
+from database import Base
+
+
+class PriceBucket(Base):
+    __tablename__ = "price_buckets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
+    retailer = Column(String(100))
+    resolution = Column(String(10))  # "hour" or "day"
+    bucket_start = Column(DateTime)
+
+    # first / highest / lowest / last price in the bucket, plus the mean over all samples
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    avg_price = Column(Float)
+    samples = Column(Integer)
+
+    __table_args__ = (
+        UniqueConstraint("product_id", "retailer", "resolution", "bucket_start", name="uq_price_bucket"),
+    )
+
+    def __repr__(self):
+        return f"<PriceBucket(product_id={self.product_id}, retailer={self.retailer}, {self.resolution} {self.bucket_start})>"
@@ -1,7 +1,9 @@
 # product.py - database model for products
 # stores product info like name, description, category
+# lowest_price / best_discount / in_stock summarize current_offers so the catalog can
+# filter and sort on one table, see app/services/catalog.py
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -21,12 +23,30 @@ class Product(Base):
     tags = Column(String(500), nullable=True)  # comma-separated tags
     rating = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    # summary of current_offers, refreshed whenever they change
+    lowest_price = Column(Float, nullable=True)
+    best_discount = Column(Float, nullable=True)
+    in_stock = Column(Boolean, default=False)
 
     # links to other tables
     price_histories = relationship("PriceHistory", back_populates="product", cascade="all, delete-orphan")
     alerts = relationship("Alert", back_populates="product", cascade="all, delete-orphan")
     recommendations = relationship("Recommendation", back_populates="product", cascade="all, delete-orphan")
+    current_offers = relationship("CurrentOffer", back_populates="product", cascade="all, delete-orphan")
+    listings = relationship("ProductListing", back_populates="product", cascade="all, delete-orphan")
+
+    # catalog sorts, alone and inside a category / brand filter (id is the keyset tie-breaker)
+    __table_args__ = (
+        Index("ix_products_lowest_price_id", "lowest_price", "id"),
+        Index("ix_products_best_discount_id", "best_discount", "id"),
+        Index("ix_products_rating_id", "rating", "id"),
+        Index("ix_products_category_lowest_price", "category", "lowest_price", "id"),
+        Index("ix_products_category_best_discount", "category", "best_discount", "id"),
+        Index("ix_products_category_rating", "category", "rating", "id"),
+        Index("ix_products_brand_lowest_price", "brand", "lowest_price", "id"),
+    )
 
     def __repr__(self):
         return f"<Product(id={self.id}, name={self.name})>"
@@ -0,0 +1,36 @@
+# product_listing.py - database model for retailer listings
+# one row per upstream item (eBay itemId, Amazon ASIN, Walmart/Google product id), pointing
+# at the canonical product it was matched to. Re-fetching a known listing updates this row
+# instead of creating another product, see ListingService in business.py
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from database import Base
+from datetime import datetime
+
+
+class ProductListing(Base):
+    __tablename__ = "product_listings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    retailer = Column(String(100))
+    external_id = Column(String(255))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
+
+    # what the retailer showed the last time we saw it
+    title = Column(String(255), nullable=True)
+    url = Column(String(500), nullable=True)
+    price = Column(Float, nullable=True)
+    in_stock = Column(String(20), default="in_stock")
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+
+    # link to product table
+    product = relationship("Product", back_populates="listings")
+
+    __table_args__ = (
+        UniqueConstraint("retailer", "external_id", name="uq_listing_retailer_external"),
+    )
+
+    def __repr__(self):
+        return f"<ProductListing(retailer={self.retailer}, external_id={self.external_id}, product_id={self.product_id})>"
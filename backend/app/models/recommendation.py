@@ -1,7 +1,7 @@
 # recommendation.py - database model for product recommendations
 # stores similar products that might interest the user
 
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, String
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, String, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -20,5 +20,10 @@ class Recommendation(Base):
     # link to product table
     product = relationship("Product", back_populates="recommendations")
 
+    # serves "top recommendations for a product" straight from the index
+    __table_args__ = (
+        Index("ix_recommendations_product_score", "product_id", "score"),
+    )
+
     def __repr__(self):
         return f"<Recommendation(product_id={self.product_id}, type={self.recommendation_type})>"
@@ -2,12 +2,12 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionRoute
 from app.services.business import AlertService, ProductService
 from app.schemas.alert import AlertSchema, AlertCreateSchema
 from typing import List
 
-router = APIRouter(prefix="/api/alerts", tags=["alerts"])
+router = APIRouter(prefix="/api/alerts", tags=["alerts"], route_class=SessionRoute)
 
 
 # get all active alerts
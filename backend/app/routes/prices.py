@@ -1,45 +1,130 @@
 # prices.py - api endpoints for price data
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_read_db, get_async_read_db, SessionRoute
+from app.models.price_history import PriceHistory
 from app.services.business import PriceHistoryService, ProductService
-from app.schemas.price_history import PriceHistorySchema
-from typing import List
+from app.services.aggregator import DataAggregationService
+from app.services import analytics, fast_json
+from app.services.http_cache import validate_product, validate_history
+from app.schemas.price_history import PriceHistorySchema, PriceBucketSchema, PriceAnalyticsBatchSchema
+from config import settings
+from typing import List, Union
 
-router = APIRouter(prefix="/api/prices", tags=["prices"])
+router = APIRouter(prefix="/api/prices", tags=["prices"], route_class=SessionRoute)
+
+
+# live prices for a search term from every retailer, queried at the same time
+@router.get("/compare")
+async def compare_prices(q: str, use_serpapi: bool = False):
+    if not q or len(q) < 2:
+        raise HTTPException(status_code=400, detail="Search query too short")
+
+    return await DataAggregationService.compare_prices_async(q, use_serpapi)
 
 
 # get prices from all stores for one product
-@router.get("/comparison/{product_id}", response_model=List[PriceHistorySchema])
-def get_price_comparison(product_id: int, db: Session = Depends(get_db)):
-    product = ProductService.get_product_by_id(db, product_id)
+@router.get("/comparison/{product_id}", response_model=List[PriceHistorySchema],
+            dependencies=[Depends(validate_product)])
+async def get_price_comparison(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    product = await ProductService.get_product_by_id_async(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    prices = PriceHistoryService.get_price_comparison(db, product_id)
+    prices = await PriceHistoryService.get_price_comparison_async(db, product_id)
     return prices
 
 
 # get price changes over time
-@router.get("/history/{product_id}", response_model=List[PriceHistorySchema])
-def get_price_history(product_id: int, days: int = 30, db: Session = Depends(get_db)):
+# resolution: raw (every stored point), hour / day (OHLC buckets), or auto (by range)
+@router.get("/history/{product_id}", response_model=Union[List[PriceHistorySchema], List[PriceBucketSchema]],
+            dependencies=[Depends(validate_history)])
+async def get_price_history(response: Response, product_id: int, days: int = 30, resolution: str = "raw",
+                            db: AsyncSession = Depends(get_async_read_db)):
+    product = await ProductService.get_product_by_id_async(db, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if resolution not in ("raw", "hour", "day", "auto"):
+        raise HTTPException(status_code=400, detail="resolution must be raw, hour, day or auto")
+
+    if resolution == "auto":
+        resolution = PriceHistoryService.history_resolution(days)
+    fast = fast_json.enabled()
+    if resolution == "raw":
+        if fast:
+            rows = await PriceHistoryService.get_price_history_async(
+                db, product_id, days, columns=fast_json.columns(PriceHistory, PriceHistorySchema))
+            return fast_json.response(fast_json.rows_to_dicts(PriceHistorySchema, rows), response)
+        return await PriceHistoryService.get_price_history_async(db, product_id, days)
+    buckets = await PriceHistoryService.get_price_history_buckets_async(db, product_id, days, resolution)
+    if fast:
+        names = fast_json.fields(PriceBucketSchema)
+        return fast_json.response([{name: bucket[name] for name in names} for bucket in buckets], response)
+    return buckets
+
+
+def _parse_percentiles(values):
+    try:
+        percentiles = [float(v) for v in values]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Percentiles must be numbers")
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+    return percentiles
+
+
+def _check_windows(days: int, window_days: int):
+    if days < 1 or days > settings.analytics_max_days:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {settings.analytics_max_days}")
+    if window_days < 1 or window_days > days:
+        raise HTTPException(status_code=400, detail="window_days must be between 1 and days")
+
+
+# price stats for one product: per retailer + overall, and a daily series for charts
+@router.get("/analytics/{product_id}")
+def get_price_analytics(product_id: int, days: int = 90, window_days: int = 7,
+                        percentiles: str = "10,25,75,90", db: Session = Depends(get_read_db)):
     product = ProductService.get_product_by_id(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    history = PriceHistoryService.get_price_history(db, product_id, days)
-    return history
+    _check_windows(days, window_days)
+
+    stats = analytics.price_stats(db, [product_id], days, window_days,
+                                  _parse_percentiles(p for p in percentiles.split(",") if p.strip()))
+    if product_id not in stats:
+        raise HTTPException(status_code=404, detail="No price data available")
+    result = stats[product_id]
+    result["daily"] = analytics.daily_series(db, product_id, days, window_days)
+    return result
+
+
+# price stats for many products in one call (deal pages)
+@router.post("/analytics/batch")
+def get_price_analytics_batch(body: PriceAnalyticsBatchSchema, db: Session = Depends(get_read_db)):
+    if len(body.product_ids) > settings.analytics_max_batch:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {settings.analytics_max_batch} product ids per request")
+    _check_windows(body.days, body.window_days)
+
+    product_ids = list(dict.fromkeys(body.product_ids))
+    stats = analytics.price_stats(db, product_ids, body.days, body.window_days,
+                                  _parse_percentiles(body.percentiles))
+    return {
+        "results": stats,
+        "missing": [product_id for product_id in product_ids if product_id not in stats]
+    }
 
 
 # find the cheapest price
-@router.get("/lowest/{product_id}", response_model=PriceHistorySchema)
-def get_lowest_price(product_id: int, db: Session = Depends(get_db)):
-    product = ProductService.get_product_by_id(db, product_id)
+@router.get("/lowest/{product_id}", response_model=PriceHistorySchema, dependencies=[Depends(validate_product)])
+async def get_lowest_price(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    product = await ProductService.get_product_by_id_async(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    lowest = PriceHistoryService.get_lowest_price(db, product_id)
+    lowest = await PriceHistoryService.get_lowest_price_async(db, product_id)
     if not lowest:
         raise HTTPException(status_code=404, detail="No price data available")
     
@@ -47,13 +132,13 @@ def get_lowest_price(product_id: int, db: Session = Depends(get_db)):
 
 
 # find the biggest discount
-@router.get("/best-deal/{product_id}", response_model=PriceHistorySchema)
-def get_best_deal(product_id: int, db: Session = Depends(get_db)):
-    product = ProductService.get_product_by_id(db, product_id)
+@router.get("/best-deal/{product_id}", response_model=PriceHistorySchema, dependencies=[Depends(validate_product)])
+async def get_best_deal(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    product = await ProductService.get_product_by_id_async(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    best = PriceHistoryService.get_best_deal(db, product_id)
+    best = await PriceHistoryService.get_best_deal_async(db, product_id)
     if not best:
         raise HTTPException(status_code=404, detail="No price data available")
     
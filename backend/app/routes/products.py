@@ -1,13 +1,160 @@
+# products.py - api endpoints for products
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.product import Product
+from app.models.price_history import PriceHistory
+from app.models.current_offer import CurrentOffer
+from database import get_db, get_read_db, get_async_read_db, SessionRoute
+from app.services.business import ProductService, PriceHistoryService
+from app.services.aggregator import DataAggregationService
+from app.services.refresh_worker import record_view
+from app.services import catalog, fast_json
+from app.services.http_cache import validate_catalog, validate_product, validate_details
+from app.schemas.product import ProductSchema, ProductCreateSchema, CatalogQuerySchema, ProductDetailsBatchSchema
+from config import settings
+from typing import List, Optional
+
+router = APIRouter(prefix="/api/products", tags=["products"], route_class=SessionRoute)
+
+
+# turn a price row into the offer shape the frontend expects
+def _offer_to_dict(price):
+    return {
+        "sellerId": price.retailer,
+        "price": price.price,
+        "stock": 1 if price.in_stock == "in_stock" else 0,
+        "condition": "new",  # or map from price/retailer if available
+        "originalPrice": price.original_price,
+        "shipping": None,  # Add if available
+        "deliveryDays": None  # Add if available
+    }
+
+
+# turn a product + its latest offers into the normalized frontend dict
+def _product_to_dict(product, prices):
+    return {
+        "id": str(product.id),
+        "name": product.name,
+        "brand": product.brand or "",
+        "category": product.category,
+        "image": product.image_url or "",
+        "description": product.description,
+        "rating": product.rating or 0,
+        "reviewCount": 0,  # Add if available
+        "prices": [_offer_to_dict(price) for price in prices],
+        "features": [],  # Add if available
+        "specs": {},  # Add if available
+        "tags": (product.tags.split(",") if product.tags else []),
+    }
+
+
+# what the two functions above read, for the plain-row fast path (fast_json.py)
+PRODUCT_DICT_COLUMNS = [Product.id, Product.name, Product.brand, Product.category, Product.image_url,
+                        Product.description, Product.rating, Product.tags]
+OFFER_DICT_COLUMNS = [CurrentOffer.product_id, CurrentOffer.retailer, CurrentOffer.price,
+                      CurrentOffer.in_stock, CurrentOffer.original_price]
+
+
+# returns all products, normalized for frontend
+# optional keyset pagination: pass limit, then the X-Next-Cursor header value as cursor
+# (the hot read routes are async and use the async session, writes stay sync)
+@router.get("/", response_model=list, dependencies=[Depends(validate_catalog)])
+async def get_all_products(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # fast path: plain rows instead of ORM objects, encoded straight into the response
+    fast = fast_json.enabled()
+    products = await ProductService.get_products_page_async(
+        db, limit=limit, after_id=cursor, columns=PRODUCT_DICT_COLUMNS if fast else None)
+
+    # one query against current_offers for the whole page
+    # (unpaginated requests skip the IN list and read every product's offers)
+    product_ids = [p.id for p in products] if limit or cursor is not None else None
+    latest = await PriceHistoryService.get_current_offers_async(
+        db, product_ids, columns=OFFER_DICT_COLUMNS if fast else None)
+
+    if limit and len(products) == limit:
+        response.headers["X-Next-Cursor"] = str(products[-1].id)
+
+    result = [_product_to_dict(product, latest.get(product.id, [])) for product in products]
+    return fast_json.response(result, response) if fast else result
+
+
+# one page of the catalog with filters, sorting and facet counts, normalized for frontend
+# list filters repeat the parameter (?category=Phones&category=Laptops), the next page is
+# ?cursor=<next_cursor> with the same filters and sort (total and facets are null there)
+@router.get("/catalog", dependencies=[Depends(validate_catalog)])
+async def get_catalog(
+    q: Optional[str] = None,
+    category: List[str] = Query([]),
+    brand: List[str] = Query([]),
+    retailer: List[str] = Query([]),
+    tags: List[str] = Query([]),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: Optional[bool] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    sort: str = "id",
+    limit: int = Query(settings.catalog_page_size, ge=1, le=settings.catalog_max_page_size),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    query = CatalogQuerySchema(q=q, category=category, brand=brand, retailer=retailer, tags=tags,
+                               min_price=min_price, max_price=max_price, in_stock=in_stock,
+                               min_rating=min_rating, sort=sort, limit=limit, cursor=cursor)
+    try:
+        page = await catalog.browse_async(db, query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    latest = await PriceHistoryService.get_current_offers_async(db, [p.id for p in page["products"]])
+    return {
+        "items": [_product_to_dict(product, latest.get(product.id, [])) for product in page["products"]],
+        "total": page["total"],
+        "next_cursor": page["next_cursor"],
+        "facets": page["facets"],
+    }
+
+
+# product, current offers, lowest price, best deal and optional history for one or many
+# products in one response (?ids=1&ids=2), instead of a request per widget
+# history_days adds price history, resolution works like /api/prices/history
+@router.get("/details", response_model=ProductDetailsBatchSchema, dependencies=[Depends(validate_details)])
+async def get_product_details(
+    ids: List[int] = Query([]),
+    history_days: Optional[int] = Query(None, ge=1),
+    resolution: str = "raw",
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    if not ids:
+        raise HTTPException(status_code=400, detail="Pass at least one product id (?ids=1&ids=2)")
+    if len(ids) > settings.details_max_ids:
+        raise HTTPException(status_code=400, detail=f"At most {settings.details_max_ids} product ids per request")
+    if resolution not in ("raw", "hour", "day", "auto"):
+        raise HTTPException(status_code=400, detail="resolution must be raw, hour, day or auto")
+
+    product_ids = list(dict.fromkeys(ids))
+    details = await ProductService.get_product_details_async(db, product_ids, history_days, resolution)
+    for product_id in details:
+        record_view(product_id)
+    return {
+        "results": details,
+        "missing": [product_id for product_id in product_ids if product_id not in details]
+    }
 
-# ...existing code...
 
 # DEBUG: Return all products and their price histories as seen by the API
 @router.get("/debug/all-products", response_model=list)
-def debug_all_products(db: Session = Depends(get_db)):
-    products = db.query(ProductService.__dict__["__globals__"]["Product"]).all()
+def debug_all_products(db: Session = Depends(get_read_db)):
+    products = db.query(Product).all()
     result = []
     for product in products:
-        price_histories = db.query(ProductService.__dict__["__globals__"]["PriceHistory"]).filter_by(product_id=product.id).all()
+        price_histories = db.query(PriceHistory).filter_by(product_id=product.id).all()
         result.append({
             "id": product.id,
             "name": product.name,
@@ -24,72 +171,6 @@ def debug_all_products(db: Session = Depends(get_db)):
             ]
         })
     return result
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import Session
-from app.models.price_history import PriceHistory
-from database import get_db
-from app.services.business import ProductService
-from app.services.aggregator import DataAggregationService
-from app.schemas.product import ProductSchema, ProductCreateSchema
-from typing import List
-
-# Define router before any route decorators
-# router definition only, no stray code
-router = APIRouter(prefix="/api/products", tags=["products"])
-# products.py - api endpoints for products
-
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-from app.services.business import ProductService
-from app.services.aggregator import DataAggregationService
-from app.schemas.product import ProductSchema, ProductCreateSchema
-from typing import List
-
-router = APIRouter(prefix="/api/products", tags=["products"])
-
-
-
-# returns all products, normalized for frontend
-@router.get("/", response_model=list)
-def get_all_products(db: Session = Depends(get_db)):
-    products = ProductService.get_all_products(db)
-    result = []
-    for product in products:
-        # Get latest price per retailer for this product
-        price_entries = db.query(PriceHistory).filter(PriceHistory.product_id == product.id).order_by(PriceHistory.created_at.desc()).all()
-        prices_by_retailer = {}
-        for price in price_entries:
-            if price.retailer not in prices_by_retailer:
-                prices_by_retailer[price.retailer] = price
-        prices = []
-        for price in prices_by_retailer.values():
-            prices.append({
-                "sellerId": price.retailer,
-                "price": price.price,
-                "stock": 1 if price.in_stock == "in_stock" else 0,
-                "condition": "new",  # or map from price/retailer if available
-                "originalPrice": price.original_price,
-                "shipping": None,  # Add if available
-                "deliveryDays": None  # Add if available
-            })
-        # Compose normalized product dict
-        result.append({
-            "id": str(product.id),
-            "name": product.name,
-            "brand": product.brand or "",
-            "category": product.category,
-            "image": product.image_url or "",
-            "description": product.description,
-            "rating": product.rating or 0,
-            "reviewCount": 0,  # Add if available
-            "prices": prices,
-            "features": [],  # Add if available
-            "specs": {},  # Add if available
-            "tags": (product.tags.split(",") if product.tags else []),
-        })
-    return result
 
 
 # get trending products from eBay
@@ -102,10 +183,21 @@ def get_trending_products(db: Session = Depends(get_db)):
     return products
 
 
-# search products by name or category (local search)
-@router.get("/search", response_model=List[ProductSchema])
-def search_products(q: str = "", category: str = None, db: Session = Depends(get_db)):
-    products = ProductService.search_products(db, q, category)
+# search products by name or category (local search, best matches first)
+@router.get("/search", response_model=List[ProductSchema], dependencies=[Depends(validate_catalog)])
+async def search_products(
+    response: Response,
+    q: str = "",
+    category: str = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    if fast_json.enabled():
+        rows = await ProductService.search_products_async(db, q, category, limit=limit, offset=offset,
+                                                          columns=fast_json.columns(Product, ProductSchema))
+        return fast_json.response(fast_json.rows_to_dicts(ProductSchema, rows), response)
+    products = await ProductService.search_products_async(db, q, category, limit=limit, offset=offset)
     return products
 
 
@@ -118,17 +210,18 @@ def search_and_add_products(q: str, db: Session = Depends(get_db)):
     """
     if not q or len(q) < 2:
         raise HTTPException(status_code=400, detail="Search query too short")
-    
+
     products = DataAggregationService.search_products(q, db)
     return products
 
 
 # get one product by id
-@router.get("/{product_id}", response_model=ProductSchema)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = ProductService.get_product_by_id(db, product_id)
+@router.get("/{product_id}", response_model=ProductSchema, dependencies=[Depends(validate_product)])
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    product = await ProductService.get_product_by_id_async(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    record_view(product_id)
     return product
 
 
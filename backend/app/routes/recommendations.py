@@ -3,17 +3,17 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_read_db, SessionRoute
 from app.services.business import RecommendationService, ProductService
 from app.schemas.recommendation import RecommendationSchema
 from typing import List
 
-router = APIRouter(prefix="/api/recommendations", tags=["recommendations"])
+router = APIRouter(prefix="/api/recommendations", tags=["recommendations"], route_class=SessionRoute)
 
 
 # get recommendations for a product
 @router.get("/{product_id}")
-def get_recommendations(product_id: int, db: Session = Depends(get_db)):
+def get_recommendations(product_id: int, db: Session = Depends(get_read_db)):
     product = ProductService.get_product_by_id(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -1,7 +1,7 @@
 # price_history.py - defines the shape of price data for api
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -21,3 +21,25 @@ class PriceHistorySchema(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+# downsampled history point (hourly / daily OHLC bucket)
+class PriceBucketSchema(BaseModel):
+    product_id: int
+    retailer: str
+    resolution: str
+    bucket_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    avg_price: float
+    samples: int
+
+
+# request body for stats on many products at once
+class PriceAnalyticsBatchSchema(BaseModel):
+    product_ids: List[int]
+    days: int = 90
+    window_days: int = 7
+    percentiles: List[float] = [10, 25, 75, 90]
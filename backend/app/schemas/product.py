@@ -2,8 +2,9 @@
 # pydantic validates that data matches these fields
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional, Union
 from datetime import datetime
+from app.schemas.price_history import PriceHistorySchema, PriceBucketSchema
 
 
 # for creating a new product
@@ -26,3 +27,33 @@ class ProductSchema(ProductCreateSchema):
 
     class Config:
         from_attributes = True
+
+
+# filters, sort and page for GET /api/products/catalog (see app/services/catalog.py)
+class CatalogQuerySchema(BaseModel):
+    q: Optional[str] = None
+    category: List[str] = []
+    brand: List[str] = []
+    retailer: List[str] = []
+    tags: List[str] = []
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: Optional[bool] = None
+    min_rating: Optional[float] = None
+    sort: str = "id"  # id, price, -price, discount, rating
+    limit: int = 24
+    cursor: Optional[str] = None
+
+
+# everything the product page needs for one product (GET /api/products/details)
+class ProductDetailSchema(BaseModel):
+    product: ProductSchema
+    offers: List[PriceHistorySchema]  # current offer per retailer, newest first
+    lowest: Optional[PriceHistorySchema] = None
+    best_deal: Optional[PriceHistorySchema] = None
+    history: Optional[Union[List[PriceHistorySchema], List[PriceBucketSchema]]] = None  # only with history_days
+
+
+class ProductDetailsBatchSchema(BaseModel):
+    results: Dict[int, ProductDetailSchema]
+    missing: List[int]
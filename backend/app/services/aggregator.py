@@ -1,10 +1,17 @@
 # aggregator.py - Multi-Source Price Tracker
 # Sources: eBay Browse API (5000/day) + SerpAPI (100/month for Amazon, Walmart, etc.)
-# Caches results to minimize API calls
+# Caches results to minimize API calls (search_cache.py, budgets in quota.py)
+# Every search has a sync version (used by the routes/scripts) and an async one
+# (used by compare_prices_async to query all retailers at the same time)
 
-from app.services.business import ProductService, PriceHistoryService
+from app.services.business import ProductService, ListingService
+from app.services.http_client import get_client, get_async_client, new_async_client
+from app.services.search_cache import search_cache, normalize_query
+from app.services.singleflight import SingleFlight
+from app.services.matching import matcher, ProductMatcher, Fingerprint, guess_category
 from config import settings
 from sqlalchemy.orm import Session
+import asyncio
 import httpx
 import base64
 import time
@@ -12,26 +19,29 @@ import time
 # Token cache
 _token_cache = {"token": None, "expires": 0}
 
+# coalesces concurrent search-add calls for the same query
+search_flight = SingleFlight(remember_for=settings.search_coalesce_seconds)
+
+# SerpAPI engine name, query param and result key per retailer
+SERPAPI_ENGINES = {
+    "Amazon": {"engine": "amazon", "query_param": "k", "results": "organic_results",
+               "extra": {"amazon_domain": "amazon.com"}},
+    "Walmart": {"engine": "walmart", "query_param": "query", "results": "organic_results", "extra": {}},
+    "Google Shopping": {"engine": "google_shopping", "query_param": "q", "results": "shopping_results", "extra": {}},
+}
+
 
 class DataAggregationService:
     """Multi-source price aggregation: eBay + SerpAPI (Amazon, Walmart, Google Shopping)"""
     
     # ==================== EBAY API (5000 calls/day) ====================
-    
+
     @staticmethod
-    def get_token():
-        """Get OAuth token (cached to minimize calls)"""
-        global _token_cache
-        
-        # Return cached token if still valid
-        if _token_cache["token"] and time.time() < _token_cache["expires"]:
-            return _token_cache["token"]
-        
+    def _token_request():
+        # url + httpx kwargs for the OAuth client-credentials call
         credentials = f'{settings.ebay_client_id}:{settings.ebay_client_secret}'
         encoded = base64.b64encode(credentials.encode()).decode()
-        
-        resp = httpx.post(
-            'https://api.ebay.com/identity/v1/oauth2/token',
+        return f'{settings.ebay_api_base}/identity/v1/oauth2/token', dict(
             headers={
                 'Content-Type': 'application/x-www-form-urlencoded',
                 'Authorization': f'Basic {encoded}'
@@ -40,28 +50,43 @@ class DataAggregationService:
                 'grant_type': 'client_credentials',
                 'scope': 'https://api.ebay.com/oauth/api_scope'
             },
-            timeout=15
+            timeout=settings.ebay_timeout
         )
-        
+
+    @staticmethod
+    def _store_token(resp):
         if resp.status_code == 200:
             data = resp.json()
             _token_cache["token"] = data["access_token"]
             # Cache for 1 hour (token valid for 2 hours)
             _token_cache["expires"] = time.time() + 3600
             return _token_cache["token"]
-        
+
         print(f"Token error: {resp.status_code}")
         return None
 
     @staticmethod
-    def search_ebay(query: str, limit: int = 5):
-        """Search eBay Browse API - returns items with prices"""
-        token = DataAggregationService.get_token()
-        if not token:
-            return []
-        
-        resp = httpx.get(
-            'https://api.ebay.com/buy/browse/v1/item_summary/search',
+    def get_token():
+        """Get OAuth token (cached to minimize calls)"""
+        # Return cached token if still valid
+        if _token_cache["token"] and time.time() < _token_cache["expires"]:
+            return _token_cache["token"]
+
+        url, kwargs = DataAggregationService._token_request()
+        return DataAggregationService._store_token(get_client().post(url, **kwargs))
+
+    @staticmethod
+    async def get_token_async(client: httpx.AsyncClient):
+        """Async get_token, shares the same token cache"""
+        if _token_cache["token"] and time.time() < _token_cache["expires"]:
+            return _token_cache["token"]
+
+        url, kwargs = DataAggregationService._token_request()
+        return DataAggregationService._store_token(await client.post(url, **kwargs))
+
+    @staticmethod
+    def _ebay_search_request(token: str, query: str, limit: int):
+        return f'{settings.ebay_api_base}/buy/browse/v1/item_summary/search', dict(
             headers={
                 'Authorization': f'Bearer {token}',
                 'X-EBAY-C-MARKETPLACE-ID': 'EBAY_US'
@@ -71,99 +96,111 @@ class DataAggregationService:
                 'limit': limit,
                 'filter': 'buyingOptions:{FIXED_PRICE}'  # Only Buy It Now
             },
-            timeout=15
+            timeout=settings.ebay_timeout
         )
-        
+
+    @staticmethod
+    def _ebay_search_results(resp):
         if resp.status_code == 200:
             return resp.json().get('itemSummaries', [])
-        
+
         print(f"Search error: {resp.status_code} - {resp.text[:100]}")
         return []
 
+    @staticmethod
+    def search_ebay(query: str, limit: int = 5):
+        """Search eBay Browse API - returns items with prices (cached, see search_cache)"""
+        def fetch():
+            token = DataAggregationService.get_token()
+            if not token:
+                return []
+
+            url, kwargs = DataAggregationService._ebay_search_request(token, query, limit)
+            return DataAggregationService._ebay_search_results(get_client().get(url, **kwargs))
+
+        return search_cache.get_or_fetch("eBay", query, limit, fetch)
+
+    @staticmethod
+    async def search_ebay_async(client: httpx.AsyncClient, query: str, limit: int = 5):
+        """Async search_ebay"""
+        async def fetch():
+            token = await DataAggregationService.get_token_async(client)
+            if not token:
+                return []
+
+            url, kwargs = DataAggregationService._ebay_search_request(token, query, limit)
+            return DataAggregationService._ebay_search_results(await client.get(url, **kwargs))
+
+        return await search_cache.get_or_fetch_async("eBay", query, limit, fetch)
+
     # ==================== SERPAPI (100 calls/month) ====================
     # Use sparingly! Each call searches Amazon, Walmart, or Google Shopping
-    
+
     @staticmethod
-    def search_amazon(query: str, limit: int = 5):
-        """Search Amazon via SerpAPI - USE SPARINGLY (100/month total)"""
-        if not settings.serpapi_key:
-            print("SerpAPI key not configured")
-            return []
-        
-        resp = httpx.get(
-            'https://serpapi.com/search.json',
-            params={
-                'engine': 'amazon',
-                'amazon_domain': 'amazon.com',
-                'k': query,
-                'api_key': settings.serpapi_key
-            },
-            timeout=20
-        )
-        
+    def _serpapi_request(source: str, query: str):
+        engine = SERPAPI_ENGINES[source]
+        params = {'engine': engine["engine"], **engine["extra"], engine["query_param"]: query,
+                  'api_key': settings.serpapi_key}
+        return f'{settings.serpapi_base}/search.json', dict(params=params, timeout=settings.serpapi_timeout)
+
+    @staticmethod
+    def _serpapi_results(source: str, resp, limit: int):
         if resp.status_code == 200:
             data = resp.json()
-            results = data.get('organic_results', [])[:limit]
+            results = data.get(SERPAPI_ENGINES[source]["results"], [])[:limit]
             return results
-        
-        print(f"Amazon search error: {resp.status_code}")
+
+        print(f"{source} search error: {resp.status_code}")
         return []
 
     @staticmethod
-    def search_walmart(query: str, limit: int = 5):
-        """Search Walmart via SerpAPI - USE SPARINGLY (100/month total)"""
+    def search_serpapi(source: str, query: str, limit: int = 5):
+        """Search one SerpAPI engine (Amazon, Walmart, Google Shopping) - cached, see search_cache"""
         if not settings.serpapi_key:
             print("SerpAPI key not configured")
             return []
-        
-        resp = httpx.get(
-            'https://serpapi.com/search.json',
-            params={
-                'engine': 'walmart',
-                'query': query,
-                'api_key': settings.serpapi_key
-            },
-            timeout=20
-        )
-        
-        if resp.status_code == 200:
-            data = resp.json()
-            results = data.get('organic_results', [])[:limit]
-            return results
-        
-        print(f"Walmart search error: {resp.status_code}")
-        return []
+
+        def fetch():
+            url, kwargs = DataAggregationService._serpapi_request(source, query)
+            return DataAggregationService._serpapi_results(source, get_client().get(url, **kwargs), limit)
+
+        return search_cache.get_or_fetch(source, query, limit, fetch)
 
     @staticmethod
-    def search_google_shopping(query: str, limit: int = 5):
-        """Search Google Shopping via SerpAPI - USE SPARINGLY (100/month total)"""
+    async def search_serpapi_async(client: httpx.AsyncClient, source: str, query: str, limit: int = 5):
+        """Async search_serpapi"""
         if not settings.serpapi_key:
             print("SerpAPI key not configured")
             return []
-        
-        resp = httpx.get(
-            'https://serpapi.com/search.json',
-            params={
-                'engine': 'google_shopping',
-                'q': query,
-                'api_key': settings.serpapi_key
-            },
-            timeout=20
-        )
-        
-        if resp.status_code == 200:
-            data = resp.json()
-            results = data.get('shopping_results', [])[:limit]
-            return results
-        
-        print(f"Google Shopping search error: {resp.status_code}")
-        return []
+
+        async def fetch():
+            url, kwargs = DataAggregationService._serpapi_request(source, query)
+            return DataAggregationService._serpapi_results(source, await client.get(url, **kwargs), limit)
+
+        return await search_cache.get_or_fetch_async(source, query, limit, fetch)
+
+    @staticmethod
+    def search_amazon(query: str, limit: int = 5):
+        """Search Amazon via SerpAPI - USE SPARINGLY (100/month total)"""
+        return DataAggregationService.search_serpapi("Amazon", query, limit)
+
+    @staticmethod
+    def search_walmart(query: str, limit: int = 5):
+        """Search Walmart via SerpAPI - USE SPARINGLY (100/month total)"""
+        return DataAggregationService.search_serpapi("Walmart", query, limit)
+
+    @staticmethod
+    def search_google_shopping(query: str, limit: int = 5):
+        """Search Google Shopping via SerpAPI - USE SPARINGLY (100/month total)"""
+        return DataAggregationService.search_serpapi("Google Shopping", query, limit)
 
     # ==================== SAVE TO DATABASE ====================
+    # parse_* turn one upstream item into (product fields, price fields) or None,
+    # the price fields carry the listing's external_id; save_items writes a whole list of them
 
     @staticmethod
-    def save_ebay_item(db: Session, item: dict):
-        """Save an eBay item to database"""
+    def parse_ebay_item(item: dict):
+        """Map an eBay item summary to product + price fields"""
         try:
             title = item.get('title', '')[:200]
             price_info = item.get('price', {})
@@ -172,122 +209,208 @@ class DataAggregationService:
             image = item.get('image', {}).get('imageUrl', '')
             link = item.get('itemWebUrl', '')
             condition = item.get('condition', '')
-            
+
             if not title or price <= 0:
                 return None
-            
-            # Create product
-            product = ProductService.create_product(
-                db,
+
+            product = dict(
                 name=title,
                 description=f"Condition: {condition}" if condition else "eBay Listing",
-                category="eBay",
+                category=guess_category(title),
                 image_url=image
             )
-            
-            # Add price
-            PriceHistoryService.add_price_record(
-                db,
-                product_id=product.id,
-                retailer="eBay",
-                price=price,
-                original_price=None,
-                url=link,
-                in_stock="in_stock"
-            )
-            
-            return product
+            price_record = dict(retailer="eBay", price=price, original_price=None, url=link, in_stock="in_stock",
+                                external_id=ListingService.external_id(item.get('itemId'), item.get('legacyItemId'), url=link))
+            return product, price_record
         except Exception as e:
-            print(f"Save error: {e}")
+            print(f"Parse error: {e}")
             return None
 
     @staticmethod
-    def save_amazon_item(db: Session, item: dict):
-        """Save an Amazon item from SerpAPI to database"""
+    def parse_amazon_item(item: dict):
+        """Map an Amazon item from SerpAPI to product + price fields"""
         try:
             title = item.get('title', '')[:200]
             price = item.get('price', {}).get('raw', '') if isinstance(item.get('price'), dict) else item.get('price', '')
-            
+
             # Parse price (can be "$29.99" or similar)
             if isinstance(price, str):
                 price = float(price.replace('$', '').replace(',', '').strip() or 0)
             else:
                 price = float(price or 0)
-            
+
             image = item.get('thumbnail', '')
             link = item.get('link', '')
             rating = item.get('rating', '')
-            
+
             if not title or price <= 0:
                 return None
-            
-            product = ProductService.create_product(
-                db,
+
+            product = dict(
                 name=title,
                 description=f"Rating: {rating}" if rating else "Amazon Listing",
-                category="Amazon",
+                category=guess_category(title),
                 image_url=image
             )
-            
-            PriceHistoryService.add_price_record(
-                db,
-                product_id=product.id,
-                retailer="Amazon",
-                price=price,
-                original_price=None,
-                url=link,
-                in_stock="in_stock"
-            )
-            
-            return product
+            price_record = dict(retailer="Amazon", price=price, original_price=None, url=link, in_stock="in_stock",
+                                external_id=ListingService.external_id(item.get('asin'), url=link))
+            return product, price_record
         except Exception as e:
-            print(f"Amazon save error: {e}")
+            print(f"Amazon parse error: {e}")
             return None
 
     @staticmethod
-    def save_walmart_item(db: Session, item: dict):
-        """Save a Walmart item from SerpAPI to database"""
+    def parse_walmart_item(item: dict):
+        """Map a Walmart item from SerpAPI to product + price fields"""
         try:
             title = item.get('title', '')[:200]
             price = item.get('primary_offer', {}).get('offer_price', 0)
             if not price:
                 price = item.get('price', 0)
-            
+
             if isinstance(price, str):
                 price = float(price.replace('$', '').replace(',', '').strip() or 0)
             else:
                 price = float(price or 0)
-            
+
             image = item.get('thumbnail', '')
             link = item.get('product_page_url', '')
             rating = item.get('rating', '')
-            
+
             if not title or price <= 0:
                 return None
-            
-            product = ProductService.create_product(
-                db,
+
+            product = dict(
                 name=title,
                 description=f"Rating: {rating}" if rating else "Walmart Listing",
-                category="Walmart",
+                category=guess_category(title),
                 image_url=image
             )
-            
-            PriceHistoryService.add_price_record(
-                db,
-                product_id=product.id,
-                retailer="Walmart",
-                price=price,
-                original_price=None,
-                url=link,
-                in_stock="in_stock"
+            price_record = dict(retailer="Walmart", price=price, original_price=None, url=link, in_stock="in_stock",
+                                external_id=ListingService.external_id(item.get('us_item_id'), item.get('product_id'), url=link))
+            return product, price_record
+        except Exception as e:
+            print(f"Walmart parse error: {e}")
+            return None
+
+    @staticmethod
+    def parse_google_shopping_item(item: dict):
+        """Map a Google Shopping result from SerpAPI to product + price fields"""
+        try:
+            title = item.get('title', '')[:200]
+            price = item.get('extracted_price') or item.get('price', 0)
+
+            if isinstance(price, str):
+                price = float(price.replace('$', '').replace(',', '').strip() or 0)
+            else:
+                price = float(price or 0)
+
+            image = item.get('thumbnail', '')
+            link = item.get('product_link') or item.get('link', '')
+            store = item.get('source', '')
+
+            if not title or price <= 0:
+                return None
+
+            product = dict(
+                name=title,
+                description=f"Sold by: {store}" if store else "Google Shopping Listing",
+                category=guess_category(title),
+                image_url=image
             )
-            
-            return product
+            price_record = dict(retailer="Google Shopping", price=price, original_price=None, url=link, in_stock="in_stock",
+                                external_id=ListingService.external_id(item.get('product_id'), url=link))
+            return product, price_record
         except Exception as e:
-            print(f"Walmart save error: {e}")
+            print(f"Google Shopping parse error: {e}")
             return None
 
+    @staticmethod
+    def save_items(db: Session, parsed: list):
+        """Bulk save parsed (product, price) pairs. A listing we've seen before (same retailer
+        and external id) goes straight to its product, a new one is matched onto an existing
+        product when possible (see matching.py) and only unmatched ones create a Product.
+        Prices are only written when they changed. Returns the Product rows the listings are on."""
+        parsed = [pair for pair in parsed if pair]
+        if not parsed:
+            return []
+        # products created by this call are keyed ("new", index) in a matcher of its own, so other
+        # requests never see those placeholders - they join the shared matcher once they have ids
+        pending = ProductMatcher(matcher.threshold)
+        new_products, new_fingerprints = [], []
+        try:
+            listing_keys = [(price_record["retailer"], price_record.get("external_id")) for _, price_record in parsed]
+            known = ListingService.get_listing_products(db, listing_keys)
+            matcher.ensure_loaded(db)
+            keys = []
+            for (product, _), listing_key in zip(parsed, listing_keys):
+                key = known.get(listing_key)
+                if key is None:
+                    fingerprint = Fingerprint(product["name"], product.get("brand"))
+                    key, key_score = matcher.find(fingerprint)
+                    pending_key, pending_score = pending.find(fingerprint)
+                    if pending_key is not None and pending_score > key_score:
+                        key = pending_key
+                if key is None:
+                    # later listings in this batch can match it too
+                    key = ("new", len(new_products))
+                    pending.add(key, fingerprint)
+                    if not product.get("brand") and fingerprint.brand:
+                        product = dict(product, brand=fingerprint.brand.title())
+                    new_products.append(product)
+                    new_fingerprints.append(fingerprint)
+                if listing_key[1]:
+                    known[listing_key] = key  # the same listing twice in one fetch
+                keys.append(key)
+
+            new_ids = ProductService.bulk_create_products(db, new_products)
+            product_ids = [new_ids[key[1]] if isinstance(key, tuple) else key for key in keys]
+
+            ListingService.record_prices(db, [
+                dict(price_record, product_id=product_id, title=product["name"])
+                for product_id, (product, price_record) in zip(product_ids, parsed)
+            ])
+            for product_id, fingerprint in zip(new_ids, new_fingerprints):
+                matcher.add(product_id, fingerprint)
+            return ProductService.get_products_by_ids(db, list(dict.fromkeys(product_ids)))
+        except Exception as e:
+            db.rollback()
+            print(f"Save error: {e}")
+            return []
+
+    @staticmethod
+    def save_ebay_items(db: Session, items: list):
+        """Save many eBay items to database"""
+        return DataAggregationService.save_items(db, [DataAggregationService.parse_ebay_item(i) for i in items])
+
+    @staticmethod
+    def save_amazon_items(db: Session, items: list):
+        """Save many Amazon items from SerpAPI to database"""
+        return DataAggregationService.save_items(db, [DataAggregationService.parse_amazon_item(i) for i in items])
+
+    @staticmethod
+    def save_walmart_items(db: Session, items: list):
+        """Save many Walmart items from SerpAPI to database"""
+        return DataAggregationService.save_items(db, [DataAggregationService.parse_walmart_item(i) for i in items])
+
+    @staticmethod
+    def save_ebay_item(db: Session, item: dict):
+        """Save an eBay item to database"""
+        saved = DataAggregationService.save_ebay_items(db, [item])
+        return saved[0] if saved else None
+
+    @staticmethod
+    def save_amazon_item(db: Session, item: dict):
+        """Save an Amazon item from SerpAPI to database"""
+        saved = DataAggregationService.save_amazon_items(db, [item])
+        return saved[0] if saved else None
+
+    @staticmethod
+    def save_walmart_item(db: Session, item: dict):
+        """Save a Walmart item from SerpAPI to database"""
+        saved = DataAggregationService.save_walmart_items(db, [item])
+        return saved[0] if saved else None
+
     # ==================== HIGH-LEVEL METHODS ====================
 
     @staticmethod
@@ -302,13 +425,10 @@ class DataAggregationService:
         # Only fetch from eBay if DB is empty (saves API calls)
         print("Fetching trending consumer electronics from eBay API (1 call per category, only if DB empty)...")
         categories = ["phones", "laptops", "headphones", "tablets", "smartwatch", "camera", "monitor", "gaming console"]
-        saved = []
+        items = []
         for cat in categories:
-            items = DataAggregationService.search_ebay(cat, limit=2)
-            for item in items:
-                product = DataAggregationService.save_ebay_item(db, item)
-                if product:
-                    saved.append(product)
+            items.extend(DataAggregationService.search_ebay(cat, limit=2))
+        saved = DataAggregationService.save_ebay_items(db, items)
         return saved if saved else existing or []
 
     @staticmethod
@@ -320,60 +440,90 @@ class DataAggregationService:
             return local
         
         # If nothing local, search eBay (1 API call)
-        print(f"Searching eBay for: {search_term} (1 call)")
-        items = DataAggregationService.search_ebay(search_term, limit=5)
-        
-        saved = []
+        # concurrent requests for the same query share one fetch and one set of inserts,
+        # then each loads the saved rows in its own session
+        def fetch_and_save():
+            print(f"Searching eBay for: {search_term} (1 call)")
+            items = DataAggregationService.search_ebay(search_term, limit=5)
+            return [p.id for p in DataAggregationService.save_ebay_items(db, items)]
+
+        product_ids = search_flight.do(normalize_query(search_term), fetch_and_save)
+        return ProductService.get_products_by_ids(db, product_ids)
+
+    @staticmethod
+    def _compare_offers(source: str, items: list):
+        # shape raw upstream items into the compare_prices offer dicts
+        parser = {
+            "eBay": DataAggregationService.parse_ebay_item,
+            "Amazon": DataAggregationService.parse_amazon_item,
+            "Walmart": DataAggregationService.parse_walmart_item,
+            "Google Shopping": DataAggregationService.parse_google_shopping_item,
+        }[source]
+        offers = []
         for item in items:
-            product = DataAggregationService.save_ebay_item(db, item)
-            if product:
-                saved.append(product)
-        
-        return saved
+            parsed = parser(item)
+            if parsed:
+                product, price_record = parsed
+                offers.append({
+                    "title": product["name"][:100],
+                    "price": price_record["price"],
+                    "url": price_record["url"],
+                    "image": product["image_url"]
+                })
+        return offers
 
     @staticmethod
-    def compare_prices(query: str, db: Session, use_serpapi: bool = False):
+    async def compare_prices_async(query: str, use_serpapi: bool = False, limit: int = 3,
+                                   timeout: float = None, client: httpx.AsyncClient = None):
         """
-        Compare prices across retailers for the same product.
-        - Always uses eBay (free, 5000/day)
-        - Optionally uses SerpAPI for Amazon/Walmart (costs 1 call from 100/month limit)
+        Compare prices across retailers, querying every source at the same time.
+        - eBay always (free, 5000/day)
+        - Amazon, Walmart and Google Shopping only with use_serpapi (1 call each from 100/month)
+        Each source gets its own timeout; slow or failing sources are listed in "failed"
+        and the rest are still returned, so latency is about the slowest single source.
         """
+        client = client or get_async_client()
+        timeout = timeout or settings.compare_source_timeout
+
+        sources = {"eBay": DataAggregationService.search_ebay_async(client, query, limit)}
+        # Only use SerpAPI if explicitly requested (saves your 100/month)
+        if use_serpapi and settings.serpapi_key:
+            print(f"Using SerpAPI ({len(settings.compare_serpapi_sources)} calls from 100/month)...")
+            for source in settings.compare_serpapi_sources:
+                sources[source] = DataAggregationService.search_serpapi_async(client, source, query, limit)
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *[asyncio.wait_for(search, timeout) for search in sources.values()],
+            return_exceptions=True
+        )
+
         results = {
             "query": query,
-            "retailers": {}
+            "retailers": {},
+            "failed": {}
         }
-        
-        # Always get eBay prices (free)
-        ebay_items = DataAggregationService.search_ebay(query, limit=3)
-        if ebay_items:
-            results["retailers"]["eBay"] = []
-            for item in ebay_items:
-                price_info = item.get('price', {})
-                results["retailers"]["eBay"].append({
-                    "title": item.get('title', '')[:100],
-                    "price": float(price_info.get('value', 0)),
-                    "url": item.get('itemWebUrl', ''),
-                    "image": item.get('image', {}).get('imageUrl', '')
-                })
-        
-        # Only use SerpAPI if explicitly requested (saves your 100/month)
-        if use_serpapi and settings.serpapi_key:
-            print("Using SerpAPI (1 call from 100/month)...")
-            
-            # Amazon
-            amazon_items = DataAggregationService.search_amazon(query, limit=3)
-            if amazon_items:
-                results["retailers"]["Amazon"] = []
-                for item in amazon_items:
-                    price = item.get('price', {})
-                    if isinstance(price, dict):
-                        price = price.get('raw', '$0')
-                    price_val = float(str(price).replace('$', '').replace(',', '') or 0)
-                    results["retailers"]["Amazon"].append({
-                        "title": item.get('title', '')[:100],
-                        "price": price_val,
-                        "url": item.get('link', ''),
-                        "image": item.get('thumbnail', '')
-                    })
-        
+        for source, outcome in zip(sources, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                results["failed"][source] = f"timed out after {timeout}s"
+            elif isinstance(outcome, Exception):
+                results["failed"][source] = f"{type(outcome).__name__}: {outcome}"
+            else:
+                offers = DataAggregationService._compare_offers(source, outcome)
+                if offers:
+                    results["retailers"][source] = offers
+        results["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
         return results
+
+    @staticmethod
+    def compare_prices(query: str, db: Session, use_serpapi: bool = False):
+        """
+        Compare prices across retailers for the same product (sync wrapper around
+        compare_prices_async, for scripts - async routes should await that directly).
+        """
+        async def run():
+            # a client of its own, the shared one belongs to the app's event loop
+            async with new_async_client() as client:
+                return await DataAggregationService.compare_prices_async(query, use_serpapi, client=client)
+
+        return asyncio.run(run())
@@ -0,0 +1,99 @@
+# alert_index.py - in-memory thresholds of the alerts that can still trigger
+# per (product_id, retailer) a sorted list of (threshold, alert_id); retailer None holds
+# the "any retailer" alerts. A new price p crosses exactly the tail of the list from the
+# first threshold >= p, so finding them is a bisect instead of a scan over all alerts.
+# The index is loaded from the alerts table on first use and reloaded every
+# alert_index_reload_seconds to pick up alerts created by other processes.
+
+import bisect
+import threading
+import time
+from app.models.alert import Alert
+from config import settings
+
+
+class AlertIndex:
+    def __init__(self, reload_seconds: float = 300.0):
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._thresholds = {}  # (product_id, retailer or None) -> sorted [(threshold, alert_id)]
+        self._bind = None
+        self._loaded_at = None
+        self.counters = {"loads": 0, "lookups": 0, "candidates": 0}
+
+    def load(self, db):
+        """(Re)build the index from active, untriggered alerts"""
+        rows = db.query(Alert.id, Alert.product_id, Alert.price_threshold, Alert.target_retailer).filter(
+            Alert.is_active == True, Alert.triggered == False, Alert.price_threshold.isnot(None)
+        ).all()
+        thresholds = {}
+        for alert_id, product_id, threshold, retailer in rows:
+            thresholds.setdefault((product_id, retailer), []).append((threshold, alert_id))
+        for entries in thresholds.values():
+            entries.sort()
+        with self._lock:
+            self._thresholds = thresholds
+            self._bind = db.get_bind()
+            self._loaded_at = time.monotonic()
+            self.counters["loads"] += 1
+
+    def ensure_loaded(self, db):
+        with self._lock:
+            fresh = (self._bind is db.get_bind() and self._loaded_at is not None
+                     and time.monotonic() - self._loaded_at < self.reload_seconds)
+        if not fresh:
+            self.load(db)
+
+    def add(self, alert_id: int, product_id: int, threshold: float, retailer: str = None):
+        if threshold is None:
+            return
+        with self._lock:
+            if self._loaded_at is not None:
+                bisect.insort(self._thresholds.setdefault((product_id, retailer), []), (threshold, alert_id))
+
+    def remove(self, alert_id: int, product_id: int, threshold: float, retailer: str = None):
+        with self._lock:
+            entries = self._thresholds.get((product_id, retailer))
+            if not entries:
+                return
+            i = bisect.bisect_left(entries, (threshold, alert_id))
+            if i < len(entries) and entries[i] == (threshold, alert_id):
+                del entries[i]
+
+    def pop_crossed(self, prices, removed: list = None):
+        """Remove and return the alerts crossed by these (product_id, retailer, price) writes
+        as {alert_id: (retailer, price)} - the lowest price wins if several cross one alert.
+        removed collects the (alert_id, product_id, threshold, retailer) taken out, for add()
+        to put back if triggering them fails"""
+        crossed = {}
+        with self._lock:
+            self.counters["lookups"] += 1
+            # lowest price first so it claims the alerts it crosses
+            for product_id, retailer, price in sorted(prices, key=lambda p: p[2]):
+                if price is None:
+                    continue
+                for key in ((product_id, None), (product_id, retailer)):
+                    entries = self._thresholds.get(key)
+                    if not entries:
+                        continue
+                    i = bisect.bisect_left(entries, (price,))
+                    for threshold, alert_id in entries[i:]:
+                        crossed.setdefault(alert_id, (retailer, price))
+                        if removed is not None:
+                            removed.append((alert_id, product_id, threshold, key[1]))
+                    del entries[i:]
+            self.counters["candidates"] += len(crossed)
+        return crossed
+
+    def size(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._thresholds.values())
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.counters)
+        metrics["indexed_alerts"] = self.size()
+        return metrics
+
+
+alert_index = AlertIndex(settings.alert_index_reload_seconds)
@@ -0,0 +1,279 @@
+# analytics.py - price statistics computed server-side
+# price history for the requested products is loaded as columns (one query per 500 ids),
+# sorted by (product, retailer, time), and every statistic is a numpy reduction over
+# the group boundaries - no python loop over rows or ORM objects.
+# Per product you get each retailer's numbers plus an "overall" block across retailers.
+# Ranges older than history_raw_days only exist as compacted buckets (see compaction.py):
+# those are read too, each bucket standing for `samples` prices at its average, with its
+# own low / high / close. Spreads within a bucket are lost, so std and volatility over
+# compacted ranges are approximations.
+
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import Float, func, select, cast, extract
+from sqlalchemy.orm import Session
+from app.models.price_history import PriceHistory
+from app.models.price_bucket import PriceBucket
+
+DEFAULT_PERCENTILES = (10, 25, 75, 90)
+IDS_PER_QUERY = 500
+DAY = 86400.0
+
+
+def _epoch(moment: datetime):
+    # created_at is naive utc
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _epoch_column(dialect: str, column):
+    # seconds since 1970 computed by the database, so no datetime objects are built per row
+    if dialect == "sqlite":
+        return (func.julianday(column) - 2440587.5) * 86400.0
+    if dialect == "postgresql":
+        return cast(extract("epoch", column), Float)
+    return None
+
+
+def _arrays(rows, epoch):
+    product_col, retailer_col, price_col, time_col = zip(*rows)
+    return (
+        np.array(product_col, dtype=np.int64),
+        np.array(retailer_col, dtype=object),
+        np.array(price_col, dtype=np.float64),
+        np.array(time_col if epoch else [_epoch(t) for t in time_col], dtype=np.float64),
+    )
+
+
+def _load_columns(db: Session, product_ids, days: int):
+    """Observations of the last `days`, sorted by product, retailer, time. A dict of arrays:
+    product, retailer, price, ts (unix time), weight (prices it stands for), low, high, close.
+    Raw rows are one price each; compacted buckets are weighted by their samples."""
+    since = datetime.utcnow() - timedelta(days=days)
+    conn = db.connection()
+    raw_epoch = _epoch_column(conn.dialect.name, PriceHistory.created_at)
+    bucket_epoch = _epoch_column(conn.dialect.name, PriceBucket.bucket_start)
+    rows, bucket_rows, bucket_extra = [], [], []
+    ids = list(product_ids)
+    for i in range(0, len(ids), IDS_PER_QUERY):
+        chunk = ids[i:i + IDS_PER_QUERY]
+        # core rows straight from the connection, the ORM adds nothing for plain columns
+        rows.extend(conn.execute(
+            select(PriceHistory.product_id, PriceHistory.retailer, PriceHistory.price,
+                   raw_epoch if raw_epoch is not None else PriceHistory.created_at)
+            .where(PriceHistory.product_id.in_(chunk),
+                   PriceHistory.created_at >= since,
+                   PriceHistory.price.isnot(None))
+            .order_by(PriceHistory.product_id, PriceHistory.retailer, PriceHistory.created_at)
+        ).all())
+        # each sample is either still raw or in exactly one hourly / daily bucket
+        for row in conn.execute(
+            select(PriceBucket.product_id, PriceBucket.retailer, PriceBucket.avg_price,
+                   bucket_epoch if bucket_epoch is not None else PriceBucket.bucket_start,
+                   PriceBucket.samples, PriceBucket.low, PriceBucket.high, PriceBucket.close)
+            .where(PriceBucket.product_id.in_(chunk),
+                   PriceBucket.bucket_start >= since,
+                   PriceBucket.avg_price.isnot(None))
+        ):
+            bucket_rows.append(row[:4])
+            bucket_extra.append(row[4:])
+    if not rows and not bucket_rows:
+        return None
+
+    if rows:
+        product, retailer, price, ts = _arrays(rows, raw_epoch is not None)
+        columns = {"product": product, "retailer": retailer, "price": price, "ts": ts,
+                   "weight": np.ones(len(price)), "low": price, "high": price, "close": price}
+        if not bucket_rows:
+            return columns  # already sorted by the query
+    if bucket_rows:
+        product, retailer, price, ts = _arrays(bucket_rows, bucket_epoch is not None)
+        samples, low, high, close = (np.array(col, dtype=np.float64) for col in zip(*bucket_extra))
+        buckets = {"product": product, "retailer": retailer, "price": price, "ts": ts,
+                   "weight": np.nan_to_num(samples, nan=1.0), "low": np.where(np.isnan(low), price, low),
+                   "high": np.where(np.isnan(high), price, high), "close": np.where(np.isnan(close), price, close)}
+        if not rows:
+            columns = buckets
+        else:
+            columns = {key: np.concatenate((columns[key], buckets[key])) for key in columns}
+    _, retailer_codes = np.unique(columns["retailer"], return_inverse=True)
+    return _take(columns, np.lexsort((columns["ts"], retailer_codes, columns["product"])))
+
+
+def _take(columns, order):
+    return {key: values[order] for key, values in columns.items()}
+
+
+def _starts(*keys):
+    # index where each run of equal keys begins (input already sorted by the keys)
+    n = len(keys[0])
+    changed = np.zeros(n, dtype=bool)
+    changed[0] = True
+    for key in keys:
+        changed[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(changed)
+
+
+def _group_stats(columns, starts, now: float, window_days: int, percentiles):
+    """Stats for each group of consecutive observations (time-ordered inside a group).
+    Returns a dict of arrays, one entry per group."""
+    price, ts, weight = columns["price"], columns["ts"], columns["weight"]
+    n = len(price)
+    lengths = np.diff(np.append(starts, n))
+    ends = starts + lengths - 1
+    group = np.repeat(np.arange(len(starts)), lengths)
+
+    counts = np.add.reduceat(weight, starts)
+    mean = np.add.reduceat(weight * price, starts) / counts
+    var = np.maximum(np.add.reduceat(weight * price * price, starts) / counts - mean * mean, 0.0)
+
+    # percentiles by linear interpolation on each group's sorted prices, a bucket
+    # occupying `weight` consecutive ranks
+    order = np.lexsort((price, group))
+    sorted_price = price[order]
+    rank_ends = np.cumsum(weight[order])
+    group_base = np.concatenate(([0.0], rank_ends))[starts]
+
+    def at_rank(rank):
+        return sorted_price[np.searchsorted(rank_ends, group_base + rank, side="right")]
+
+    def percentile(q):
+        pos = (counts - 1) * (q / 100.0)
+        lo = np.floor(pos)
+        return at_rank(lo) + (at_rank(np.ceil(pos)) - at_rank(lo)) * (pos - lo)
+
+    # volatility: std dev of log price change between consecutive observations
+    log_price = np.log(np.where(price > 0, price, np.nan))
+    step = np.zeros(n)
+    has_step = np.zeros(n, dtype=bool)
+    has_step[1:] = group[1:] == group[:-1]
+    step[1:] = np.where(has_step[1:], log_price[1:] - log_price[:-1], 0.0)
+    step = np.nan_to_num(step)
+    steps = np.add.reduceat(has_step.astype(np.float64), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        step_mean = np.add.reduceat(step, starts) / steps
+        volatility = np.sqrt(np.maximum(np.add.reduceat(step * step, starts) / steps - step_mean ** 2, 0.0))
+    volatility[steps < 2] = np.nan
+
+    # trailing window: rolling average and lowest price of the last window_days
+    in_window = ts >= now - window_days * DAY
+    window_count = np.add.reduceat(np.where(in_window, weight, 0.0), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling = np.add.reduceat(np.where(in_window, weight * price, 0.0), starts) / window_count
+    window_low = np.minimum.reduceat(np.where(in_window, columns["low"], np.inf), starts)
+    window_low[window_count == 0] = np.nan
+
+    current = columns["close"][ends]
+    return {
+        "count": np.rint(counts).astype(np.int64),
+        "current": current,
+        "min": np.minimum.reduceat(columns["low"], starts),
+        "max": np.maximum.reduceat(columns["high"], starts),
+        "mean": mean,
+        "median": percentile(50),
+        "std": np.sqrt(var),
+        "percentiles": {f"p{q:g}": percentile(q) for q in percentiles},
+        "volatility": volatility,
+        "rolling_avg": rolling,
+        "window_low": window_low,
+        "at_window_low": current <= window_low + 1e-9,
+        "last_updated": ts[ends],
+    }
+
+
+def _column(values, digits: int = 2):
+    # numpy array -> python list, rounded, nan -> None (converted once, not per element)
+    values = np.round(np.asarray(values, dtype=np.float64), digits)
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _to_rows(stats, window_days: int):
+    """Dict of per-group arrays -> list of per-group stats dicts"""
+    columns = {key: _column(stats[key]) for key in
+               ("current", "min", "max", "mean", "median", "std", "rolling_avg", "window_low")}
+    percentiles = {name: _column(values) for name, values in stats["percentiles"].items()}
+    volatility = _column(stats["volatility"], 4)
+    counts = stats["count"].tolist()
+    at_low = stats["at_window_low"].tolist()
+    updated = [datetime.utcfromtimestamp(t).isoformat() for t in stats["last_updated"].tolist()]
+    return [
+        {
+            "count": counts[i],
+            "current": columns["current"][i],
+            "min": columns["min"][i],
+            "max": columns["max"][i],
+            "mean": columns["mean"][i],
+            "median": columns["median"][i],
+            "std": columns["std"][i],
+            "percentiles": {name: values[i] for name, values in percentiles.items()},
+            "volatility": volatility[i],
+            "window_days": window_days,
+            "rolling_avg": columns["rolling_avg"][i],
+            "window_low": columns["window_low"][i],
+            "at_window_low": at_low[i],
+            "last_updated": updated[i],
+        }
+        for i in range(len(counts))
+    ]
+
+
+def price_stats(db: Session, product_ids, days: int = 90, window_days: int = 7, percentiles=DEFAULT_PERCENTILES):
+    """{product_id: {"overall": {...}, "retailers": {retailer: {...}}}} over the last `days`.
+    Products without price data in that range are left out."""
+    columns = _load_columns(db, product_ids, days)
+    if columns is None:
+        return {}
+    product, retailer = columns["product"], columns["retailer"]
+    now = _epoch(datetime.utcnow())
+
+    # per retailer
+    starts = _starts(product, retailer)
+    by_retailer = _group_stats(columns, starts, now, window_days, percentiles)
+
+    # per product across retailers - re-sort by (product, time)
+    by_product = _take(columns, np.lexsort((columns["ts"], product)))
+    product_sorted = by_product["product"]
+    product_starts = _starts(product_sorted)
+    overall = _group_stats(by_product, product_starts, now, window_days, percentiles)
+    # "current" across retailers is the cheapest current offer, and the mixed series has no volatility
+    retailer_product = product[starts]
+    overall["current"] = np.minimum.reduceat(by_retailer["current"], _starts(retailer_product))
+    overall["at_window_low"] = overall["current"] <= overall["window_low"] + 1e-9
+    overall["volatility"][:] = np.nan
+
+    result = {}
+    for product_id, stats in zip(product_sorted[product_starts].tolist(), _to_rows(overall, window_days)):
+        result[product_id] = {"product_id": product_id, "overall": stats, "retailers": {}}
+    for product_id, name, stats in zip(retailer_product.tolist(), retailer[starts].tolist(),
+                                       _to_rows(by_retailer, window_days)):
+        result[product_id]["retailers"][name] = stats
+    return result
+
+
+def daily_series(db: Session, product_id: int, days: int = 90, window_days: int = 7):
+    """Per retailer: daily average price and its trailing window_days rolling average"""
+    columns = _load_columns(db, [product_id], days)
+    if columns is None:
+        return {}
+    retailer, price, ts, weight = columns["retailer"], columns["price"], columns["ts"], columns["weight"]
+    day = np.floor(ts / DAY).astype(np.int64)
+    series = {}
+    starts = _starts(retailer)
+    for start, end in zip(starts, np.append(starts[1:], len(price))):
+        offset = day[start:end] - day[start:end].min()
+        span = int(offset.max()) + 1
+        sums = np.bincount(offset, weights=(weight * price)[start:end], minlength=span)
+        counts = np.bincount(offset, weights=weight[start:end], minlength=span)
+        cum_sums = np.concatenate(([0.0], np.cumsum(sums)))
+        cum_counts = np.concatenate(([0.0], np.cumsum(counts)))
+        idx = np.arange(span)
+        lo = np.maximum(idx + 1 - window_days, 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rolling = (cum_sums[idx + 1] - cum_sums[lo]) / (cum_counts[idx + 1] - cum_counts[lo])
+            daily = sums / counts
+        first_day = int(day[start:end].min())
+        series[retailer[start]] = [
+            {"date": datetime.utcfromtimestamp((first_day + d) * DAY).date().isoformat(),
+             "avg": round(float(daily[d]), 2), "rolling_avg": round(float(rolling[d]), 2)}
+            for d in np.flatnonzero(counts).tolist()
+        ]
+    return series
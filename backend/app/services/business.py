@@ -1,22 +1,65 @@
 # business.py - all the database queries live here
-# separated into classes: ProductService, PriceHistoryService, AlertService
+# separated into classes: ProductService, PriceHistoryService, ListingService, AlertService
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.product import Product
 from app.models.price_history import PriceHistory
+from app.models.current_offer import CurrentOffer
+from app.models.price_bucket import PriceBucket
+from app.models.product_listing import ProductListing
 from app.models.alert import Alert
 from app.models.recommendation import Recommendation
-from sqlalchemy import and_, desc
+from app.services import search_index, recommender, compaction, catalog
+from app.services.alert_index import alert_index
+from app.services.query_cache import query_cache
+from app.services.notifier import notifier
+from sqlalchemy import and_, desc, exists, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from config import settings
 from datetime import datetime, timedelta
 import random
+import sqlite3
+
+# max product ids per IN (...) when loading latest prices
+LATEST_PRICES_CHUNK = 500
+
+# price_histories columns copied into current_offers
+CURRENT_OFFER_FIELDS = ["price", "original_price", "discount_percent", "url",
+                        "in_stock", "rating", "review_count", "created_at"]
+
+
+def _insert_returning_ids(db: Session, model, rows):
+    # one executemany INSERT ... RETURNING id when the driver can keep the order,
+    # otherwise let the ORM batch the inserts (still no per-row refresh)
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+        return list(db.scalars(stmt, rows))
+    objects = [model(**row) for row in rows]
+    db.add_all(objects)
+    db.flush()
+    return [obj.id for obj in objects]
+
+
+def _batches(rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        yield rows[i:i + batch_size]
 
 
 # handles all product related queries
 class ProductService:
     @staticmethod
-    def search_products(db: Session, query: str, category: str = None):
-        # search by name or description, filter by category if given
-        q = db.query(Product)
+    def search_products(db: Session, query: str, category: str = None, limit: int = None, offset: int = 0,
+                        columns=None):
+        # ranked full-text search when the index exists (see search_index.py)
+        # with columns (Product attributes) plain rows of just those come back instead of Products
+        if query:
+            ranked = search_index.search(db, query, category, limit, offset, columns)
+            if ranked is not None:
+                return ranked
+
+        # fallback: search by name or description, filter by category if given
+        q = db.query(*columns) if columns else db.query(Product)
         
         if query:
             q = q.filter(Product.name.ilike(f"%{query}%") | Product.description.ilike(f"%{query}%"))
@@ -24,12 +67,28 @@ class ProductService:
         if category:
             q = q.filter(Product.category.ilike(f"%{category}%"))
         
+        q = q.order_by(Product.id)
+        if offset:
+            q = q.offset(offset)
+        if limit:
+            q = q.limit(limit)
         return q.all()
 
+    @staticmethod
+    async def search_products_async(db: AsyncSession, query: str, category: str = None, limit: int = None, offset: int = 0,
+                                    columns=None):
+        # same code path as search_products (the full-text SQL differs per dialect), run on the async connection
+        return await db.run_sync(ProductService.search_products, query, category, limit, offset, columns)
+
     @staticmethod
     def get_product_by_id(db: Session, product_id: int):
-        # find one product by its id
-        return db.query(Product).filter(Product.id == product_id).first()
+        # find one product by its id, through the read-through cache (see query_cache.py)
+        return query_cache.get_or_load(
+            "product", product_id, lambda: db.query(Product).filter(Product.id == product_id).first())
+
+    @staticmethod
+    async def get_product_by_id_async(db: AsyncSession, product_id: int):
+        return await query_cache.get_or_load_async("product", product_id, lambda: db.get(Product, product_id))
 
     @staticmethod
     def create_product(db: Session, name: str, description: str, category: str, image_url: str = None, brand: str = None, tags: str = None, rating: float = None):
@@ -46,41 +105,392 @@ class ProductService:
         db.add(product)
         db.commit()
         db.refresh(product)
+        query_cache.invalidate_products([product.id])
         return product
 
+    @staticmethod
+    def bulk_create_products(db: Session, products, batch_size: int = None):
+        """Insert many products (dicts of Product columns), committing every batch_size rows.
+        Returns the new ids in the same order as the input."""
+        batch_size = batch_size or settings.ingest_batch_size
+        ids = []
+        for batch in _batches(list(products), batch_size):
+            ids.extend(_insert_returning_ids(db, Product, batch))
+            db.commit()
+        return ids
+
+    @staticmethod
+    def get_products_by_ids(db: Session, product_ids):
+        # load many products in one query, keeping the order of product_ids
+        if not product_ids:
+            return []
+        by_id = {p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()}
+        return [by_id[pid] for pid in product_ids if pid in by_id]
+
     @staticmethod
     def get_all_products(db: Session):
         # get every product in the database
         return db.query(Product).all()
 
+    @staticmethod
+    def _products_page_stmt(limit: int = None, after_id: int = None, columns=None):
+        # keyset pagination on id, cheaper than offset on big tables
+        stmt = select(*columns) if columns else select(Product)
+        if after_id is not None:
+            stmt = stmt.where(Product.id > after_id)
+        stmt = stmt.order_by(Product.id.asc())
+        if limit:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    @staticmethod
+    def get_products_page(db: Session, limit: int = None, after_id: int = None, columns=None):
+        # with columns, plain rows of just those (see fast_json.py)
+        stmt = ProductService._products_page_stmt(limit, after_id, columns)
+        return db.execute(stmt).all() if columns else db.scalars(stmt).all()
+
+    @staticmethod
+    async def get_products_page_async(db: AsyncSession, limit: int = None, after_id: int = None, columns=None):
+        stmt = ProductService._products_page_stmt(limit, after_id, columns)
+        return (await db.execute(stmt)).all() if columns else (await db.scalars(stmt)).all()
+
+    @staticmethod
+    def get_product_details(db: Session, product_ids, history_days: int = None, resolution: str = "raw"):
+        """What the product page shows, for many products from one query per table: the product,
+        its current offers (newest first), the lowest price and best deal among them, and with
+        history_days its price history ("raw" rows, "hour"/"day" buckets, or "auto").
+        Returns {product_id: {...}} for the ids that exist."""
+        products = ProductService.get_products_by_ids(db, product_ids)
+        found = [product.id for product in products]
+        offers = PriceHistoryService.get_current_offers(db, found)
+        history = None
+        if history_days is not None and found:
+            if resolution == "auto":
+                resolution = PriceHistoryService.history_resolution(history_days)
+            if resolution == "raw":
+                history = PriceHistoryService.get_price_history_for_products(db, found, history_days)
+            else:
+                history = PriceHistoryService.get_price_history_buckets_for_products(db, found, history_days, resolution)
+
+        details = {}
+        for product in products:
+            product_offers = offers.get(product.id, [])
+            details[product.id] = {
+                "product": product,
+                "offers": product_offers,
+                "lowest": PriceHistoryService.lowest_offer(product_offers),
+                "best_deal": PriceHistoryService.best_deal_offer(product_offers),
+                "history": history.get(product.id, []) if history is not None else None,
+            }
+        return details
+
+    @staticmethod
+    async def get_product_details_async(db: AsyncSession, product_ids, history_days: int = None,
+                                        resolution: str = "raw"):
+        return await db.run_sync(ProductService.get_product_details, product_ids, history_days, resolution)
+
+    @staticmethod
+    def merge_products(db: Session, canonical_id: int, duplicate_ids):
+        """Fold duplicate products into the canonical one: history, buckets and alerts move
+        over, stale recommendations go, current_offers is rebuilt. Commits."""
+        duplicate_ids = [d for d in duplicate_ids if d != canonical_id]
+        if not duplicate_ids:
+            return 0
+        for duplicate_id in duplicate_ids:
+            # a point the canonical product already has for the same retailer/time is dropped
+            for model, time_column in ((PriceHistory, "created_at"), (PriceBucket, "bucket_start")):
+                kept = aliased(model)
+                clash = exists().where(
+                    kept.product_id == canonical_id,
+                    kept.retailer == model.retailer,
+                    getattr(kept, time_column) == getattr(model, time_column),
+                    *([kept.resolution == model.resolution] if model is PriceBucket else [])
+                )
+                db.query(model).filter(model.product_id == duplicate_id, clash).delete(synchronize_session=False)
+                db.query(model).filter(model.product_id == duplicate_id).update(
+                    {model.product_id: canonical_id}, synchronize_session=False)
+
+        db.query(Alert).filter(Alert.product_id.in_(duplicate_ids)).update(
+            {Alert.product_id: canonical_id}, synchronize_session=False)
+        db.query(ProductListing).filter(ProductListing.product_id.in_(duplicate_ids)).update(
+            {ProductListing.product_id: canonical_id}, synchronize_session=False)
+        db.query(Recommendation).filter(or_(
+            Recommendation.product_id.in_(duplicate_ids),
+            Recommendation.recommended_product_id.in_(duplicate_ids)
+        )).delete(synchronize_session=False)
+        db.query(CurrentOffer).filter(CurrentOffer.product_id.in_(duplicate_ids + [canonical_id])).delete(
+            synchronize_session=False)
+        db.query(Product).filter(Product.id.in_(duplicate_ids)).delete(synchronize_session=False)
+        PriceHistoryService.rebuild_current_offers(db, [canonical_id])
+        query_cache.invalidate_products(duplicate_ids)
+        return len(duplicate_ids)
+
 
 # handles price data queries
 class PriceHistoryService:
+    @staticmethod
+    def _price_comparison_stmt(product_id: int):
+        # latest price from each retailer for one product
+        return select(CurrentOffer).where(
+            CurrentOffer.product_id == product_id
+        ).order_by(CurrentOffer.created_at.desc())
+
     @staticmethod
     def get_price_comparison(db: Session, product_id: int):
-        # get latest price from each retailer for one product
-        all_prices = db.query(PriceHistory).filter(
-            PriceHistory.product_id == product_id
-        ).order_by(PriceHistory.created_at.desc()).all()
-        
-        # keep only the latest price per retailer
-        prices_by_retailer = {}
-        for price_entry in all_prices:
-            if price_entry.retailer not in prices_by_retailer:
-                prices_by_retailer[price_entry.retailer] = price_entry
-        
-        return list(prices_by_retailer.values())
+        return query_cache.get_or_load(
+            "offers", product_id, lambda: db.scalars(PriceHistoryService._price_comparison_stmt(product_id)).all())
+
+    @staticmethod
+    async def get_price_comparison_async(db: AsyncSession, product_id: int):
+        async def load():
+            return (await db.scalars(PriceHistoryService._price_comparison_stmt(product_id))).all()
+        return await query_cache.get_or_load_async("offers", product_id, load)
+
+    @staticmethod
+    def _current_offers_stmts(product_ids=None, columns=None):
+        # one statement per LATEST_PRICES_CHUNK ids (a single one for "all products")
+        stmt = (select(*columns) if columns else select(CurrentOffer)).order_by(CurrentOffer.product_id, CurrentOffer.created_at.desc())
+        if product_ids is None:
+            return [stmt]
+        return [stmt.where(CurrentOffer.product_id.in_(product_ids[i:i + LATEST_PRICES_CHUNK]))
+                for i in range(0, len(product_ids), LATEST_PRICES_CHUNK)]
+
+    @staticmethod
+    def get_current_offers(db: Session, product_ids=None, columns=None):
+        """Current offers for many products, pass None for all of them.
+        Returns {product_id: [CurrentOffer, ...]}, or plain rows of columns (which must
+        include CurrentOffer.product_id)"""
+        result = {}
+        for stmt in PriceHistoryService._current_offers_stmts(product_ids, columns):
+            for offer in (db.execute(stmt) if columns else db.scalars(stmt)):
+                result.setdefault(offer.product_id, []).append(offer)
+        return result
+
+    @staticmethod
+    async def get_current_offers_async(db: AsyncSession, product_ids=None, columns=None):
+        """Async get_current_offers"""
+        result = {}
+        for stmt in PriceHistoryService._current_offers_stmts(product_ids, columns):
+            for offer in (await db.execute(stmt) if columns else await db.scalars(stmt)):
+                result.setdefault(offer.product_id, []).append(offer)
+        return result
+
+    @staticmethod
+    def get_latest_prices_for_products(db: Session, product_ids=None):
+        """Latest price per retailer for many products in one set-based query.
+        Pass product_ids=None for every product. Returns {product_id: [PriceHistory, ...]}"""
+        if product_ids is not None and not product_ids:
+            return {}
+
+        # keep the IN list under sqlite's bound parameter limit
+        if product_ids is not None and len(product_ids) > LATEST_PRICES_CHUNK:
+            result = {}
+            for i in range(0, len(product_ids), LATEST_PRICES_CHUNK):
+                chunk = product_ids[i:i + LATEST_PRICES_CHUNK]
+                result.update(PriceHistoryService.get_latest_prices_for_products(db, chunk))
+            return result
+
+        result = {}
+        for price in PriceHistoryService._latest_prices_query(db, product_ids).all():
+            result.setdefault(price.product_id, []).append(price)
+        return result
+
+    @staticmethod
+    def _latest_prices_query(db: Session, product_ids=None):
+        # builds the "newest row per (product_id, retailer)" query for this dialect
+        def scoped(q):
+            if product_ids is not None:
+                q = q.filter(PriceHistory.product_id.in_(product_ids))
+            return q
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            # postgres keeps the first row of each (product, retailer) group
+            return scoped(db.query(PriceHistory)).distinct(
+                PriceHistory.product_id, PriceHistory.retailer
+            ).order_by(
+                PriceHistory.product_id, PriceHistory.retailer,
+                PriceHistory.created_at.desc(), PriceHistory.id.desc()
+            )
+
+        if dialect == "sqlite" and sqlite3.sqlite_version_info < (3, 25, 0):
+            # old sqlite has no window functions, join on the newest timestamp instead
+            # (uq_product_retailer_date guarantees one row per match)
+            newest = scoped(db.query(
+                PriceHistory.product_id,
+                PriceHistory.retailer,
+                func.max(PriceHistory.created_at).label("created_at")
+            )).group_by(PriceHistory.product_id, PriceHistory.retailer).subquery()
+            return db.query(PriceHistory).join(newest, and_(
+                PriceHistory.product_id == newest.c.product_id,
+                PriceHistory.retailer == newest.c.retailer,
+                PriceHistory.created_at == newest.c.created_at
+            ))
+
+        ranked = scoped(db.query(
+            PriceHistory.id,
+            func.row_number().over(
+                partition_by=(PriceHistory.product_id, PriceHistory.retailer),
+                order_by=(PriceHistory.created_at.desc(), PriceHistory.id.desc())
+            ).label("rn")
+        )).subquery()
+        return db.query(PriceHistory).join(
+            ranked, PriceHistory.id == ranked.c.id
+        ).filter(ranked.c.rn == 1)
+
+    @staticmethod
+    def upsert_current_offers(db: Session, price_rows):
+        """Push freshly flushed PriceHistory rows (objects or dicts with an id) into current_offers,
+        and refresh those products' catalog summaries. Runs in the caller's transaction, the caller commits."""
+        # newest row per (product, retailer) - one statement can't touch a key twice
+        newest = {}
+        for row in price_rows:
+            if not isinstance(row, dict):
+                row = {field: getattr(row, field) for field in ["id", "product_id", "retailer"] + CURRENT_OFFER_FIELDS}
+            key = (row["product_id"], row["retailer"])
+            if key not in newest or (row["created_at"], row["id"]) >= (newest[key]["created_at"], newest[key]["id"]):
+                newest[key] = row
+        if not newest:
+            return
+
+        values = [
+            dict(product_id=row["product_id"], retailer=row["retailer"], price_history_id=row["id"],
+                 **{field: row.get(field) for field in CURRENT_OFFER_FIELDS})
+            for row in newest.values()
+        ]
+
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = dialect_insert(CurrentOffer)
+            table = CurrentOffer.__table__
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.product_id, table.c.retailer],
+                set_={col: stmt.excluded[col] for col in ["price_history_id"] + CURRENT_OFFER_FIELDS},
+                # never let an older backfilled row overwrite a newer offer
+                where=stmt.excluded.created_at >= table.c.created_at
+            )
+            for i in range(0, len(values), LATEST_PRICES_CHUNK):
+                db.execute(stmt, values[i:i + LATEST_PRICES_CHUNK])
+        else:
+            # other databases: plain read-then-write
+            for value in values:
+                offer = db.get(CurrentOffer, (value["product_id"], value["retailer"]))
+                if offer is None:
+                    db.add(CurrentOffer(**value))
+                elif value["created_at"] >= offer.created_at:
+                    for field, field_value in value.items():
+                        setattr(offer, field, field_value)
+            db.flush()
+        catalog.refresh_summaries(db, [product_id for product_id, _ in newest])
 
     @staticmethod
-    def get_price_history(db: Session, product_id: int, days: int = 30):
-        """Get historical prices for a product"""
+    def rebuild_current_offers(db: Session, product_ids=None):
+        """Rebuild current_offers from price_histories (all products if product_ids is None)"""
+        delete_q = db.query(CurrentOffer)
+        if product_ids is not None:
+            delete_q = delete_q.filter(CurrentOffer.product_id.in_(product_ids))
+        delete_q.delete(synchronize_session=False)
+
+        columns = ["product_id", "retailer", "price_history_id"] + CURRENT_OFFER_FIELDS
+        latest = PriceHistoryService._latest_prices_query(db, product_ids).with_entities(
+            PriceHistory.product_id, PriceHistory.retailer, PriceHistory.id,
+            *[getattr(PriceHistory, field) for field in CURRENT_OFFER_FIELDS]
+        )
+        db.execute(insert(CurrentOffer).from_select(columns, latest.statement))
+        catalog.refresh_summaries(db, product_ids)
+        db.commit()
+        if product_ids is None:
+            query_cache.clear()
+        else:
+            query_cache.invalidate_products(product_ids)
+        return db.query(CurrentOffer).count()
+
+    @staticmethod
+    def ensure_current_offers(db: Session):
+        """Build current_offers once if it's empty but history isn't (first run after upgrade)"""
+        if db.query(CurrentOffer.product_id).first() is None and db.query(PriceHistory.id).first() is not None:
+            print("current_offers is empty, rebuilding from price history...")
+            PriceHistoryService.rebuild_current_offers(db)
+
+    @staticmethod
+    def _price_history_stmt(product_id: int, days: int = 30, columns=None):
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        return db.query(PriceHistory).filter(
+        return (select(*columns) if columns else select(PriceHistory)).where(
             and_(
                 PriceHistory.product_id == product_id,
                 PriceHistory.created_at >= cutoff_date
             )
-        ).order_by(PriceHistory.created_at.asc()).all()
+        ).order_by(PriceHistory.created_at.asc())
+
+    @staticmethod
+    def get_price_history(db: Session, product_id: int, days: int = 30, columns=None):
+        """Get historical prices for a product (plain rows of columns when given)"""
+        stmt = PriceHistoryService._price_history_stmt(product_id, days, columns)
+        return db.execute(stmt).all() if columns else db.scalars(stmt).all()
+
+    @staticmethod
+    async def get_price_history_async(db: AsyncSession, product_id: int, days: int = 30, columns=None):
+        stmt = PriceHistoryService._price_history_stmt(product_id, days, columns)
+        return (await db.execute(stmt)).all() if columns else (await db.scalars(stmt)).all()
+
+    @staticmethod
+    def get_price_history_for_products(db: Session, product_ids, days: int = 30):
+        """get_price_history for many products. Returns {product_id: [PriceHistory, ...]}"""
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        result = {}
+        for i in range(0, len(product_ids), LATEST_PRICES_CHUNK):
+            for row in db.scalars(select(PriceHistory).where(
+                PriceHistory.product_id.in_(product_ids[i:i + LATEST_PRICES_CHUNK]),
+                PriceHistory.created_at >= cutoff_date
+            ).order_by(PriceHistory.product_id, PriceHistory.created_at.asc())):
+                result.setdefault(row.product_id, []).append(row)
+        return result
+
+    @staticmethod
+    def history_resolution(days: int):
+        """Coarsest tier that's fully raw/hourly for this range ("auto" resolution)"""
+        if days <= settings.history_raw_days:
+            return "raw"
+        if days <= settings.history_hourly_days:
+            return "hour"
+        return "day"
+
+    @staticmethod
+    def get_price_history_buckets(db: Session, product_id: int, days: int = 30, resolution: str = "hour"):
+        """Price history as OHLC buckets ("hour" or "day"), combining raw rows with the
+        compacted tiers. Ranges only kept as daily buckets stay daily even for "hour"."""
+        return PriceHistoryService.get_price_history_buckets_for_products(
+            db, [product_id], days, resolution).get(product_id, [])
+
+    @staticmethod
+    def get_price_history_buckets_for_products(db: Session, product_ids, days: int = 30, resolution: str = "hour"):
+        """get_price_history_buckets for many products. Returns {product_id: [bucket, ...]}"""
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        pieces = []
+        for i in range(0, len(product_ids), LATEST_PRICES_CHUNK):
+            chunk = product_ids[i:i + LATEST_PRICES_CHUNK]
+            raw = db.query(PriceHistory.product_id, PriceHistory.retailer, PriceHistory.price,
+                           PriceHistory.created_at).filter(
+                PriceHistory.product_id.in_(chunk),
+                PriceHistory.created_at >= cutoff_date,
+                PriceHistory.price.isnot(None)
+            ).all()
+            stored = db.query(*compaction.BUCKET_COLUMNS).filter(
+                PriceBucket.product_id.in_(chunk),
+                PriceBucket.bucket_start >= compaction.floor_time(cutoff_date, "day")
+            ).all()
+            pieces += [compaction.raw_piece(*row) for row in raw] + [compaction.bucket_piece(b) for b in stored]
+        result = {}
+        for bucket in sorted(compaction.merge_pieces(pieces, resolution),
+                             key=lambda b: (b["product_id"], b["bucket_start"], b["retailer"])):
+            result.setdefault(bucket["product_id"], []).append(bucket)
+        return result
+
+    @staticmethod
+    async def get_price_history_buckets_async(db: AsyncSession, product_id: int, days: int = 30,
+                                              resolution: str = "hour"):
+        return await db.run_sync(PriceHistoryService.get_price_history_buckets, product_id, days, resolution)
 
     @staticmethod
     def add_price_record(db: Session, product_id: int, retailer: str, price: float, 
@@ -100,26 +510,202 @@ class PriceHistoryService:
             in_stock=in_stock
         )
         db.add(price_history)
+        db.flush()
+        PriceHistoryService.upsert_current_offers(db, [price_history])
         db.commit()
+        query_cache.invalidate_products([product_id])
         db.refresh(price_history)
+        AlertService.trigger_for_prices(db, [(product_id, retailer, price)])
         return price_history
 
+    @staticmethod
+    def bulk_add_price_records(db: Session, records, batch_size: int = None, only_changed: bool = False):
+        """Insert many price records (dicts with product_id, retailer, price and optionally
+        original_price, url, in_stock, rating, review_count, created_at).
+        current_offers is updated in the same transaction as each batch.
+        With only_changed, records whose price and stock match the current offer are skipped.
+        Records sharing a product, retailer and created_at (the default is one timestamp for
+        the whole call) would break uq_product_retailer_date, so only the cheapest is written.
+        Returns the new ids in the same order as the input (None for skipped records)."""
+        batch_size = batch_size or settings.ingest_batch_size
+        now = datetime.utcnow()
+        rows = []
+        for record in records:
+            row = dict(record)
+            original_price = row.get("original_price")
+            if "discount_percent" not in row:
+                row["discount_percent"] = 0
+                if original_price and original_price > 0:
+                    row["discount_percent"] = ((original_price - row["price"]) / original_price) * 100
+            row.setdefault("in_stock", "in_stock")
+            row.setdefault("created_at", now)
+            rows.append(row)
+
+        # one row per slot of the unique key, cheapest first
+        slots = {}
+        for i, row in enumerate(rows):
+            slot = (row["product_id"], row["retailer"], row["created_at"])
+            if slot not in slots or row["price"] < rows[slots[slot]]["price"]:
+                slots[slot] = i
+
+        ids = [None] * len(rows)
+        for positions in _batches(sorted(slots.values()), batch_size):
+            batch = [rows[i] for i in positions]
+            keep = list(range(len(batch)))
+            if only_changed:
+                unchanged = PriceHistoryService._unchanged_rows(db, batch)
+                keep = [i for i in keep if i not in unchanged]
+            written = [batch[i] for i in keep]
+            if written:
+                for i, row_id in zip(keep, _insert_returning_ids(db, PriceHistory, written)):
+                    batch[i]["id"] = ids[positions[i]] = row_id
+                PriceHistoryService.upsert_current_offers(db, written)
+                db.commit()
+                query_cache.invalidate_products([r["product_id"] for r in written])
+                AlertService.trigger_for_prices(db, [(r["product_id"], r["retailer"], r["price"]) for r in written])
+        return ids
+
+    @staticmethod
+    def _unchanged_rows(db: Session, rows):
+        # indexes of rows whose price and stock are what current_offers already says
+        product_ids = list({row["product_id"] for row in rows})
+        current = {}
+        for i in range(0, len(product_ids), LATEST_PRICES_CHUNK):
+            current.update(((product_id, retailer), (price, in_stock)) for product_id, retailer, price, in_stock in
+                           db.query(CurrentOffer.product_id, CurrentOffer.retailer, CurrentOffer.price,
+                                    CurrentOffer.in_stock).filter(
+                               CurrentOffer.product_id.in_(product_ids[i:i + LATEST_PRICES_CHUNK])))
+        unchanged = set()
+        for i, row in enumerate(rows):
+            offer = current.get((row["product_id"], row["retailer"]))
+            if offer and offer[0] is not None and abs(offer[0] - row["price"]) < 0.005 and offer[1] == row["in_stock"]:
+                unchanged.add(i)
+        return unchanged
+
+    @staticmethod
+    def lowest_offer(offers):
+        # cheapest of a product's current offers
+        return min(offers, key=lambda x: x.price) if offers else None
+
+    @staticmethod
+    def best_deal_offer(offers):
+        # biggest discount among a product's current offers
+        return max(offers, key=lambda x: x.discount_percent) if offers else None
+
     @staticmethod
     def get_lowest_price(db: Session, product_id: int):
         """Get the lowest current price"""
-        latest = PriceHistoryService.get_price_comparison(db, product_id)
-        if latest:
-            return min(latest, key=lambda x: x.price)
-        return None
+        return PriceHistoryService.lowest_offer(PriceHistoryService.get_price_comparison(db, product_id))
 
     @staticmethod
     def get_best_deal(db: Session, product_id: int):
         """Get the best discount"""
-        latest = PriceHistoryService.get_price_comparison(db, product_id)
-        if latest:
-            return max(latest, key=lambda x: x.discount_percent)
+        return PriceHistoryService.best_deal_offer(PriceHistoryService.get_price_comparison(db, product_id))
+
+    @staticmethod
+    async def get_lowest_price_async(db: AsyncSession, product_id: int):
+        return PriceHistoryService.lowest_offer(await PriceHistoryService.get_price_comparison_async(db, product_id))
+
+    @staticmethod
+    async def get_best_deal_async(db: AsyncSession, product_id: int):
+        return PriceHistoryService.best_deal_offer(await PriceHistoryService.get_price_comparison_async(db, product_id))
+
+
+# handles retailer listings - what makes re-fetching the same upstream item idempotent
+class ListingService:
+    @staticmethod
+    def external_id(*candidates, url: str = None):
+        """Stable upstream id of a listing: the first id the retailer gave us, else the url
+        without its query string (tracking params change between fetches)"""
+        for candidate in candidates:
+            if candidate not in (None, ""):
+                return str(candidate)[:255]
+        if url:
+            return url.split("?", 1)[0].split("#", 1)[0][:255]
         return None
 
+    @staticmethod
+    def get_listing_products(db: Session, keys):
+        """{(retailer, external_id): product_id} for the listings among keys we already know"""
+        by_retailer = {}
+        for retailer, external_id in keys:
+            if external_id:
+                by_retailer.setdefault(retailer, set()).add(external_id)
+        found = {}
+        for retailer, external_ids in by_retailer.items():
+            external_ids = list(external_ids)
+            for i in range(0, len(external_ids), LATEST_PRICES_CHUNK):
+                found.update(((retailer, external_id), product_id) for external_id, product_id in
+                             db.query(ProductListing.external_id, ProductListing.product_id).filter(
+                                 ProductListing.retailer == retailer,
+                                 ProductListing.external_id.in_(external_ids[i:i + LATEST_PRICES_CHUNK])))
+        return found
+
+    @staticmethod
+    def upsert_listings(db: Session, rows):
+        """Insert new listings and refresh known ones (dicts with retailer, external_id, product_id,
+        title, url, price, in_stock). A known listing keeps the product it already points at.
+        Runs in the caller's transaction, the caller commits."""
+        now = datetime.utcnow()
+        # one statement can't touch a key twice, the last sighting wins
+        values = {}
+        for row in rows:
+            if row.get("external_id"):
+                values[(row["retailer"], row["external_id"])] = dict(
+                    retailer=row["retailer"], external_id=row["external_id"], product_id=row["product_id"],
+                    title=(row.get("title") or "")[:255] or None, url=row.get("url"), price=row.get("price"),
+                    in_stock=row.get("in_stock", "in_stock"), first_seen_at=now, last_seen_at=now)
+        values = list(values.values())
+        if not values:
+            return 0
+
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = dialect_insert(ProductListing)
+            table = ProductListing.__table__
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.retailer, table.c.external_id],
+                set_={col: stmt.excluded[col] for col in ["title", "url", "price", "in_stock", "last_seen_at"]}
+            )
+            for batch in _batches(values, settings.ingest_batch_size):
+                db.execute(stmt, batch)
+            return len(values)
+
+        # other databases: plain read-then-write
+        for value in values:
+            listing = db.query(ProductListing).filter(
+                ProductListing.retailer == value["retailer"],
+                ProductListing.external_id == value["external_id"]).first()
+            if listing is None:
+                db.add(ProductListing(**value))
+            else:
+                for field in ["title", "url", "price", "in_stock", "last_seen_at"]:
+                    setattr(listing, field, value[field])
+        return len(values)
+
+    @staticmethod
+    def record_prices(db: Session, records, batch_size: int = None):
+        """Save what a fetch saw. records are price dicts with product_id, and optionally
+        external_id + title for the listing they came from. Every listing is upserted, then the
+        cheapest listing per product and retailer becomes a price record - only if the price
+        or stock changed since the current offer. A listing we already knew keeps its product,
+        so its price goes to that product, whatever product_id the caller resolved.
+        Returns (listings seen, prices written)."""
+        records = list(records)
+        listings = ListingService.upsert_listings(db, records)
+        db.commit()
+
+        owners = ListingService.get_listing_products(
+            db, [(record["retailer"], record.get("external_id")) for record in records])
+        records = [dict(record, product_id=owners.get((record["retailer"], record.get("external_id")),
+                                                      record["product_id"]))
+                   for record in records]
+        # bulk_add_price_records keeps the cheapest record per product and retailer
+        prices = [{k: v for k, v in record.items() if k not in ("external_id", "title")} for record in records]
+        ids = PriceHistoryService.bulk_add_price_records(db, prices, batch_size, only_changed=True)
+        return listings, sum(1 for i in ids if i is not None)
+
 
 class AlertService:
     @staticmethod
@@ -134,6 +720,7 @@ class AlertService:
         db.add(alert)
         db.commit()
         db.refresh(alert)
+        alert_index.add(alert.id, alert.product_id, alert.price_threshold, alert.target_retailer)
         return alert
 
     @staticmethod
@@ -141,27 +728,103 @@ class AlertService:
         """Get all active alerts"""
         return db.query(Alert).filter(Alert.is_active == True).all()
 
+    @staticmethod
+    def _crossed_alerts_condition():
+        # an untriggered active alert whose product has a current offer at or below the
+        # threshold (at its target retailer, if it has one)
+        crossed = exists().where(
+            CurrentOffer.product_id == Alert.product_id,
+            CurrentOffer.price <= Alert.price_threshold,
+            or_(Alert.target_retailer.is_(None), CurrentOffer.retailer == Alert.target_retailer)
+        )
+        return and_(Alert.is_active == True, Alert.triggered == False, crossed)
+
     @staticmethod
     def check_alerts(db: Session):
-        """Check if any alerts should be triggered"""
-        active_alerts = AlertService.get_active_alerts(db)
-        triggered_alerts = []
-        
-        for alert in active_alerts:
-            # Get current prices for the product
-            prices = PriceHistoryService.get_price_comparison(db, alert.product_id)
-            
-            for price_entry in prices:
-                if alert.target_retailer and price_entry.retailer != alert.target_retailer:
-                    continue
-                
-                if price_entry.price <= alert.price_threshold and not alert.triggered:
-                    alert.triggered = True
-                    alert.triggered_at = datetime.utcnow()
-                    triggered_alerts.append(alert)
-        
+        """Trigger every alert whose price has been reached, in one set-based pass.
+        Returns rows with id, product_id and price_threshold for each newly triggered alert."""
+        condition = AlertService._crossed_alerts_condition()
+        now = datetime.utcnow()
+        columns = (Alert.id, Alert.product_id, Alert.price_threshold)
+
+        if db.get_bind().dialect.update_returning:
+            # single UPDATE ... WHERE EXISTS (...) RETURNING, nothing loaded into python first
+            triggered = db.execute(
+                update(Alert).where(condition).values(triggered=True, triggered_at=now).returning(*columns),
+                execution_options={"synchronize_session": False}
+            ).all()
+        else:
+            triggered = db.execute(select(*columns).where(condition)).all()
+            ids = [row.id for row in triggered]
+            for chunk in _batches(ids, LATEST_PRICES_CHUNK):
+                db.execute(
+                    update(Alert).where(Alert.id.in_(chunk)).values(triggered=True, triggered_at=now),
+                    execution_options={"synchronize_session": False}
+                )
+
         db.commit()
-        return triggered_alerts
+        for row in triggered:
+            notifier.publish({
+                "alert_id": row.id,
+                "product_id": row.product_id,
+                "price_threshold": row.price_threshold,
+                "retailer": None,
+                "price": None,
+                "triggered_at": now.isoformat(),
+            })
+        return triggered
+
+    @staticmethod
+    def trigger_for_prices(db: Session, prices):
+        """Trigger the alerts crossed by just-written (product_id, retailer, price) rows and
+        queue a notification for each. Only the alerts on those products are looked at."""
+        removed = []
+        try:
+            alert_index.ensure_loaded(db)
+            candidates = alert_index.pop_crossed(prices, removed)
+            if not candidates:
+                return []
+
+            now = datetime.utcnow()
+            columns = (Alert.id, Alert.product_id, Alert.price_threshold)
+            triggered = []
+            # the triggered == False guard keeps this exactly-once across processes
+            for chunk in _batches(list(candidates), LATEST_PRICES_CHUNK):
+                condition = and_(Alert.id.in_(chunk), Alert.is_active == True, Alert.triggered == False)
+                if db.get_bind().dialect.update_returning:
+                    triggered.extend(db.execute(
+                        update(Alert).where(condition).values(triggered=True, triggered_at=now).returning(*columns),
+                        execution_options={"synchronize_session": False}
+                    ).all())
+                else:
+                    rows = db.execute(select(*columns).where(condition)).all()
+                    db.execute(
+                        update(Alert).where(Alert.id.in_([row.id for row in rows])).values(
+                            triggered=True, triggered_at=now),
+                        execution_options={"synchronize_session": False}
+                    )
+                    triggered.extend(rows)
+            db.commit()
+        except Exception as e:
+            # never fail the price write over an alert - check_alerts will catch up
+            print(f"Incremental alert check failed: {e}")
+            db.rollback()
+            # nothing was triggered, so the alerts stay armed for the next crossing
+            for entry in removed:
+                alert_index.add(*entry)
+            return []
+
+        for row in triggered:
+            retailer, price = candidates[row.id]
+            notifier.publish({
+                "alert_id": row.id,
+                "product_id": row.product_id,
+                "price_threshold": row.price_threshold,
+                "retailer": retailer,
+                "price": price,
+                "triggered_at": now.isoformat(),
+            })
+        return triggered
 
     @staticmethod
     def deactivate_alert(db: Session, alert_id: int):
@@ -170,77 +833,36 @@ class AlertService:
         if alert:
             alert.is_active = False
             db.commit()
+            alert_index.remove(alert.id, alert.product_id, alert.price_threshold, alert.target_retailer)
         return alert
 
 
 class RecommendationService:
     @staticmethod
     def generate_recommendations(db: Session, product_id: int, limit: int = 5):
-        """Generate recommendations for a product using simple collaborative filtering"""
-        current_product = ProductService.get_product_by_id(db, product_id)
-        if not current_product:
+        """Recompute one product's recommendations (the batch job does all of them, see recommender.py)"""
+        if not ProductService.get_product_by_id(db, product_id):
             return []
-        
-        # Find similar products in same category with similar price range
-        prices = PriceHistoryService.get_price_comparison(db, product_id)
-        if not prices:
-            return []
-        
-        avg_price = sum(p.price for p in prices) / len(prices)
-        price_range = (avg_price * 0.7, avg_price * 1.3)
-        
-        similar_products = db.query(Product).filter(
-            and_(
-                Product.category == current_product.category,
-                Product.id != product_id
-            )
-        ).all()
-        
-        # Clear old recommendations
-        db.query(Recommendation).filter(Recommendation.product_id == product_id).delete()
-        
-        recommendations = []
-        for similar_product in similar_products[:limit]:
-            similar_prices = PriceHistoryService.get_price_comparison(db, similar_product.id)
-            if similar_prices:
-                avg_similar_price = sum(p.price for p in similar_prices) / len(similar_prices)
-                
-                # Score based on price similarity and category match
-                if price_range[0] <= avg_similar_price <= price_range[1]:
-                    score = 0.9
-                    rec_type = "similar"
-                else:
-                    score = 0.6
-                    rec_type = "related"
-                
-                recommendation = Recommendation(
-                    product_id=product_id,
-                    recommended_product_id=similar_product.id,
-                    recommendation_type=rec_type,
-                    score=score
-                )
-                db.add(recommendation)
-                recommendations.append(recommendation)
-        
-        db.commit()
-        return recommendations
+        recommender.store(db, recommender.compute(db, k=limit, product_ids=[product_id]))
+        return db.query(Recommendation).filter(
+            Recommendation.product_id == product_id
+        ).order_by(desc(Recommendation.score)).all()
 
     @staticmethod
     def get_recommendations_for_product(db: Session, product_id: int):
         """Get stored recommendations for a product"""
-        recommendations = db.query(Recommendation).filter(
+        rows = db.query(Recommendation, Product).join(
+            Product, Product.id == Recommendation.recommended_product_id
+        ).filter(
             Recommendation.product_id == product_id
         ).order_by(desc(Recommendation.score)).all()
-        
-        result = []
-        for rec in recommendations:
-            product = ProductService.get_product_by_id(db, rec.recommended_product_id)
-            if product:
-                result.append({
-                    "id": rec.id,
-                    "product": product,
-                    "type": rec.recommendation_type,
-                    "score": rec.score
-                })
-        
-        return result
+
+        return [
+            {
+                "id": rec.id,
+                "product": product,
+                "type": rec.recommendation_type,
+                "score": rec.score
+            }
+            for rec, product in rows
+        ]
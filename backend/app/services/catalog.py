@@ -0,0 +1,263 @@
+# catalog.py - server-side filtering, sorting and facet counts for the product catalog
+# products carry a summary of their current offers (lowest_price, best_discount, in_stock),
+# refreshed by refresh_summaries whenever current_offers changes, so every filter and sort
+# is on the products table and a page is one indexed keyset query. Facet counts for the
+# same filters come back from a second query (one UNION ALL of GROUP BYs). Each facet
+# ignores its own filter, so picking one category still shows the other categories' counts.
+# Facets and the total only come with the first page; following the cursor keeps the filters
+# and so the counts, and skipping them makes later pages a single indexed query.
+# The retailer filter keeps products with an offer from one of those retailers; price
+# filters and sorts always use the lowest price across all retailers.
+# q goes through the full-text index like /api/products/search (every term, as a prefix, in
+# name or description), falling back to the same ILIKE when there is no index.
+
+import base64
+import binascii
+import json
+from sqlalchemy import String, and_, case, cast, distinct, exists, func, inspect, literal, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from app.models.current_offer import CurrentOffer
+from app.schemas.product import CatalogQuerySchema
+from app.services import search_index
+from config import settings
+
+SUMMARY_COLUMNS = ["lowest_price", "best_discount", "in_stock"]
+IDS_PER_UPDATE = 500
+
+# sort name -> (column, descending); id breaks ties and is the keyset for "id"
+SORTS = {
+    "id": (None, False),
+    "price": (Product.lowest_price, False),
+    "-price": (Product.lowest_price, True),
+    "discount": (Product.best_discount, True),
+    "rating": (Product.rating, True),
+}
+RATING_STEPS = [4, 3, 2, 1]
+
+
+def refresh_summaries(db: Session, product_ids=None):
+    """Recompute lowest_price / best_discount / in_stock from current_offers
+    (every product when product_ids is None). Runs in the caller's transaction."""
+    offers = CurrentOffer.product_id == Product.id
+    stmt = update(Product).values({
+        Product.lowest_price: select(func.min(CurrentOffer.price)).where(offers).scalar_subquery(),
+        Product.best_discount: select(func.max(CurrentOffer.discount_percent)).where(offers).scalar_subquery(),
+        Product.in_stock: exists().where(offers, CurrentOffer.in_stock == "in_stock"),
+        Product.updated_at: Product.updated_at,  # a new price isn't a product edit
+    }).execution_options(synchronize_session=False)
+    if product_ids is None:
+        db.execute(stmt)
+        return
+    ids = sorted(set(product_ids))
+    for i in range(0, len(ids), IDS_PER_UPDATE):
+        db.execute(stmt.where(Product.id.in_(ids[i:i + IDS_PER_UPDATE])))
+
+
+def ensure_catalog(engine):
+    """Add the summary columns and catalog indexes to a database created before them and fill
+    the columns in (safe to call every startup)"""
+    with engine.begin() as conn:
+        existing = {column["name"] for column in inspect(conn).get_columns("products")}
+        missing = [name for name in SUMMARY_COLUMNS if name not in existing]
+        for name in missing:
+            column_type = Product.__table__.c[name].type.compile(dialect=engine.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE products ADD COLUMN {name} {column_type}")
+        for table in (Product.__table__, CurrentOffer.__table__):
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        if missing:
+            print("Filling product catalog summaries from current_offers...")
+            refresh_summaries(conn)
+
+
+def encode_cursor(sort: str, value, product_id: int):
+    return base64.urlsafe_b64encode(json.dumps([sort, value, product_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: str):
+    """-> (sort value, product id) of the last row of the previous page"""
+    try:
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or not isinstance(product_id, int) or not (
+            value is None or isinstance(value, (int, float))):
+        raise ValueError("Invalid cursor for this sort")
+    return value, product_id
+
+
+def _tag_pattern(tag: str):
+    return "," + tag.replace(" ", "").lower() + ","
+
+
+def _text_match(db: Session, query: CatalogQuerySchema):
+    # the q clause: full-text when the index is there, else what search_products falls back to
+    if not query.q:
+        return None
+    clause = search_index.match_clause(db, query.q)
+    if clause is None:
+        clause = or_(Product.name.icontains(query.q, autoescape=True),
+                     Product.description.icontains(query.q, autoescape=True))
+    return clause
+
+
+def _conditions(query: CatalogQuerySchema, skip: str = None, text_match=None):
+    # facet name -> where clause; a facet's counts are computed without its own clause
+    conditions = {}
+    if text_match is not None:
+        conditions["q"] = text_match
+    if query.category:
+        conditions["category"] = Product.category.in_(query.category)
+    if query.brand:
+        conditions["brand"] = Product.brand.in_(query.brand)
+    if query.retailer:
+        # IN (subquery) rather than a correlated EXISTS: sqlite builds the id set once
+        conditions["retailer"] = Product.id.in_(select(CurrentOffer.product_id).where(
+            CurrentOffer.retailer.in_(query.retailer),
+            *([CurrentOffer.in_stock == "in_stock"] if query.in_stock else [])
+        ))
+    if query.min_price is not None or query.max_price is not None:
+        conditions["price"] = and_(
+            *([Product.lowest_price >= query.min_price] if query.min_price is not None else []),
+            *([Product.lowest_price <= query.max_price] if query.max_price is not None else [])
+        )
+    if query.in_stock is not None:
+        conditions["in_stock"] = Product.in_stock.is_(True) if query.in_stock else Product.in_stock.isnot(True)
+    if query.min_rating is not None:
+        conditions["rating"] = Product.rating >= query.min_rating
+    if query.tags:
+        # tags are comma-separated, matched whole and case/space-insensitively
+        normalized = "," + func.lower(func.replace(func.coalesce(Product.tags, ""), " ", "")) + ","
+        conditions["tags"] = and_(*[normalized.contains(_tag_pattern(tag), autoescape=True) for tag in query.tags])
+    return [clause for name, clause in conditions.items() if name != skip]
+
+
+def _after(key, descending: bool, value, last_id: int):
+    # rows after the cursor, in ORDER BY key (nulls last), id
+    if key is None:
+        return Product.id > last_id
+    if value is None:  # already in the trailing nulls
+        return and_(key.is_(None), Product.id > last_id)
+    beyond = key < value if descending else key > value
+    return or_(beyond, and_(key == value, Product.id > last_id), key.is_(None))
+
+
+def _page_stmt(query: CatalogQuerySchema, text_match=None):
+    if query.sort not in SORTS:
+        raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+    key, descending = SORTS[query.sort]
+    stmt = select(Product).where(*_conditions(query, text_match=text_match))
+    if query.cursor:
+        stmt = stmt.where(_after(key, descending, *decode_cursor(query.cursor, query.sort)))
+    order = [Product.id.asc()]
+    if key is not None:
+        order.insert(0, (key.desc() if descending else key.asc()).nulls_last())
+    # one extra row tells us whether there's a next page
+    return stmt.order_by(*order).limit(query.limit + 1)
+
+
+def _price_buckets():
+    edges = [0] + list(settings.catalog_price_buckets)
+    return [(low, edges[i + 1] if i + 1 < len(edges) else None) for i, low in enumerate(edges)]
+
+
+def _bucket_label(low, high):
+    return f"{low:g}-{high:g}" if high is not None else f"{low:g}+"
+
+
+def _facets_stmt(query: CatalogQuerySchema, text_match=None):
+    def facet(name, value, count=None):
+        return select(literal(name, String).label("facet"), cast(value, String).label("value"),
+                      (count if count is not None else func.count()).label("count")).where(
+            *_conditions(query, name, text_match))
+
+    # offers per retailer, only joined to products when a product filter needs it
+    retailers = facet("retailer", CurrentOffer.retailer, func.count(distinct(CurrentOffer.product_id)))
+    if _conditions(query, "retailer", text_match):
+        retailers = retailers.join_from(CurrentOffer, Product, CurrentOffer.product_id == Product.id)
+    else:
+        retailers = retailers.select_from(CurrentOffer)
+    if query.in_stock:
+        retailers = retailers.where(CurrentOffer.in_stock == "in_stock")
+
+    buckets = _price_buckets()
+    price_bucket = case(*[(Product.lowest_price < high, _bucket_label(low, high)) for low, high in buckets[:-1]],
+                        else_=_bucket_label(*buckets[-1]))
+    rating_step = case(*[(Product.rating >= step, str(step)) for step in RATING_STEPS], else_="0")
+
+    return union_all(
+        select(literal("total", String), literal("", String), func.count()).select_from(Product).where(
+            *_conditions(query, text_match=text_match)),
+        facet("category", Product.category).group_by(Product.category),
+        facet("brand", Product.brand).where(Product.brand.isnot(None)).group_by(Product.brand),
+        retailers.group_by(CurrentOffer.retailer),
+        facet("price", price_bucket).where(Product.lowest_price.isnot(None)).group_by(price_bucket),
+        facet("rating", rating_step).where(Product.rating.isnot(None)).group_by(rating_step),
+        facet("in_stock", Product.in_stock).group_by(Product.in_stock),
+    )
+
+
+def _facets(rows, query: CatalogQuerySchema):
+    counts = {}
+    for name, value, count in rows:
+        counts.setdefault(name, {})[value] = count
+    total = counts.pop("total", {}).get("", 0)
+
+    facets = {}
+    for name, selected in [("category", query.category), ("brand", query.brand), ("retailer", query.retailer)]:
+        values = sorted(counts.get(name, {}).items(), key=lambda item: (-item[1], item[0] or ""))
+        top = values[:settings.catalog_facet_values]
+        # whatever is selected stays visible even when it isn't among the most common
+        shown = {value for value, _ in top}
+        top += [(value, counts.get(name, {}).get(value, 0)) for value in selected if value not in shown]
+        facets[name] = [{"value": value, "count": count} for value, count in top]
+
+    facets["price"] = [
+        {"value": _bucket_label(low, high), "min": low, "max": high,
+         "count": counts.get("price", {}).get(_bucket_label(low, high), 0)}
+        for low, high in _price_buckets()
+    ]
+    # "4 & up" includes everything rated 4 or more, so the steps are cumulative
+    facets["rating"], running = [], 0
+    for step in RATING_STEPS:
+        running += counts.get("rating", {}).get(str(step), 0)
+        facets["rating"].append({"value": step, "count": running})
+    stock = {}
+    for value, count in counts.get("in_stock", {}).items():
+        key = value in ("1", "true")
+        stock[key] = stock.get(key, 0) + count
+    facets["in_stock"] = [{"value": True, "count": stock.get(True, 0)}, {"value": False, "count": stock.get(False, 0)}]
+    return total, facets
+
+
+def _page(products, query: CatalogQuerySchema, facet_rows=None):
+    next_cursor = None
+    if len(products) > query.limit:
+        products = products[:query.limit]
+        key, _ = SORTS[query.sort]
+        last = products[-1]
+        next_cursor = encode_cursor(query.sort, getattr(last, key.key) if key is not None else None, last.id)
+    total, facets = _facets(facet_rows, query) if facet_rows is not None else (None, None)
+    return {"products": products, "total": total, "next_cursor": next_cursor, "facets": facets}
+
+
+def browse(db: Session, query: CatalogQuerySchema):
+    """One page of products, plus the total and facet counts for the whole filtered catalog
+    on the first page. Raises ValueError for an unknown sort or a bad cursor."""
+    text_match = _text_match(db, query)
+    products = db.scalars(_page_stmt(query, text_match)).all()
+    if query.cursor:
+        return _page(products, query)
+    return _page(products, query, db.execute(_facets_stmt(query, text_match)).all())
+
+
+async def browse_async(db: AsyncSession, query: CatalogQuerySchema):
+    """Async browse"""
+    # the index check may need to inspect the schema, which only runs on a sync connection
+    text_match = await db.run_sync(_text_match, query) if query.q else None
+    products = (await db.scalars(_page_stmt(query, text_match))).all()
+    if query.cursor:
+        return _page(products, query)
+    return _page(products, query, (await db.execute(_facets_stmt(query, text_match))).all())
@@ -0,0 +1,171 @@
+# compaction.py - retention policy for price history
+#   raw price_histories rows older than history_raw_days  -> hourly buckets
+#   hourly buckets older than history_hourly_days          -> daily buckets
+#   daily buckets older than history_daily_days (if > 0)   -> deleted
+# Rows that current_offers points at are never compacted, so the latest offer per
+# retailer always stays a real price_histories row.
+# Run compact_price_history.py on a schedule (nightly is plenty).
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, distinct, insert
+from sqlalchemy.orm import Session
+from app.models.price_history import PriceHistory
+from app.models.price_bucket import PriceBucket
+from app.models.current_offer import CurrentOffer
+from config import settings
+
+RESOLUTIONS = ("hour", "day")
+# what bucket_piece reads - query these columns instead of whole objects
+BUCKET_COLUMNS = (PriceBucket.product_id, PriceBucket.retailer, PriceBucket.bucket_start, PriceBucket.open,
+                  PriceBucket.high, PriceBucket.low, PriceBucket.close, PriceBucket.avg_price, PriceBucket.samples)
+# products handled per transaction
+PRODUCTS_PER_CHUNK = 200
+IDS_PER_STATEMENT = 500
+
+
+def floor_time(moment: datetime, resolution: str):
+    if resolution == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def raw_piece(product_id, retailer, price, created_at):
+    # a single price point as a one-sample bucket
+    return {"product_id": product_id, "retailer": retailer, "start": created_at,
+            "open": price, "high": price, "low": price, "close": price, "avg_price": price, "samples": 1}
+
+
+def bucket_piece(bucket):
+    return {"product_id": bucket.product_id, "retailer": bucket.retailer, "start": bucket.bucket_start,
+            "open": bucket.open, "high": bucket.high, "low": bucket.low, "close": bucket.close,
+            "avg_price": bucket.avg_price, "samples": bucket.samples}
+
+
+def merge_pieces(pieces, resolution: str):
+    """Roll price points / finer buckets up into `resolution` buckets (OHLC merge).
+    Returns bucket dicts sorted by product, retailer, bucket_start."""
+    merged = []
+    current = None
+    for piece in sorted(pieces, key=lambda p: (p["product_id"], p["retailer"], p["start"])):
+        key = (piece["product_id"], piece["retailer"], floor_time(piece["start"], resolution))
+        if current is None or key != current_key:
+            current_key = key
+            current = {
+                "product_id": key[0], "retailer": key[1], "resolution": resolution, "bucket_start": key[2],
+                "open": piece["open"], "high": piece["high"], "low": piece["low"], "close": piece["close"],
+                "avg_price": piece["avg_price"] * piece["samples"], "samples": piece["samples"],
+            }
+            merged.append(current)
+            continue
+        current["close"] = piece["close"]
+        if piece["high"] > current["high"]:
+            current["high"] = piece["high"]
+        if piece["low"] < current["low"]:
+            current["low"] = piece["low"]
+        current["avg_price"] += piece["avg_price"] * piece["samples"]  # running sum until the end
+        current["samples"] += piece["samples"]
+    for bucket in merged:
+        bucket["avg_price"] /= bucket["samples"]
+    return merged
+
+
+def _write_buckets(db: Session, buckets):
+    # merge into buckets that already exist (an earlier run may have covered part of the hour/day)
+    if not buckets:
+        return 0
+    product_ids = {b["product_id"] for b in buckets}
+    resolution = buckets[0]["resolution"]
+    existing = {
+        (b.product_id, b.retailer, b.bucket_start): b
+        for b in db.query(PriceBucket).filter(
+            PriceBucket.product_id.in_(product_ids),
+            PriceBucket.resolution == resolution,
+            PriceBucket.bucket_start >= min(b["bucket_start"] for b in buckets),
+            PriceBucket.bucket_start <= max(b["bucket_start"] for b in buckets),
+        )
+    }
+    new_rows = []
+    for bucket in buckets:
+        old = existing.get((bucket["product_id"], bucket["retailer"], bucket["bucket_start"]))
+        if old is None:
+            new_rows.append(bucket)
+            continue
+        # what's being compacted now is newer than what was compacted before
+        samples = old.samples + bucket["samples"]
+        old.avg_price = (old.avg_price * old.samples + bucket["avg_price"] * bucket["samples"]) / samples
+        old.samples = samples
+        old.high = max(old.high, bucket["high"])
+        old.low = min(old.low, bucket["low"])
+        old.close = bucket["close"]
+    if new_rows:
+        db.execute(insert(PriceBucket), new_rows)
+    return len(buckets)
+
+
+def _delete_ids(db: Session, model, ids):
+    for i in range(0, len(ids), IDS_PER_STATEMENT):
+        db.query(model).filter(model.id.in_(ids[i:i + IDS_PER_STATEMENT])).delete(synchronize_session=False)
+
+
+def _chunks(values, size):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def compact_raw(db: Session, cutoff: datetime):
+    """Raw rows older than cutoff -> hourly buckets. Returns (rows compacted, buckets written)"""
+    product_ids = [row[0] for row in db.query(distinct(PriceHistory.product_id)).filter(
+        PriceHistory.created_at < cutoff).all()]
+    compacted = written = 0
+    for chunk in _chunks(product_ids, PRODUCTS_PER_CHUNK):
+        keep = select(CurrentOffer.price_history_id).where(CurrentOffer.product_id.in_(chunk))
+        rows = db.execute(
+            select(PriceHistory.id, PriceHistory.product_id, PriceHistory.retailer,
+                   PriceHistory.price, PriceHistory.created_at)
+            .where(PriceHistory.product_id.in_(chunk), PriceHistory.created_at < cutoff,
+                   PriceHistory.price.isnot(None), PriceHistory.id.notin_(keep))
+        ).all()
+        if not rows:
+            continue
+        buckets = merge_pieces([raw_piece(r.product_id, r.retailer, r.price, r.created_at) for r in rows], "hour")
+        written += _write_buckets(db, buckets)
+        _delete_ids(db, PriceHistory, [r.id for r in rows])
+        db.commit()
+        compacted += len(rows)
+    return compacted, written
+
+
+def compact_hourly(db: Session, cutoff: datetime):
+    """Hourly buckets older than cutoff -> daily buckets. Returns (hour buckets compacted, day buckets written)"""
+    product_ids = [row[0] for row in db.query(distinct(PriceBucket.product_id)).filter(
+        PriceBucket.resolution == "hour", PriceBucket.bucket_start < cutoff).all()]
+    compacted = written = 0
+    for chunk in _chunks(product_ids, PRODUCTS_PER_CHUNK):
+        hours = db.query(PriceBucket.id, *BUCKET_COLUMNS).filter(
+            PriceBucket.product_id.in_(chunk), PriceBucket.resolution == "hour", PriceBucket.bucket_start < cutoff
+        ).all()
+        if not hours:
+            continue
+        written += _write_buckets(db, merge_pieces([bucket_piece(b) for b in hours], "day"))
+        _delete_ids(db, PriceBucket, [b.id for b in hours])
+        db.commit()
+        compacted += len(hours)
+    return compacted, written
+
+
+def compact(db: Session, now: datetime = None):
+    """Apply the whole retention policy once. Returns counts of what was done."""
+    now = now or datetime.utcnow()
+    stats = {}
+    stats["raw_rows_compacted"], stats["hour_buckets_written"] = compact_raw(
+        db, now - timedelta(days=settings.history_raw_days))
+    stats["hour_buckets_compacted"], stats["day_buckets_written"] = compact_hourly(
+        db, now - timedelta(days=settings.history_hourly_days))
+    stats["day_buckets_deleted"] = 0
+    if settings.history_daily_days > 0:
+        stats["day_buckets_deleted"] = db.query(PriceBucket).filter(
+            PriceBucket.resolution == "day",
+            PriceBucket.bucket_start < now - timedelta(days=settings.history_daily_days)
+        ).delete(synchronize_session=False)
+        db.commit()
+    return stats
@@ -0,0 +1,261 @@
+# feed_importer.py - streaming product feed importer
+# reads JSON arrays ([...] or {"products": [...]}) and NDJSON one item at a time,
+# so a multi-GB feed never has to fit in memory, and writes them in bounded batches
+
+import codecs
+import json
+import os
+import sys
+import time
+from sqlalchemy.orm import Session
+from app.services.business import ProductService, ListingService
+from config import settings
+
+try:
+    import resource  # unix only, used for the peak memory line
+except ImportError:
+    resource = None
+
+READ_CHUNK = 1 << 16  # 64 KiB per read
+
+
+class _JsonStream:
+    """Incremental reader over a binary file: skip whitespace, read punctuation,
+    and decode one complete JSON value at a time from a rolling buffer."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fp.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            self.buffer += self.utf8.decode(b"", final=True)
+            return False
+        # drop what we already consumed so the buffer stays around one item in size
+        self.buffer = self.buffer[self.pos:] + self.utf8.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # next non-whitespace character, or "" at end of file
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'end of file'}' in feed")
+        self.pos += 1
+
+    def value(self):
+        # decode one value; keep reading until it's complete
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number cut off at the end of the buffer would still decode, so only
+                # trust it if something follows it (or there's nothing left to read)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def array_items(self):
+        # yields each element of the array starting at the current position
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_json_items(fp, key: str = "products"):
+    """Stream items from a binary JSON file holding [...] or {"products": [...], ...}"""
+    stream = _JsonStream(fp)
+    first = stream.peek()
+    if first == "[":
+        yield from stream.array_items()
+        return
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name == key and stream.peek() == "[":
+            yield from stream.array_items()
+        else:
+            stream.value()  # some other top-level field, skip it
+        if stream.peek() == ",":
+            stream.pos += 1
+            continue
+        stream.expect("}")
+        return
+
+
+def iter_ndjson_items(fp):
+    """Stream items from a binary NDJSON file, one object per line"""
+    for line_no, line in enumerate(fp, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Skipping bad line {line_no}: {e}")
+
+
+def detect_format(path: str):
+    # .ndjson/.jsonl are line-delimited, everything else is treated as a JSON document
+    return "ndjson" if os.path.splitext(path)[1].lower() in (".ndjson", ".jsonl") else "json"
+
+
+def normalize_item(item: dict):
+    """Map one feed item to (product fields, [price fields]) using the feed's fallbacks:
+    name/title, retailer/seller, price/value, image/image_url, url/link.
+    Each price carries an external_id (the entry's or item's id/sku, else its url)"""
+    name = item.get("name") or item.get("title") or "Unnamed Product"
+    description = item.get("description") or "No description"
+    category = item.get("category") or "Uncategorized"
+    brand = item.get("brand") or None
+    image_url = item.get("image") or item.get("image_url") or None
+    tags = item.get("tags")
+    if isinstance(tags, list):
+        tags = ",".join(tags)
+    elif not tags:
+        tags = None
+    rating = item.get("rating")
+    try:
+        rating = float(rating) if rating is not None else None
+    except Exception:
+        rating = None
+    product = dict(
+        name=name[:255],
+        description=description,
+        category=category,
+        image_url=image_url,
+        brand=brand,
+        tags=tags,
+        rating=rating
+    )
+    # one price per retailer per item, the last one listed wins
+    prices = {}
+    for price_entry in item.get("prices") or [item]:  # handle both nested and flat
+        retailer = price_entry.get("retailer") or price_entry.get("seller") or "Unknown"
+        try:
+            price = float(price_entry.get("price") or price_entry.get("value") or 0)
+        except (TypeError, ValueError):
+            price = 0
+        original_price = price_entry.get("original_price")
+        url = price_entry.get("url") or price_entry.get("link")
+        in_stock = str(price_entry.get("in_stock", "in_stock"))
+        if price > 0:
+            prices[retailer] = dict(
+                retailer=retailer,
+                price=price,
+                original_price=original_price,
+                url=url,
+                in_stock=in_stock,
+                external_id=ListingService.external_id(
+                    price_entry.get("external_id"), price_entry.get("sku"),
+                    item.get("external_id"), item.get("id"), item.get("sku"), url=url)
+            )
+    return product, list(prices.values())
+
+
+def import_batch(db: Session, items: list):
+    """Write one batch of raw feed items: a bulk insert of the products we don't have a
+    listing for yet, then the listings and changed prices (see ListingService.record_prices),
+    so importing the same feed twice adds nothing. Returns (products added, prices added)"""
+    normalized = [normalize_item(item) for item in items]
+    known = ListingService.get_listing_products(
+        db, [(price["retailer"], price["external_id"]) for _, prices in normalized for price in prices])
+    existing = []
+    for _, prices in normalized:
+        existing.append(next((known[key] for key in ((p["retailer"], p["external_id"]) for p in prices)
+                              if key in known), None))
+    new_ids = iter(ProductService.bulk_create_products(
+        db, [product for (product, _), product_id in zip(normalized, existing) if product_id is None],
+        batch_size=len(normalized) or 1))
+    product_ids = [product_id if product_id is not None else next(new_ids) for product_id in existing]
+    records = [
+        dict(price, product_id=product_id, title=product["name"])
+        for (product, prices), product_id in zip(normalized, product_ids)
+        for price in prices
+    ]
+    _, written = ListingService.record_prices(db, records, batch_size=max(len(records), 1))
+    return sum(1 for product_id in existing if product_id is None), written
+
+
+def _peak_memory_mb():
+    if resource is None:
+        return None
+    # linux reports KiB, macOS reports bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def import_feed(db: Session, path: str, fmt: str = None, batch_size: int = None, progress_every: int = 10):
+    """Stream a JSON/NDJSON feed into the database in batches of batch_size items.
+    Prints progress every `progress_every` batches and returns a stats dict."""
+    fmt = fmt or detect_format(path)
+    batch_size = batch_size or settings.ingest_batch_size
+    total_bytes = os.path.getsize(path)
+    stats = {"items": 0, "products": 0, "prices": 0, "batches": 0, "seconds": 0.0}
+    start = time.perf_counter()
+
+    def report(done=False):
+        elapsed = time.perf_counter() - start
+        rate = (stats["products"] + stats["prices"]) / max(elapsed, 1e-9)
+        percent = 100.0 * fp.tell() / total_bytes if total_bytes else 100.0
+        memory = _peak_memory_mb()
+        print(f"{'Done' if done else 'Progress'}: {stats['items']} items, {stats['products']} products, "
+              f"{stats['prices']} prices | {percent:.1f}% of file | {rate:.0f} rows/sec"
+              + (f" | peak memory {memory:.0f} MB" if memory else ""))
+
+    with open(path, "rb") as fp:
+        items = iter_ndjson_items(fp) if fmt == "ndjson" else iter_json_items(fp)
+        batch = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                products, prices = import_batch(db, batch)
+                stats["items"] += len(batch)
+                stats["products"] += products
+                stats["prices"] += prices
+                stats["batches"] += 1
+                batch = []
+                if stats["batches"] % progress_every == 0:
+                    report()
+        if batch:
+            products, prices = import_batch(db, batch)
+            stats["items"] += len(batch)
+            stats["products"] += products
+            stats["prices"] += prices
+            stats["batches"] += 1
+        report(done=True)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
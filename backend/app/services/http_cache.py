@@ -0,0 +1,141 @@
+# http_cache.py - ETag / Last-Modified / Cache-Control and conditional GET for the read routes
+# every cached route gets a dependency that runs one cheap "data version" query (counts,
+# max ids and timestamps on indexed columns) and hashes it with the url into a weak ETag.
+# When the request's If-None-Match still matches, the dependency answers 304 before the
+# handler runs, so the real queries and the response serialization never happen.
+# Cache-Control comes from settings.http_cache_control, per route from http_cache_control_routes.
+# Conditional requests are answered on If-None-Match only: Last-Modified is informational,
+# because a deleted row can change a response without moving any timestamp.
+
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.product import Product
+from app.models.price_history import PriceHistory
+from app.models.price_bucket import PriceBucket
+from app.models.current_offer import CurrentOffer
+from app.services.query_cache import query_cache
+from database import get_async_read_db
+from config import settings
+
+_lock = threading.Lock()
+_stats = {"checked": 0, "not_modified": 0}
+
+
+def get_metrics():
+    with _lock:
+        stats = dict(_stats)
+    stats["not_modified_ratio"] = round(stats["not_modified"] / stats["checked"], 3) if stats["checked"] else 0.0
+    return stats
+
+
+async def catalog_version(db: AsyncSession, request: Request):
+    """Anything that changes a product list: products added/removed/edited, new prices"""
+    row = (await db.execute(select(
+        func.count(Product.id),
+        func.max(Product.updated_at),
+        select(func.max(CurrentOffer.price_history_id)).scalar_subquery(),
+        select(func.max(PriceHistory.created_at)).scalar_subquery(),
+    ))).one()
+    return tuple(row), _latest(row[1], row[3])
+
+
+async def _products_version(db: AsyncSession, product_ids, days: int = None):
+    # per product: edits, new / removed price rows and buckets, and with a history window
+    # the rows inside it (points age out of "the last 30 days" without any write)
+    history = PriceHistory.product_id == Product.id
+    columns = [
+        Product.id,
+        Product.updated_at,
+        select(func.max(PriceHistory.id)).where(history).scalar_subquery(),
+        select(func.max(PriceHistory.created_at)).where(history).scalar_subquery(),
+        select(func.count()).where(history).scalar_subquery(),
+        select(func.max(PriceBucket.id)).where(PriceBucket.product_id == Product.id).scalar_subquery(),
+        select(func.count()).where(PriceBucket.product_id == Product.id).scalar_subquery(),
+    ]
+    if days is not None:
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        columns.append(select(func.count()).where(history, PriceHistory.created_at >= cutoff).scalar_subquery())
+    rows = (await db.execute(select(*columns).where(Product.id.in_(product_ids)).order_by(Product.id))).all()
+    # the handler must not answer from query cache entries older than this ETag
+    query_cache.check_versions({row[0]: tuple(row[1:5]) for row in rows})
+    parts = [tuple(row) for row in rows]
+    if days is not None:
+        parts.append(datetime.utcnow().date())  # daily buckets slide once a day
+    return parts, _latest(*[row[1] for row in rows], *[row[3] for row in rows])
+
+
+async def product_version(db: AsyncSession, request: Request):
+    """Routes for one product: /{product_id}"""
+    return await _products_version(db, [int(request.path_params["product_id"])])
+
+
+async def history_version(db: AsyncSession, request: Request):
+    """/api/prices/history/{product_id}?days= (30 by default, like the route)"""
+    return await _products_version(db, [int(request.path_params["product_id"])],
+                                   int(request.query_params.get("days", 30)))
+
+
+async def details_version(db: AsyncSession, request: Request):
+    """/api/products/details?ids=..&history_days=.."""
+    days = request.query_params.get("history_days")
+    product_ids = [int(product_id) for product_id in request.query_params.getlist("ids")]
+    if len(product_ids) > settings.details_max_ids:
+        raise ValueError("too many ids")
+    return await _products_version(db, product_ids, int(days) if days is not None else None)
+
+
+def _latest(*moments):
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def _matches(if_none_match: str, etag: str):
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison: W/"x" and "x" are the same validator
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def cache_control(request: Request):
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    return settings.http_cache_control_routes.get(path, settings.http_cache_control)
+
+
+def conditional_get(version):
+    """Route dependency (use in dependencies=[Depends(...)]) that sets ETag, Last-Modified and
+    Cache-Control from version(db, request) -> (parts, last_modified), and returns a bodyless
+    304 before the handler runs when If-None-Match matches"""
+    async def check(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
+        if not settings.http_etags:
+            return
+        try:
+            parts, last_modified = await version(db, request)
+        except (KeyError, ValueError, OverflowError):
+            return  # bad ids/days, the handler's own validation answers
+        key = repr((request.url.path, sorted(request.query_params.multi_items()), parts))
+        etag = 'W/"' + hashlib.sha1(key.encode()).hexdigest()[:24] + '"'
+        headers = {"ETag": etag, "Cache-Control": cache_control(request)}
+        if last_modified is not None:
+            headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        not_modified = if_none_match is not None and _matches(if_none_match, etag)
+        with _lock:
+            _stats["checked"] += 1
+            _stats["not_modified"] += not_modified
+        if not_modified:
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return check
+
+
+validate_catalog = conditional_get(catalog_version)
+validate_product = conditional_get(product_version)
+validate_history = conditional_get(history_version)
+validate_details = conditional_get(details_version)
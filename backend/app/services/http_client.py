@@ -0,0 +1,145 @@
+# http_client.py - long-lived, pooled httpx clients for every upstream retailer call
+# one sync client (routes run in the threadpool, scripts) and one async client (the app's
+# event loop), so TCP+TLS handshakes are paid once per connection instead of once per request.
+# Pool limits and timeouts come from config.Settings; main.py closes both on shutdown.
+
+import importlib.util
+import threading
+import httpx
+from config import settings
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+class ConnectionStats:
+    """Counts requests vs new TCP connections, using httpcore's trace extension.
+    Anything that didn't need a new connection was served from the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.failed_connections = 0
+
+    def _record(self, event_name: str):
+        with self._lock:
+            if event_name == "connection.connect_tcp.complete":
+                self.new_connections += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+            elif event_name == "connection.connect_tcp.failed":
+                self.failed_connections += 1
+
+    def trace(self, event_name, info):
+        self._record(event_name)
+
+    async def atrace(self, event_name, info):
+        self._record(event_name)
+
+    def on_request(self, request: httpx.Request, is_async: bool = False):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self.atrace if is_async else self.trace
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.new_connections - self.failed_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "tls_handshakes": self.tls_handshakes,
+                "failed_connections": self.failed_connections,
+                "reused_connections": reused,
+                "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            }
+
+
+stats = ConnectionStats()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+def _timeout():
+    # per-call timeouts (ebay_timeout, serpapi_timeout) still override the read timeout
+    return httpx.Timeout(settings.http_read_timeout, connect=settings.http_connect_timeout)
+
+
+def new_client():
+    """Build a pooled sync client wired into the connection stats"""
+    def on_request(request):
+        stats.on_request(request)
+
+    return httpx.Client(
+        limits=_limits(),
+        timeout=_timeout(),
+        http2=settings.http2 and HTTP2_AVAILABLE,
+        event_hooks={"request": [on_request]},
+    )
+
+
+def new_async_client():
+    """Build a pooled async client wired into the connection stats"""
+    async def on_request(request):
+        stats.on_request(request, is_async=True)
+
+    return httpx.AsyncClient(
+        limits=_limits(),
+        timeout=_timeout(),
+        http2=settings.http2 and HTTP2_AVAILABLE,
+        event_hooks={"request": [on_request]},
+    )
+
+
+def get_client():
+    """Shared sync client, created on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        with _lock:
+            if _client is None or _client.is_closed:
+                _client = new_client()
+    return _client
+
+
+def get_async_client():
+    """Shared async client, must be used from the app's event loop"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = new_async_client()
+    return _async_client
+
+
+def close_client():
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose_clients():
+    """Close both shared clients (called from the FastAPI lifespan on shutdown)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    close_client()
+
+
+def get_metrics():
+    metrics = stats.snapshot()
+    metrics["http2"] = settings.http2 and HTTP2_AVAILABLE
+    metrics["max_connections"] = settings.http_max_connections
+    metrics["max_keepalive_connections"] = settings.http_max_keepalive_connections
+    return metrics
@@ -0,0 +1,286 @@
+# matching.py - map retailer listings onto canonical products
+# every retailer titles the same item differently ("Apple iPhone 15 Pro 128GB Black - Unlocked"
+# vs "iPhone 15 Pro, 128 GB, Black Titanium"), so saving one Product per listing gives
+# dozens of copies and no cross-retailer comparison. Matching goes:
+#   1. normalize the title, pull out brand, model numbers and key numbers (15, 128gb, ...)
+#   2. exact model-number hit -> same product
+#   3. otherwise MinHash over title shingles, LSH banding to find candidates without
+#      comparing against every product, then score the few candidates
+# brand or key-number conflicts always veto a match (iPhone 14 != iPhone 15, 128gb != 256gb).
+
+import re
+import threading
+import time
+import unicodedata
+import zlib
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from config import settings
+
+# listing noise that says nothing about which product it is
+NOISE_WORDS = {
+    "new", "brand", "sealed", "genuine", "original", "authentic", "free", "shipping", "fast", "ship",
+    "ships", "usa", "us", "version", "the", "and", "with", "for", "w", "in", "of", "a", "by",
+    "renewed", "excellent", "condition", "open", "box", "oem", "retail", "packaging", "latest", "model",
+    "unlocked", "refurbished", "warranty", "edition", "color", "colour",
+}
+
+# colour is the same product for price comparison purposes
+COLOR_WORDS = {
+    "black", "white", "silver", "gray", "grey", "blue", "red", "green", "gold", "pink", "purple",
+    "yellow", "orange", "midnight", "starlight", "graphite", "titanium", "natural", "space", "rose",
+    "beige", "cream", "navy", "obsidian", "porcelain", "hazel", "lavender", "mint", "coral", "charcoal",
+}
+
+BRANDS = [
+    "apple", "samsung", "google", "sony", "lg", "dell", "hp", "lenovo", "asus", "acer", "microsoft",
+    "bose", "jbl", "beats", "nintendo", "canon", "nikon", "fujifilm", "garmin", "fitbit", "oneplus",
+    "motorola", "xiaomi", "huawei", "logitech", "razer", "msi", "panasonic", "philips", "sennheiser",
+    "anker", "amazon", "tcl", "hisense", "vizio", "gopro", "dji", "corsair", "steelseries", "hyperx",
+    "nothing", "sonos", "skullcandy", "audio-technica", "toshiba", "western digital", "sandisk",
+]
+
+# product lines that give the brand away when the title doesn't name it
+BRAND_HINTS = {
+    "iphone": "apple", "ipad": "apple", "macbook": "apple", "airpods": "apple", "imac": "apple",
+    "galaxy": "samsung", "pixel": "google", "playstation": "sony", "ps5": "sony", "ps4": "sony",
+    "xbox": "microsoft", "surface": "microsoft", "thinkpad": "lenovo", "ideapad": "lenovo",
+    "zenbook": "asus", "vivobook": "asus", "rog": "asus", "chromebook": None, "kindle": "amazon",
+    "echo": "amazon", "switch": "nintendo", "alienware": "dell", "xps": "dell", "inspiron": "dell",
+    "pavilion": "hp", "envy": "hp", "spectre": "hp", "omen": "hp", "predator": "acer", "aspire": "acer",
+}
+
+CATEGORY_KEYWORDS = [
+    ("Phones", ["iphone", "galaxy s", "pixel", "smartphone", "phone", "oneplus", "motorola"]),
+    ("Tablets", ["ipad", "tablet", "galaxy tab", "kindle", "fire hd"]),
+    ("Laptops", ["macbook", "laptop", "notebook", "chromebook", "thinkpad", "zenbook", "xps"]),
+    ("Headphones", ["airpods", "headphones", "earbuds", "headset", "earphones", "buds"]),
+    ("Smartwatches", ["watch", "fitbit", "smartwatch"]),
+    ("Cameras", ["camera", "dslr", "mirrorless", "gopro", "lens"]),
+    ("Monitors", ["monitor", "display"]),
+    ("TVs", ["tv", "television", "oled", "qled"]),
+    ("Gaming", ["playstation", "ps5", "xbox", "nintendo switch", "console", "controller"]),
+    ("Speakers", ["speaker", "soundbar", "echo"]),
+]
+
+# edition words - "iPhone 15 Pro" and "iPhone 15 Pro Max" are different products
+VARIANT_WORDS = {"pro", "max", "plus", "ultra", "mini", "lite", "se", "fe", "air", "slim", "xl", "oled"}
+
+# sizes / capacities / years are "key numbers", not model numbers
+_UNIT = re.compile(r"^\d+(\.\d+)?(gb|tb|mb|mp|mm|cm|in|inch|hz|w|mah|k|p|g|nm|oz|lbs?)$")
+_MODEL = re.compile(r"^(?=.*\d)(?=.*[a-z])[a-z0-9]{4,}$")
+_NUMBER = re.compile(r"^\d{1,4}(\.\d+)?$")
+# short generation tokens: m2, 8a, s24, 13
+_GENERATION = re.compile(r"^[a-z]?\d{1,3}[a-z]?$")
+
+NUM_PERM = 64
+LSH_BANDS = 16
+SHINGLE = 4
+_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(7)
+_A = _rng.randint(1, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+
+
+def normalize_title(title: str):
+    """lowercase, accents stripped, punctuation to spaces, '128 GB' -> '128gb'"""
+    text = unicodedata.normalize("NFKD", title or "").encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"(?<=[a-z0-9])\+", " plus", text)  # "S24+" -> "s24 plus"
+    text = re.sub(r"(\d)\s+(gb|tb|mb|mp|mm|in|inch|hz|mah)\b", r"\1\2", text)
+    text = re.sub(r"(\d)[\"”]", r"\1in", text)
+    text = re.sub(r"[^a-z0-9.\- ]+", " ", text)
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)  # keep decimals like 6.1
+    return " ".join(text.split())
+
+
+def _tokens(normalized: str):
+    return [t for t in normalized.replace("-", " ").split() if t not in NOISE_WORDS]
+
+
+def extract_brand(normalized: str, brand: str = None):
+    if brand and brand.strip():
+        return brand.strip().lower()
+    padded = f" {normalized} "
+    for name in BRANDS:
+        if f" {name} " in padded:
+            return name
+    for token in normalized.split():
+        if BRAND_HINTS.get(token):
+            return BRAND_HINTS[token]
+    return None
+
+
+def extract_model_numbers(normalized: str):
+    # "sm-s918u", "wh-1000xm5" -> "sms918u", "wh1000xm5" (the prefix matters: wh- vs wf-)
+    models = set()
+    for raw in normalized.split():
+        token = raw.replace("-", "")
+        if _MODEL.match(token) and not _UNIT.match(token):
+            models.add(token)
+    return models
+
+
+def extract_key_numbers(normalized: str):
+    """Tokens that distinguish variants: generation (15, m2, 8a), capacity (128gb), size (6.1in),
+    edition (pro, max)"""
+    return {t for t in _tokens(normalized)
+            if _NUMBER.match(t) or _UNIT.match(t) or _GENERATION.match(t) or t in VARIANT_WORDS}
+
+
+def guess_category(title: str, default: str = "Electronics"):
+    padded = f" {normalize_title(title)} "
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(f" {k}" in padded for k in keywords):
+            return category
+    return default
+
+
+def _shingles(tokens, brand: str = None):
+    # character shingles of the title minus brand and colour (compared separately / ignored),
+    # so word order, spacing and colour differences barely matter
+    text = " ".join(t for t in tokens if t not in COLOR_WORDS and t != brand)
+    if len(text) <= SHINGLE:
+        return {text}
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def minhash(shingles):
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((hashes[:, None] * _A[None, :] + _B[None, :]) % _PRIME).min(axis=0)
+
+
+class Fingerprint:
+    __slots__ = ("brand", "models", "numbers", "signature")
+
+    def __init__(self, title: str, brand: str = None):
+        normalized = normalize_title(title)
+        tokens = _tokens(normalized)
+        self.brand = extract_brand(normalized, brand)
+        self.models = extract_model_numbers(normalized)
+        self.numbers = extract_key_numbers(normalized)
+        self.signature = minhash(_shingles(tokens, self.brand) or {normalized})
+
+    def bands(self):
+        rows = NUM_PERM // LSH_BANDS
+        return [(band, self.signature[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+
+
+def score(a: Fingerprint, b: Fingerprint):
+    """0..1 likelihood that two listings are the same product (0 on any hard conflict)"""
+    if a.brand and b.brand and a.brand != b.brand:
+        return 0.0
+    if a.numbers and b.numbers and a.numbers != b.numbers:
+        return 0.0
+    if a.models and b.models:
+        # shared model number is as good as it gets, different ones rule it out.
+        # a prefix counts as shared: SM-S928U vs the retail SKU SM-S928UZKAXAA
+        return 1.0 if a.models & b.models or any(_same_model(x, y) for x in a.models for y in b.models) else 0.0
+    return float(np.mean(a.signature == b.signature))
+
+
+def _same_model(x: str, y: str):
+    shorter, longer = sorted((x, y), key=len)
+    return len(shorter) >= 5 and longer.startswith(shorter)
+
+
+class ProductMatcher:
+    """LSH index over canonical products. Keys are product ids (or any placeholder)."""
+
+    def __init__(self, threshold: float = 0.6, reload_seconds: float = 600.0):
+        self.threshold = threshold
+        self.reload_seconds = reload_seconds
+        self._lock = threading.RLock()
+        self._fingerprints = {}  # key -> Fingerprint
+        self._buckets = {}  # (band, hash) -> set of keys
+        self._models = {}  # model number -> key
+        self._bind = None
+        self._loaded_at = None
+        self.counters = {"lookups": 0, "model_hits": 0, "lsh_hits": 0, "misses": 0, "candidates_scored": 0}
+
+    def clear(self):
+        with self._lock:
+            self._fingerprints.clear()
+            self._buckets.clear()
+            self._models.clear()
+
+    def load(self, db: Session):
+        """Index every product currently in the database"""
+        rows = db.query(Product.id, Product.name, Product.brand).all()
+        with self._lock:
+            self.clear()
+            for product_id, name, brand in rows:
+                self.add(product_id, Fingerprint(name, brand))
+            self._bind = db.get_bind()
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db: Session):
+        with self._lock:
+            fresh = (self._bind is db.get_bind() and self._loaded_at is not None
+                     and time.monotonic() - self._loaded_at < self.reload_seconds)
+        if not fresh:
+            self.load(db)
+
+    def add(self, key, fingerprint: Fingerprint):
+        with self._lock:
+            self._fingerprints[key] = fingerprint
+            for band in fingerprint.bands():
+                self._buckets.setdefault(band, set()).add(key)
+            for model in fingerprint.models:
+                self._models.setdefault(model, key)
+
+    def remove(self, key):
+        with self._lock:
+            fingerprint = self._fingerprints.pop(key, None)
+            if fingerprint is None:
+                return
+            for band in fingerprint.bands():
+                self._buckets.get(band, set()).discard(key)
+            for model in fingerprint.models:
+                if self._models.get(model) == key:
+                    del self._models[model]
+
+    def rekey(self, old, new):
+        with self._lock:
+            fingerprint = self._fingerprints.get(old)
+            if fingerprint is not None:
+                self.remove(old)
+                self.add(new, fingerprint)
+
+    def find(self, fingerprint: Fingerprint):
+        """Best matching key and its score, or (None, 0.0)"""
+        with self._lock:
+            self.counters["lookups"] += 1
+            for model in fingerprint.models:
+                key = self._models.get(model)
+                if key is not None and score(fingerprint, self._fingerprints[key]) > 0:
+                    self.counters["model_hits"] += 1
+                    return key, 1.0
+
+            candidates = set()
+            for band in fingerprint.bands():
+                candidates |= self._buckets.get(band, set())
+            best, best_score = None, 0.0
+            for key in candidates:
+                s = score(fingerprint, self._fingerprints[key])
+                if s > best_score:
+                    best, best_score = key, s
+            self.counters["candidates_scored"] += len(candidates)
+            if best is not None and best_score >= self.threshold:
+                self.counters["lsh_hits"] += 1
+                return best, best_score
+            self.counters["misses"] += 1
+            return None, 0.0
+
+    def size(self):
+        with self._lock:
+            return len(self._fingerprints)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.counters)
+        metrics["indexed_products"] = self.size()
+        return metrics
+
+
+matcher = ProductMatcher(settings.match_threshold, settings.match_index_reload_seconds)
@@ -0,0 +1,93 @@
+# notifier.py - delivers triggered alerts off the request thread
+# alert events go on a bounded queue and a background thread hands each one to every
+# registered handler (log line by default; email / webhook / push can register their own).
+# A slow or failing handler never blocks the price write that triggered the alert.
+
+import queue
+import threading
+import time
+from config import settings
+
+
+def log_handler(event: dict):
+    where = f" at {event['retailer']} for ${event['price']:.2f}" if event.get("price") is not None else ""
+    print(f"Alert {event['alert_id']} triggered: product {event['product_id']}{where} "
+          f"(threshold ${event['price_threshold']:.2f})")
+
+
+class NotifierQueue:
+    def __init__(self, maxsize: int = 10000):
+        self._queue = queue.Queue(maxsize)
+        self._handlers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {"published": 0, "delivered": 0, "failed": 0, "dropped": 0}
+        self._latency_total = 0.0
+
+    def register(self, handler):
+        """handler(event: dict) is called once per triggered alert, from the notifier thread"""
+        self._handlers.append(handler)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="alert-notifier", daemon=True)
+                self._thread.start()
+
+    def publish(self, event: dict):
+        """Queue an event without blocking; dropped (and counted) if the queue is full"""
+        self._ensure_started()
+        event = dict(event, queued_at=time.monotonic())
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.counters["dropped"] += 1
+            return False
+        with self._lock:
+            self.counters["published"] += 1
+        return True
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                self._queue.task_done()
+                return
+            for handler in self._handlers:
+                try:
+                    handler(event)
+                except Exception as e:
+                    print(f"Alert notifier {getattr(handler, '__name__', handler)} failed: {e}")
+                    with self._lock:
+                        self.counters["failed"] += 1
+            with self._lock:
+                self.counters["delivered"] += 1
+                self._latency_total += time.monotonic() - event["queued_at"]
+            self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until everything queued so far has been handled"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.counters)
+            delivered = metrics["delivered"]
+            metrics["avg_delivery_ms"] = round(self._latency_total / delivered * 1000, 2) if delivered else 0.0
+        metrics["queue_depth"] = self._queue.qsize()
+        metrics["handlers"] = len(self._handlers)
+        return metrics
+
+
+notifier = NotifierQueue(settings.notifier_queue_size)
+notifier.register(log_handler)
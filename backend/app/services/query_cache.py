@@ -0,0 +1,314 @@
+# query_cache.py - read-through cache for the hot single-product reads
+# ProductService.get_product_by_id and PriceHistoryService.get_price_comparison (and their
+# async versions) go through here. Two tiers:
+#   local  - per-process LRU (search_cache.MemoryBackend), short TTL
+#   shared - optional, anything speaking the Redis protocol (query_cache_redis_url), longer TTL,
+#            so one process's database read fills the cache for the others
+# Entries are the rows' column values; every hit builds fresh model instances that belong to
+# no session, so callers can't change each other's copies or touch a closed session.
+# The services invalidate a product's entries after committing a write to it (new prices,
+# create, merge). Writes from other processes reach the local tier only by expiring, which
+# is why its TTL is short; the shared tier is invalidated directly. On the routes with
+# conditional GET the data version http_cache.py computes anyway is checked too, so a
+# response is never built from entries older than the ETag it goes out with.
+
+import importlib.util
+import json
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import DateTime, inspect
+from app.models.product import Product
+from app.models.current_offer import CurrentOffer
+from app.services.search_cache import MemoryBackend
+from config import settings
+
+# the shared tier needs the redis package (in requirements.txt for celery)
+REDIS_AVAILABLE = importlib.util.find_spec("redis") is not None
+
+
+def _column_keys(model):
+    return [attr.key for attr in inspect(model).column_attrs]
+
+
+def _datetime_keys(model):
+    return [attr.key for attr in inspect(model).column_attrs if isinstance(attr.columns[0].type, DateTime)]
+
+
+MODELS = {
+    "product": (Product, _column_keys(Product), _datetime_keys(Product)),
+    "offers": (CurrentOffer, _column_keys(CurrentOffer), _datetime_keys(CurrentOffer)),
+}
+
+
+def to_row(kind: str, obj):
+    return {key: getattr(obj, key) for key in MODELS[kind][1]}
+
+
+def from_row(kind: str, row):
+    return MODELS[kind][0](**row)
+
+
+def _dumps(value):
+    return json.dumps(value, default=datetime.isoformat)
+
+
+def _loads(kind: str, text):
+    value = json.loads(text)
+    for row in value if isinstance(value, list) else [value]:
+        for key in MODELS[kind][2]:
+            if row.get(key) is not None:
+                row[key] = datetime.fromisoformat(row[key])
+    return value
+
+
+class RedisTier:
+    """Shared tier over the Redis protocol. A failing call counts as a miss and takes the tier
+    out for retry_seconds, the database is always there to answer."""
+
+    def __init__(self, url: str, timeout: float = 0.1, retry_seconds: float = 30.0):
+        import redis
+        self.url = url
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.errors = 0
+        self.retry_at = 0.0
+        self._errors = (redis.RedisError, OSError)
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout,
+                                           decode_responses=True)
+        self._async_client = None
+
+    def _up(self):
+        return time.monotonic() >= self.retry_at
+
+    def _failed(self, error):
+        self.errors += 1
+        self.retry_at = time.monotonic() + self.retry_seconds
+        print(f"query cache redis tier unavailable for {self.retry_seconds:.0f}s: {error!r}")
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import redis.asyncio
+            self._async_client = redis.asyncio.Redis.from_url(
+                self.url, socket_timeout=self.timeout, socket_connect_timeout=self.timeout, decode_responses=True)
+        return self._async_client
+
+    def get(self, key: str):
+        if not self._up():
+            return None
+        try:
+            return self.client.get(key)
+        except self._errors as e:
+            self._failed(e)
+
+    def set(self, key: str, text: str, ttl: float):
+        if not self._up():
+            return
+        try:
+            self.client.set(key, text, px=int(ttl * 1000))
+        except self._errors as e:
+            self._failed(e)
+
+    async def get_async(self, key: str):
+        if not self._up():
+            return None
+        try:
+            return await self.async_client.get(key)
+        except self._errors as e:
+            self._failed(e)
+
+    async def set_async(self, key: str, text: str, ttl: float):
+        if not self._up():
+            return
+        try:
+            await self.async_client.set(key, text, px=int(ttl * 1000))
+        except self._errors as e:
+            self._failed(e)
+
+    def delete(self, *keys):
+        # not skipped while the tier is "down": a missed delete would leave a stale entry behind
+        try:
+            self.client.delete(*keys)
+        except self._errors as e:
+            self._failed(e)
+
+    def clear(self, prefix: str):
+        try:
+            keys = list(self.client.scan_iter(match=prefix + "*", count=1000))
+            for i in range(0, len(keys), 1000):
+                self.client.delete(*keys[i:i + 1000])
+        except self._errors as e:
+            self._failed(e)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+class QueryCache:
+    """Read-through cache for one product's row and its current offers"""
+
+    def __init__(self, local, local_ttl: float, shared=None, shared_ttl: float = 300.0,
+                 prefix: str = "pce:", enabled: bool = True):
+        self.local = local
+        self.local_ttl = local_ttl
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.prefix = prefix
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # bumped by every invalidation: a load that started before one doesn't get stored
+        self._generation = 0
+        # product id -> data version last seen by check_versions
+        self.versions = MemoryBackend(local.max_entries)
+        self.counters = {"hits": 0, "shared_hits": 0, "misses": 0, "expired": 0, "invalidations": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def key(self, kind: str, product_id: int):
+        return f"{self.prefix}{kind}:{product_id}"
+
+    def _from_local(self, key: str):
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[1] >= self.local_ttl:
+            self._count("expired")
+            return None
+        self._count("hits")
+        return entry[0]
+
+    def _build(self, kind: str, value):
+        if kind == "offers":
+            return [from_row(kind, row) for row in value]
+        return from_row(kind, value)
+
+    def _store(self, kind: str, key: str, loaded, generation: int):
+        # stores a fresh load locally -> its JSON for the shared tier, None when there's nothing to share
+        if loaded is None or generation != self._generation:
+            return None
+        value = [to_row(kind, obj) for obj in loaded] if kind == "offers" else to_row(kind, loaded)
+        self.local.set(key, value, time.time())
+        return _dumps(value) if self.shared is not None else None
+
+    def get_or_load(self, kind: str, product_id: int, load):
+        """Cached product ("product") or current offers ("offers"), calling load() on a miss.
+        load returns what the uncached service method would (a row / list of rows or None)."""
+        if not self.enabled:
+            return load()
+        key = self.key(kind, product_id)
+        value = self._from_local(key)
+        if value is None and self.shared is not None:
+            text = self.shared.get(key)
+            if text is not None:
+                self._count("shared_hits")
+                value = _loads(kind, text)
+                self.local.set(key, value, time.time())
+        if value is not None:
+            return self._build(kind, value)
+
+        self._count("misses")
+        generation = self._generation
+        loaded = load()
+        text = self._store(kind, key, loaded, generation)
+        if text is not None:
+            self.shared.set(key, text, self.shared_ttl)
+        return loaded
+
+    async def get_or_load_async(self, kind: str, product_id: int, load):
+        """get_or_load for the async routes, load() returns an awaitable"""
+        if not self.enabled:
+            return await load()
+        key = self.key(kind, product_id)
+        value = self._from_local(key)
+        if value is None and self.shared is not None:
+            text = await self.shared.get_async(key)
+            if text is not None:
+                self._count("shared_hits")
+                value = _loads(kind, text)
+                self.local.set(key, value, time.time())
+        if value is not None:
+            return self._build(kind, value)
+
+        self._count("misses")
+        generation = self._generation
+        loaded = await load()
+        text = self._store(kind, key, loaded, generation)
+        if text is not None:
+            await self.shared.set_async(key, text, self.shared_ttl)
+        return loaded
+
+    def invalidate_products(self, product_ids, shared: bool = True):
+        """Drop everything cached for these products, call after the write commits"""
+        keys = [self.key(kind, product_id) for product_id in set(product_ids) for kind in MODELS]
+        if not keys:
+            return
+        with self._lock:
+            self._generation += 1
+            self.counters["invalidations"] += len(keys)
+        self.local.delete(*keys)
+        if shared and self.shared is not None:
+            for i in range(0, len(keys), 1000):
+                self.shared.delete(*keys[i:i + 1000])
+
+    def check_versions(self, versions: dict):
+        """{product_id: data version} from the conditional GET check: drops the entries of
+        products whose data moved since the last check (a write by another process)"""
+        if not self.enabled:
+            return
+        moved, unseen = [], []
+        for product_id, version in versions.items():
+            seen = self.versions.get(product_id)
+            if seen is None:
+                unseen.append(product_id)  # entries may predate any check, local ones can't be trusted
+            elif seen[0] != version:
+                moved.append(product_id)
+            else:
+                continue
+            self.versions.set(product_id, version, time.time())
+        self.invalidate_products(unseen, shared=False)
+        self.invalidate_products(moved)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear(self.prefix)
+
+    async def aclose(self):
+        if self.shared is not None:
+            await self.shared.aclose()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.counters)
+        lookups = metrics["hits"] + metrics["shared_hits"] + metrics["misses"]
+        metrics["hit_ratio"] = round((metrics["hits"] + metrics["shared_hits"]) / lookups, 3) if lookups else 0.0
+        metrics["size"] = self.local.size()
+        metrics["evictions"] = self.local.evictions
+        metrics["shared"] = None
+        if self.shared is not None:
+            metrics["shared"] = {"url": self.shared.url.split("@")[-1], "errors": self.shared.errors,
+                                 "up": self.shared._up()}
+        return metrics
+
+
+def build_query_cache():
+    shared = None
+    if settings.query_cache_redis_url:
+        if REDIS_AVAILABLE:
+            shared = RedisTier(settings.query_cache_redis_url, settings.query_cache_redis_timeout,
+                               settings.query_cache_redis_retry_seconds)
+        else:
+            print("query_cache_redis_url is set but the redis package isn't installed, local cache only")
+    return QueryCache(MemoryBackend(settings.query_cache_max_entries), settings.query_cache_local_ttl,
+                      shared, settings.query_cache_redis_ttl, settings.query_cache_prefix,
+                      settings.query_cache_enabled)
+
+
+query_cache = build_query_cache()
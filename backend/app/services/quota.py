@@ -0,0 +1,98 @@
+# quota.py - upstream API call budgets
+# eBay Browse API: 5000 calls/day, SerpAPI: 100 calls/month shared by Amazon, Walmart
+# and Google Shopping. Counters reset when the day/month rolls over and can be kept
+# in a sqlite file so a restart doesn't forget what was already spent.
+
+import sqlite3
+import threading
+from datetime import datetime
+from config import settings
+
+# which budget each source draws from
+SOURCE_BUDGETS = {
+    "eBay": "ebay",
+    "Amazon": "serpapi",
+    "Walmart": "serpapi",
+    "Google Shopping": "serpapi",
+}
+
+
+def _window(period: str, now: datetime = None):
+    # key for the current budget window, e.g. "2026-10-17" or "2026-10"
+    now = now or datetime.utcnow()
+    return now.strftime("%Y-%m-%d") if period == "day" else now.strftime("%Y-%m")
+
+
+class QuotaTracker:
+    """Counts calls per budget in the current window. budgets = {name: (limit, "day"|"month")}"""
+
+    def __init__(self, budgets: dict, state_path: str = None):
+        self.budgets = budgets
+        self._lock = threading.Lock()
+        self._used = {}  # (budget, window) -> calls
+        self._conn = None
+        if state_path:
+            self._conn = sqlite3.connect(state_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quota_usage ("
+                "budget TEXT, window TEXT, used INTEGER, PRIMARY KEY (budget, window))"
+            )
+            for budget, window, used in self._conn.execute("SELECT budget, window, used FROM quota_usage"):
+                self._used[(budget, window)] = used
+
+    def _key(self, source: str):
+        budget = SOURCE_BUDGETS.get(source, source)
+        if budget not in self.budgets:
+            return None
+        return budget, _window(self.budgets[budget][1])
+
+    def remaining(self, source: str):
+        """Calls left in the current window (None if the source has no budget)"""
+        key = self._key(source)
+        if key is None:
+            return None
+        with self._lock:
+            return max(self.budgets[key[0]][0] - self._used.get(key, 0), 0)
+
+    def would_exceed(self, source: str, calls: int = 1):
+        remaining = self.remaining(source)
+        return remaining is not None and remaining < calls
+
+    def try_spend(self, source: str, calls: int = 1):
+        """Record calls if the budget allows them; returns False (and records nothing) if not"""
+        key = self._key(source)
+        if key is None:
+            return True
+        with self._lock:
+            used = self._used.get(key, 0)
+            if used + calls > self.budgets[key[0]][0]:
+                return False
+            self._used[key] = used + calls
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO quota_usage (budget, window, used) VALUES (?, ?, ?) "
+                    "ON CONFLICT (budget, window) DO UPDATE SET used = excluded.used",
+                    (key[0], key[1], used + calls)
+                )
+                self._conn.commit()
+            return True
+
+    def get_metrics(self):
+        result = {}
+        with self._lock:
+            for budget, (limit, period) in self.budgets.items():
+                used = self._used.get((budget, _window(period)), 0)
+                result[budget] = {"limit": limit, "period": period, "used": used, "remaining": max(limit - used, 0)}
+        return result
+
+
+def build_quota_tracker():
+    budgets = {
+        "ebay": (settings.ebay_daily_quota, "day"),
+        "serpapi": (settings.serpapi_monthly_quota, "month"),
+    }
+    state_path = settings.search_cache_path if settings.search_cache_backend == "sqlite" else None
+    return QuotaTracker(budgets, state_path)
+
+
+quotas = build_quota_tracker()
@@ -0,0 +1,138 @@
+# recommender.py - offline "similar products" index
+# scores every product against the rest of its category in one vectorized pass:
+#   brand match + tag overlap (jaccard) + how close the current prices are
+# and keeps the top k per product in the recommendations table, so serving is one
+# joined query. Run build_recommendations.py after imports (or on a schedule).
+
+from collections import Counter
+import numpy as np
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from app.models.current_offer import CurrentOffer
+from app.models.recommendation import Recommendation
+from config import settings
+
+BRAND_WEIGHT = 0.3
+TAGS_WEIGHT = 0.4
+PRICE_WEIGHT = 0.3
+# average prices within +-30% of each other count as "similar", the rest are "related"
+PRICE_BAND = 0.3
+# most frequent tags per category kept for the jaccard matrix
+MAX_TAGS = 1024
+# score matrix cells per chunk (rows x category size), bounds memory on big categories
+CHUNK_CELLS = 4_000_000
+
+
+def _tag_set(tags: str):
+    return {t.strip().lower() for t in (tags or "").split(",") if t.strip()}
+
+
+def _load_catalog(db: Session):
+    # product_id -> (category, brand, tags) plus the average current price per product
+    products = db.query(Product.id, Product.category, Product.brand, Product.tags).order_by(Product.id).all()
+    prices = dict(db.query(CurrentOffer.product_id, func.avg(CurrentOffer.price)).group_by(
+        CurrentOffer.product_id).all())
+    blocks = {}
+    for product_id, category, brand, tags in products:
+        blocks.setdefault((category or "").strip().lower(), []).append((product_id, brand, tags))
+    return blocks, prices
+
+
+def _score_block(block, prices, wanted, k):
+    """Top-k neighbours for the `wanted` rows of one category block.
+    Yields (product_id, [(neighbour_id, score, is_similar), ...])"""
+    n = len(block)
+    ids = np.array([row[0] for row in block])
+
+    brand_codes = {}
+    codes = np.array([brand_codes.setdefault(b.strip().lower(), len(brand_codes)) if b and b.strip() else -1
+                      for _, b, _ in block])
+
+    tag_sets = [_tag_set(tags) for _, _, tags in block]
+    vocab = {tag: i for i, (tag, _) in enumerate(Counter(t for s in tag_sets for t in s).most_common(MAX_TAGS))}
+    tag_matrix = np.zeros((n, len(vocab)), dtype=np.float32)
+    for row, tags in enumerate(tag_sets):
+        tag_matrix[row, [vocab[t] for t in tags if t in vocab]] = 1.0
+    tag_counts = tag_matrix.sum(axis=1)
+
+    price = np.array([prices.get(pid) or np.nan for pid in ids], dtype=np.float64)
+    log_price = np.log(np.where(price > 0, price, np.nan))
+    band = np.log1p(PRICE_BAND)
+
+    k = min(k, n - 1)
+    if k <= 0:
+        return
+    chunk = max(1, CHUNK_CELLS // n)
+    for start in range(0, len(wanted), chunk):
+        rows = wanted[start:start + chunk]
+
+        brand = ((codes[rows, None] == codes[None, :]) & (codes[rows, None] >= 0)).astype(np.float32)
+
+        overlap = tag_matrix[rows] @ tag_matrix.T
+        union = tag_counts[rows, None] + tag_counts[None, :] - overlap
+        jaccard = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+        distance = np.abs(log_price[rows, None] - log_price[None, :])
+        closeness = np.nan_to_num(1.0 / (1.0 + (distance / band) ** 2), nan=0.0)
+
+        score = BRAND_WEIGHT * brand + TAGS_WEIGHT * jaccard + PRICE_WEIGHT * closeness
+        score[np.arange(len(rows)), rows] = -np.inf  # never recommend a product to itself
+
+        top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(score, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        similar = np.take_along_axis(distance, top, axis=1) <= band
+
+        for i, row in enumerate(rows):
+            neighbours = [(int(ids[j]), round(float(s), 4), bool(sim))
+                          for j, s, sim in zip(top[i], top_scores[i], similar[i]) if s > 0]
+            yield int(ids[row]), neighbours
+
+
+def compute(db: Session, k: int = None, product_ids=None):
+    """{product_id: [(neighbour_id, score, is_similar), ...]} best first, for product_ids (default all)"""
+    k = k or settings.recommendation_top_k
+    blocks, prices = _load_catalog(db)
+    wanted_ids = set(product_ids) if product_ids is not None else None
+    result = {}
+    for block in blocks.values():
+        if wanted_ids is None:
+            wanted = np.arange(len(block))
+        else:
+            wanted = np.array([i for i, row in enumerate(block) if row[0] in wanted_ids], dtype=np.int64)
+            if not len(wanted):
+                continue
+        for product_id, neighbours in _score_block(block, prices, wanted, k):
+            result[product_id] = neighbours
+    return result
+
+
+def store(db: Session, recommendations: dict, replace_all: bool = False):
+    """Replace the stored recommendations of these products (or all of them) in one transaction"""
+    query = db.query(Recommendation)
+    if not replace_all:
+        ids = list(recommendations)
+        for i in range(0, len(ids), 500):
+            query.filter(Recommendation.product_id.in_(ids[i:i + 500])).delete(synchronize_session=False)
+    else:
+        query.delete(synchronize_session=False)
+
+    rows = [
+        {"product_id": product_id, "recommended_product_id": neighbour_id,
+         "recommendation_type": "similar" if is_similar else "related", "score": score}
+        for product_id, neighbours in recommendations.items()
+        for neighbour_id, score, is_similar in neighbours
+    ]
+    batch_size = settings.ingest_batch_size
+    for i in range(0, len(rows), batch_size):
+        db.execute(insert(Recommendation), rows[i:i + batch_size])
+    db.commit()
+    return len(rows)
+
+
+def build_all(db: Session, k: int = None):
+    """Recompute and store the top-k neighbours of every product. Returns rows written."""
+    return store(db, compute(db, k), replace_all=True)
@@ -0,0 +1,251 @@
+# refresh_worker.py - keeps price_histories fresh for tracked products
+# every cycle it finds products whose newest offer is older than refresh_interval_minutes,
+# orders them in a priority queue (active alerts and recent page views first, then the
+# most stale), re-fetches the price from the retailer the offer came from and appends
+# the results through the listing path, which only writes a price row when the price or
+# stock changed. An unchanged re-fetch still counts as fresh (the listing's last_seen_at).
+# The retailers are searched by product name, so a result is only used when it is one of
+# the product's known listings or matches the product's fingerprint (see matching.py);
+# anything else is skipped rather than saved as this product's price.
+# Calls go through the same search cache + quota tracker as user searches, and the worker
+# stops for a source once its budget is down to the configured reserve.
+# Runs in-process (refresh_worker_enabled, started from main.py) or via refresh_prices.py.
+
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, func, select
+from app.models.alert import Alert
+from app.models.current_offer import CurrentOffer
+from app.models.product import Product
+from app.models.product_listing import ProductListing
+from app.services.aggregator import DataAggregationService, SERPAPI_ENGINES
+from app.services.business import ListingService
+from app.services.matching import Fingerprint, score
+from app.services.quota import quotas, SOURCE_BUDGETS
+from config import settings
+from database import SessionLocal
+
+# retailers the worker knows how to re-fetch
+REFRESHABLE_SOURCES = ["eBay"] + list(SERPAPI_ENGINES)
+# results looked at per search when finding the product's own listing (still one call)
+SEARCH_RESULTS = 5
+
+# recent page views, fed by the product routes and halved every cycle so old interest fades.
+# Only counted in-process - the standalone refresh_prices.py goes by alerts + staleness.
+_views = Counter()
+_views_lock = threading.Lock()
+
+
+def record_view(product_id: int):
+    """Count a product page view (used to prioritise refreshes)"""
+    with _views_lock:
+        _views[product_id] += 1
+
+
+class PriceRefreshWorker:
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.queue = []  # heap of (-priority, product_id, name, brand, sources, {retailer: listing ids})
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            "cycles": 0, "refreshed": 0, "unchanged_or_missing": 0, "skipped_budget": 0, "no_match": 0,
+            "errors": 0, "last_cycle_seconds": 0.0, "last_cycle_at": None, "items_per_second": 0.0,
+        }
+
+    # ---------- planning ----------
+
+    @staticmethod
+    def priority(alerts: int, views: int, stale_hours: float):
+        # alerts matter most (someone is waiting on a price), then views, then staleness
+        return (settings.refresh_alert_weight * alerts
+                + settings.refresh_view_weight * views
+                + min(stale_hours, 24 * 7))
+
+    def plan(self, db):
+        """Rebuild the queue from the products that are due for a refresh"""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(minutes=settings.refresh_interval_minutes)
+
+        # last time each offer was checked: its price row, or a later unchanged sighting
+        seen = select(
+            ProductListing.product_id, ProductListing.retailer,
+            func.max(ProductListing.last_seen_at).label("seen_at")
+        ).group_by(ProductListing.product_id, ProductListing.retailer).subquery()
+        checked = case((seen.c.seen_at > CurrentOffer.created_at, seen.c.seen_at), else_=CurrentOffer.created_at)
+
+        due = db.query(
+            CurrentOffer.product_id,
+            Product.name,
+            Product.brand,
+            func.max(checked).label("newest")
+        ).join(Product, Product.id == CurrentOffer.product_id).outerjoin(
+            seen, and_(seen.c.product_id == CurrentOffer.product_id, seen.c.retailer == CurrentOffer.retailer)
+        ).filter(
+            CurrentOffer.retailer.in_(REFRESHABLE_SOURCES)
+        ).group_by(CurrentOffer.product_id, Product.name, Product.brand).having(
+            func.max(checked) < cutoff
+        ).all()
+
+        sources = {}
+        for product_id, retailer in db.query(CurrentOffer.product_id, CurrentOffer.retailer).filter(
+            CurrentOffer.retailer.in_(REFRESHABLE_SOURCES)
+        ).all():
+            sources.setdefault(product_id, []).append(retailer)
+
+        # listings each due product is known by, so a re-fetch can find the same item
+        due_ids = [row[0] for row in due]
+        listings = {}
+        for i in range(0, len(due_ids), 500):
+            for product_id, retailer, external_id in db.query(
+                ProductListing.product_id, ProductListing.retailer, ProductListing.external_id
+            ).filter(ProductListing.product_id.in_(due_ids[i:i + 500])):
+                listings.setdefault(product_id, {}).setdefault(retailer, set()).add(external_id)
+
+        alert_counts = dict(db.query(Alert.product_id, func.count(Alert.id)).filter(
+            Alert.is_active == True, Alert.triggered == False
+        ).group_by(Alert.product_id).all())
+
+        with _views_lock:
+            views = dict(_views)
+            for product_id in list(_views):
+                _views[product_id] //= 2
+                if not _views[product_id]:
+                    del _views[product_id]
+
+        heap = []
+        for product_id, name, brand, newest in due:
+            stale_hours = (now - newest).total_seconds() / 3600 if newest else 24 * 7
+            priority = self.priority(alert_counts.get(product_id, 0), views.get(product_id, 0), stale_hours)
+            # product ids are unique, so the heap never compares the listings dicts
+            heap.append((-priority, product_id, name, brand, tuple(sources.get(product_id, ())),
+                         listings.get(product_id, {})))
+        heapq.heapify(heap)
+        with self._lock:
+            self.queue = heap
+        return len(heap)
+
+    # ---------- fetching ----------
+
+    @staticmethod
+    def _has_budget(source: str):
+        budget = SOURCE_BUDGETS.get(source)
+        reserve = settings.refresh_reserve.get(budget, 0)
+        remaining = quotas.remaining(source)
+        return remaining is None or remaining > reserve
+
+    @staticmethod
+    def fetch_price(source: str, name: str, brand: str = None, external_ids=()):
+        """Current price record (with the listing's external_id) for a product at one retailer, or None.
+        The product's own listing (one of external_ids) wins, otherwise the result that best
+        matches the product's name / brand - and no result at all when none matches."""
+        if source == "eBay":
+            items = DataAggregationService.search_ebay(name, limit=SEARCH_RESULTS)
+            parser = DataAggregationService.parse_ebay_item
+        else:
+            items = DataAggregationService.search_serpapi(source, name, limit=SEARCH_RESULTS)
+            parser = {
+                "Amazon": DataAggregationService.parse_amazon_item,
+                "Walmart": DataAggregationService.parse_walmart_item,
+                "Google Shopping": DataAggregationService.parse_google_shopping_item,
+            }[source]
+        wanted = Fingerprint(name, brand)
+        best, best_score = None, settings.match_threshold
+        for item in items:
+            parsed = parser(item)
+            if not parsed:
+                continue
+            record = dict(parsed[1], title=parsed[0]["name"])
+            if record.get("external_id") in external_ids:
+                return record
+            item_score = score(wanted, Fingerprint(parsed[0]["name"]))
+            if item_score >= best_score:
+                best, best_score = record, item_score
+        return best
+
+    def run_once(self, max_items: int = None):
+        """One cycle: plan, then refresh up to max_items products. Returns rows written."""
+        max_items = max_items or settings.refresh_batch_size
+        started = time.perf_counter()
+        db = self.session_factory()
+        records = []
+        written = 0
+        try:
+            self.plan(db)
+            processed = 0
+            while processed < max_items and not self._stop.is_set():
+                with self._lock:
+                    if not self.queue:
+                        break
+                    _, product_id, name, brand, sources, listings = heapq.heappop(self.queue)
+                processed += 1
+                for source in sources:
+                    if not self._has_budget(source):
+                        self.stats["skipped_budget"] += 1
+                        continue
+                    try:
+                        record = self.fetch_price(source, name, brand, listings.get(source, ()))
+                    except Exception as e:
+                        print(f"Refresh error for product {product_id} at {source}: {e}")
+                        self.stats["errors"] += 1
+                        continue
+                    if record:
+                        records.append(dict(record, product_id=product_id))
+                    else:
+                        self.stats["no_match"] += 1
+
+            if records:
+                _, written = ListingService.record_prices(db, records)
+                self.stats["unchanged_or_missing"] += len(records) - written
+        finally:
+            db.close()
+
+        elapsed = time.perf_counter() - started
+        self.stats["cycles"] += 1
+        self.stats["refreshed"] += written
+        self.stats["last_cycle_seconds"] = round(elapsed, 3)
+        self.stats["last_cycle_at"] = datetime.utcnow().isoformat()
+        self.stats["items_per_second"] = round(len(records) / elapsed, 2) if elapsed else 0.0
+        return written
+
+    # ---------- running ----------
+
+    def run_forever(self, interval_seconds: float = None):
+        interval_seconds = interval_seconds or settings.refresh_poll_seconds
+        while not self._stop.is_set():
+            try:
+                written = self.run_once()
+                print(f"Price refresh: {written} prices written, {self.queue_depth()} still queued")
+            except Exception as e:
+                print(f"Price refresh cycle failed: {e}")
+                self.stats["errors"] += 1
+            self._stop.wait(interval_seconds)
+
+    def start(self):
+        """Run in a background thread (in-process mode)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="price-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self.queue)
+
+    def get_metrics(self):
+        metrics = dict(self.stats)
+        metrics["queue_depth"] = self.queue_depth()
+        metrics["running"] = self._thread is not None and self._thread.is_alive()
+        return metrics
+
+
+refresh_worker = PriceRefreshWorker()
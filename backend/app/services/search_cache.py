@@ -0,0 +1,202 @@
+# search_cache.py - response cache for upstream retailer searches
+# keyed by (source, normalized query, limit), with a TTL per source and an LRU size bound.
+# Two backends: in-memory (default) or a sqlite file that survives restarts.
+# When a fresh fetch would go over the source's quota (see quota.py), stale entries
+# are served instead of spending a call.
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import settings
+from app.services.quota import quotas
+
+
+def normalize_query(query: str):
+    # "  iPhone   15 " and "iphone 15" share one cache entry
+    return " ".join((query or "").lower().split())
+
+
+class MemoryBackend:
+    """LRU dict of key -> (value, stored_at)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value, stored_at: float):
+        with self._lock:
+            self._items[key] = (value, stored_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def size(self):
+        return len(self._items)
+
+
+class SQLiteBackend:
+    """Same interface as MemoryBackend, stored in a sqlite file (JSON values)"""
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, value TEXT, stored_at REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_search_cache_last_used ON search_cache (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value, stored_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, stored_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO search_cache (key, value, stored_at, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                "stored_at = excluded.stored_at, last_used = excluded.last_used",
+                (key, json.dumps(value), stored_at, time.time())
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                # least recently used go first
+                self._conn.execute(
+                    "DELETE FROM search_cache WHERE key IN "
+                    "(SELECT key FROM search_cache ORDER BY last_used ASC LIMIT ?)", (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+
+class SearchCache:
+    """Cache in front of the upstream search calls. fetch functions return a list of items."""
+
+    def __init__(self, backend, ttls: dict, default_ttl: int = 900, quota=None):
+        self.backend = backend
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.quota = quota
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stale_hits": 0, "quota_blocked": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def make_key(source: str, query: str, limit: int):
+        return f"{source}|{normalize_query(query)}|{limit}"
+
+    def _lookup(self, source: str, key: str):
+        # -> (entry or None, is_fresh)
+        entry = self.backend.get(key)
+        if entry is None:
+            return None, False
+        return entry, time.time() - entry[1] < self.ttls.get(source, self.default_ttl)
+
+    def _before_fetch(self, source: str, entry):
+        # returns (value_to_serve, should_fetch)
+        if self.quota is not None and not self.quota.try_spend(source):
+            # out of budget: stale beats nothing
+            if entry is not None:
+                self._count("stale_hits")
+                return entry[0], False
+            self._count("quota_blocked")
+            print(f"{source} quota exhausted, no cached results to serve")
+            return [], False
+        self._count("misses")
+        return None, True
+
+    def _after_fetch(self, key: str, value, entry):
+        if value:
+            self.backend.set(key, value, time.time())
+            return value
+        # empty usually means the upstream call failed - keep serving what we had
+        if entry is not None:
+            self._count("stale_hits")
+            return entry[0]
+        return value
+
+    def get_or_fetch(self, source: str, query: str, limit: int, fetch):
+        """Cached results for this search, calling fetch() only on a miss"""
+        key = self.make_key(source, query, limit)
+        entry, fresh = self._lookup(source, key)
+        if fresh:
+            self._count("hits")
+            return entry[0]
+        value, should_fetch = self._before_fetch(source, entry)
+        if not should_fetch:
+            return value
+        return self._after_fetch(key, fetch(), entry)
+
+    async def get_or_fetch_async(self, source: str, query: str, limit: int, fetch):
+        """Async get_or_fetch, fetch() returns an awaitable"""
+        key = self.make_key(source, query, limit)
+        entry, fresh = self._lookup(source, key)
+        if fresh:
+            self._count("hits")
+            return entry[0]
+        value, should_fetch = self._before_fetch(source, entry)
+        if not should_fetch:
+            return value
+        return self._after_fetch(key, await fetch(), entry)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.counters)
+        lookups = metrics["hits"] + metrics["misses"] + metrics["stale_hits"] + metrics["quota_blocked"]
+        metrics["hit_ratio"] = round((metrics["hits"] + metrics["stale_hits"]) / lookups, 3) if lookups else 0.0
+        metrics["size"] = self.backend.size()
+        metrics["evictions"] = self.backend.evictions
+        metrics["backend"] = type(self.backend).__name__
+        return metrics
+
+
+def build_search_cache():
+    if settings.search_cache_backend == "sqlite":
+        backend = SQLiteBackend(settings.search_cache_path, settings.search_cache_max_entries)
+    else:
+        backend = MemoryBackend(settings.search_cache_max_entries)
+    return SearchCache(backend, settings.search_cache_ttls, quota=quotas)
+
+
+search_cache = build_search_cache()
@@ -0,0 +1,161 @@
+# search_index.py - full-text search over product name + description
+# postgres: a generated tsvector column with a GIN index
+# sqlite: an FTS5 table kept in sync with products by triggers
+# both rank results (name matches weigh more) and treat every term as a prefix,
+# so "sams gala" finds "Samsung Galaxy". Other databases fall back to ILIKE.
+
+import re
+from sqlalchemy import column, text, inspect
+from sqlalchemy.orm import Session
+from app.models.product import Product
+
+# name counts 10x description when ranking
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+# the same ratio for postgres ts_rank: weights in {D, C, B, A} order and at most 1, name is A
+# and description B (C and D are unused)
+_TS_WEIGHTS = "{%g, %g, %g, 1}" % ((DESCRIPTION_WEIGHT / NAME_WEIGHT,) * 3)
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    """ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+]
+
+# bind -> whether the index exists, so we only look once per engine
+_available = {}
+
+
+def ensure_search_index(engine):
+    """Create the full-text index for this database if it's missing (safe to call every startup)"""
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                existed = inspect(conn).has_table("products_fts")
+                for ddl in _SQLITE_DDL:
+                    conn.exec_driver_sql(ddl)
+                if not existed:
+                    print("Building products_fts search index...")
+                    conn.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+            elif dialect == "postgresql":
+                for ddl in _POSTGRES_DDL:
+                    conn.exec_driver_sql(ddl)
+            else:
+                _available[engine] = False
+                return False
+    except Exception as e:
+        # e.g. sqlite built without FTS5 - search keeps working through ILIKE
+        print(f"Full-text search index unavailable, using ILIKE: {e}")
+        _available[engine] = False
+        return False
+    _available[engine] = True
+    return True
+
+
+def is_available(db: Session):
+    engine = db.get_bind()
+    if engine not in _available:
+        dialect = engine.dialect.name
+        if dialect == "sqlite":
+            _available[engine] = inspect(engine).has_table("products_fts")
+        elif dialect == "postgresql":
+            columns = inspect(engine).get_columns("products")
+            _available[engine] = any(c["name"] == "search_vector" for c in columns)
+        else:
+            _available[engine] = False
+    return _available[engine]
+
+
+def _terms(query: str):
+    # words and model numbers only, so user input can't inject FTS operators
+    return re.findall(r"\w+", (query or "").lower())
+
+
+def _fts_match(terms):
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms):
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def match_clause(db: Session, query: str):
+    """Where clause keeping the products search() would find for query, to filter other
+    product queries with (the catalog's q). None when search() would return None."""
+    terms = _terms(query)
+    if not terms or not is_available(db):
+        return None
+    if db.get_bind().dialect.name == "sqlite":
+        matching = text("SELECT rowid FROM products_fts WHERE products_fts MATCH :match")
+        return Product.id.in_(matching.bindparams(match=_fts_match(terms)).columns(column("rowid")))
+    return text("products.search_vector @@ to_tsquery('simple', :tsq)").bindparams(tsq=_tsquery(terms))
+
+
+def search(db: Session, query: str, category: str = None, limit: int = None, offset: int = 0, columns=None):
+    """Ranked full-text search, every term must match (as a prefix).
+    Returns None if the index isn't available or the query has no usable terms.
+    With columns (Product attributes), plain rows of just those instead of Products."""
+    terms = _terms(query)
+    if not terms or not is_available(db):
+        return None
+
+    params = {}
+    dialect = db.get_bind().dialect.name
+    selected = ", ".join(f"products.{column.key}" for column in columns) if columns else "products.*"
+    if dialect == "sqlite":
+        params["match"] = _fts_match(terms)
+        sql = (
+            f"SELECT {selected} FROM products_fts "
+            "JOIN products ON products.id = products_fts.rowid "
+            "WHERE products_fts MATCH :match"
+        )
+        order = f"bm25(products_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), products.id"
+    else:
+        params["tsq"] = _tsquery(terms)
+        sql = (
+            f"SELECT {selected} FROM products "
+            "WHERE products.search_vector @@ to_tsquery('simple', :tsq)"
+        )
+        order = f"ts_rank('{_TS_WEIGHTS}', products.search_vector, to_tsquery('simple', :tsq)) DESC, products.id"
+
+    if category:
+        sql += " AND lower(products.category) LIKE :category"
+        params["category"] = f"%{category.lower()}%"
+    sql += f" ORDER BY {order}"
+    if limit:
+        sql += " LIMIT :limit OFFSET :offset"
+        params["limit"] = limit
+        params["offset"] = offset
+    elif offset:
+        sql += " LIMIT -1 OFFSET :offset" if dialect == "sqlite" else " OFFSET :offset"
+        params["offset"] = offset
+
+    stmt = text(sql).bindparams(**params)
+    if columns:
+        # typed, so datetimes come back as datetimes on sqlite too
+        return db.execute(stmt.columns(*[column.expression for column in columns])).all()
+    return db.query(Product).from_statement(stmt).all()
@@ -0,0 +1,74 @@
+# singleflight.py - request coalescing for identical concurrent work
+# the first caller for a key runs the function, everyone else asking for the same key
+# while it's running waits and gets the same result. Results can also be kept for a
+# few seconds afterwards so a burst that arrives slightly staggered still shares them.
+
+import threading
+import time
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    """Thread-safe: sync routes run on the threadpool, so callers are threads"""
+
+    def __init__(self, remember_for: float = 0.0):
+        self.remember_for = remember_for
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call, in flight or recently finished
+        self.counters = {"calls": 0, "executions": 0, "shared": 0, "errors": 0}
+
+    def _expired(self, call: _Call, now: float):
+        return call.finished_at is not None and now - call.finished_at >= self.remember_for
+
+    def do(self, key, fn):
+        """Run fn() once per key for all concurrent callers and return its result"""
+        now = time.monotonic()
+        with self._lock:
+            self.counters["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None and self._expired(call, now):
+                call = None
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters["executions"] += 1
+            else:
+                self.counters["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        finally:
+            call.finished_at = time.monotonic()
+            with self._lock:
+                # errors and empty results aren't remembered, the next caller retries
+                if call.error is not None or not call.result or self.remember_for <= 0:
+                    self._calls.pop(key, None)
+                # drop anything else that has expired while we're here
+                for other_key in [k for k, c in self._calls.items() if self._expired(c, call.finished_at)]:
+                    del self._calls[other_key]
+            call.done.set()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.counters)
+            metrics["in_flight"] = sum(1 for c in self._calls.values() if not c.done.is_set())
+        return metrics
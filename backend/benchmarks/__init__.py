@@ -0,0 +1,2 @@
+# benchmarks - standalone perf scripts, run from the backend folder:
+#   python -m benchmarks.products_listing
@@ -0,0 +1,107 @@
+# _common.py - shared helpers for the benchmark scripts
+# every benchmark runs against its own throwaway sqlite file, never the real database
+
+import os
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # database.py builds an engine on import
+
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from random import Random
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from app.models.product import Product
+from app.models.price_history import PriceHistory
+from app.services.business import PriceHistoryService  # also registers every model on Base.metadata
+
+RETAILERS = ["eBay", "Amazon", "Walmart", "BestBuy", "Target"]
+CATEGORIES = ["Laptops", "Phones", "Headphones", "Monitors", "Cameras"]
+
+
+def make_session(url: str = None):
+    """Fresh database with all tables created. Returns (engine, Session)"""
+    if url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="pce-bench-"), "bench.db")
+        url = f"sqlite:///{path}"
+    engine = create_engine(url, echo=False)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class QueryCounter:
+    """Counts statements sent to the database while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+@contextmanager
+def timed(label: str = None):
+    """Yields a dict whose 'seconds' key is filled in on exit"""
+    result = {"seconds": 0.0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        if label:
+            print(f"{label}: {result['seconds'] * 1000:.1f} ms")
+
+
+def seed_catalog(db, products: int, retailers: int = 3, points: int = 5, seed: int = 42):
+    """Bulk-load products with `points` historical prices at each of `retailers` stores,
+    then build current_offers from them"""
+    rng = Random(seed)
+    now = datetime.utcnow()
+    db.execute(insert(Product), [
+        {
+            "name": f"Bench Product {i}",
+            "description": f"Benchmark product number {i}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "brand": f"Brand{i % 50}",
+            "tags": f"tag{i % 20},bench",
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(1, products + 1)
+    ])
+    db.commit()
+
+    rows = []
+    for product_id in range(1, products + 1):
+        for retailer in RETAILERS[:retailers]:
+            price = rng.uniform(20, 2000)
+            for point in range(points):
+                price = round(price * rng.uniform(0.9, 1.1), 2)
+                rows.append({
+                    "product_id": product_id,
+                    "retailer": retailer,
+                    "price": price,
+                    "original_price": round(price * 1.2, 2),
+                    "discount_percent": 16.67,
+                    "in_stock": "in_stock",
+                    "created_at": now - timedelta(hours=point * 6),
+                })
+        if len(rows) >= 50000:
+            db.execute(insert(PriceHistory), rows)
+            rows = []
+    if rows:
+        db.execute(insert(PriceHistory), rows)
+    db.commit()
+    PriceHistoryService.rebuild_current_offers(db)
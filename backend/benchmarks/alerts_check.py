@@ -0,0 +1,92 @@
+# alerts_check.py - POST /api/alerts/check: per-alert loop vs set-based evaluation
+# usage: python -m benchmarks.alerts_check [--products 20000] [--alerts 100000] [--legacy-sample 5000]
+
+import argparse
+from random import Random
+
+from sqlalchemy import insert, update
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed, RETAILERS
+from app.models.alert import Alert
+from app.services.business import AlertService, PriceHistoryService
+from datetime import datetime
+
+
+def legacy_check(db, max_id=None):
+    # the old version: one get_price_comparison per active alert
+    query = db.query(Alert).filter(Alert.is_active == True)
+    if max_id:
+        query = query.filter(Alert.id <= max_id)
+    triggered = []
+    for alert in query.all():
+        for price_entry in PriceHistoryService.get_price_comparison(db, alert.product_id):
+            if alert.target_retailer and price_entry.retailer != alert.target_retailer:
+                continue
+            if price_entry.price <= alert.price_threshold and not alert.triggered:
+                alert.triggered = True
+                alert.triggered_at = datetime.utcnow()
+                triggered.append(alert)
+    db.commit()
+    return triggered
+
+
+def seed_alerts(db, products, alerts, retailers, seed=7):
+    rng = Random(seed)
+    rows = []
+    for _ in range(alerts):
+        rows.append({
+            "product_id": rng.randint(1, products),
+            "price_threshold": round(rng.uniform(20, 2000), 2),
+            "target_retailer": rng.choice(RETAILERS[:retailers]) if rng.random() < 0.3 else None,
+            "is_active": rng.random() < 0.9,
+            "triggered": False,
+        })
+    db.execute(insert(Alert), rows)
+    db.commit()
+
+
+def reset_alerts(db):
+    db.execute(update(Alert).values(triggered=False, triggered_at=None))
+    db.commit()
+
+
+def run(products, alerts, retailers, legacy_sample):
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, products, retailers=retailers, points=5)
+    seed_alerts(db, products, alerts, retailers)
+    print(f"\n== {products} products x {retailers} retailers, {alerts} alerts ==")
+
+    if legacy_sample:
+        with QueryCounter(engine) as counter, timed() as t:
+            legacy = legacy_check(db, max_id=legacy_sample)
+        per_alert = t["seconds"] / legacy_sample
+        print(f"{'legacy loop (' + str(legacy_sample) + ' alerts)':<34} {len(legacy):>7} triggered  "
+              f"{counter.count:>7} queries  {t['seconds'] * 1000:>10.1f} ms  "
+              f"(~{per_alert * alerts:.1f} s extrapolated to {alerts})")
+        reset_alerts(db)
+        legacy_ids = {a.id for a in legacy}
+    db.expunge_all()
+
+    with QueryCounter(engine) as counter, timed() as t:
+        triggered = AlertService.check_alerts(db)
+    print(f"{'set-based':<34} {len(triggered):>7} triggered  {counter.count:>7} queries  {t['seconds'] * 1000:>10.1f} ms")
+
+    if legacy_sample:
+        # the legacy sample covers alert ids up to legacy_sample, the set-based pass must agree on those
+        sample_ids = {row.id for row in triggered if row.id <= legacy_sample}
+        assert sample_ids == legacy_ids, "set-based and legacy results differ"
+        print("results match the legacy loop on the sampled alerts")
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--alerts", type=int, default=100000)
+    parser.add_argument("--retailers", type=int, default=3)
+    parser.add_argument("--legacy-sample", type=int, default=5000, help="0 skips the legacy loop")
+    args = parser.parse_args()
+    run(args.products, args.alerts, args.retailers, args.legacy_sample)
@@ -0,0 +1,63 @@
+# alerts_incremental.py - time from a price write to its alerts being triggered and queued
+# usage: python -m benchmarks.alerts_incremental [--products 20000] [--alerts 100000] [--writes 500]
+
+import argparse
+import statistics
+from random import Random
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed, RETAILERS
+from benchmarks.alerts_check import seed_alerts
+from app.services.alert_index import alert_index
+from app.services.business import AlertService, PriceHistoryService
+from app.services.notifier import notifier
+
+
+def run(products, alerts, retailers, writes):
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, products, retailers=retailers, points=1)
+    seed_alerts(db, products, alerts, retailers)
+    notifier._handlers = []  # keep the benchmark output quiet
+    print(f"\n== {products} products, {alerts} alerts, {writes} single price writes ==")
+
+    with timed("index load") as t:
+        alert_index.load(db)
+    print(f"indexed {alert_index.size()} alerts")
+
+    rng = Random(3)
+    check_ms = []
+    with QueryCounter(engine) as counter:
+        for _ in range(writes):
+            product_id = rng.randint(1, products)
+            retailer = rng.choice(RETAILERS[:retailers])
+            price = round(rng.uniform(20, 2000), 2)
+            with timed() as t:
+                AlertService.trigger_for_prices(db, [(product_id, retailer, price)])
+            check_ms.append(t["seconds"] * 1000)
+    notifier.flush()
+    metrics = notifier.get_metrics()
+    check_ms.sort()
+    print(f"alert check per write: median {statistics.median(check_ms):.3f} ms, "
+          f"p99 {check_ms[int(len(check_ms) * 0.99) - 1]:.3f} ms, {counter.count} queries total")
+    print(f"triggered {metrics['published']} alerts, avg queue->handler {metrics['avg_delivery_ms']} ms")
+
+    with timed() as t:
+        PriceHistoryService.bulk_add_price_records(db, [
+            {"product_id": product_id, "retailer": rng.choice(RETAILERS[:retailers]),
+             "price": round(rng.uniform(20, 2000), 2)}
+            for product_id in rng.sample(range(1, products + 1), 1000)
+        ])
+    print(f"bulk write of 1000 prices incl. alert check: {t['seconds'] * 1000:.1f} ms")
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--alerts", type=int, default=100000)
+    parser.add_argument("--retailers", type=int, default=3)
+    parser.add_argument("--writes", type=int, default=500)
+    args = parser.parse_args()
+    run(args.products, args.alerts, args.retailers, args.writes)
@@ -0,0 +1,162 @@
+# async_routes.py - load test for the hot read routes: the old sync handlers (threadpool +
+# blocking session) vs the async handlers in the real app (async session on aiosqlite/asyncpg)
+# each app runs in its own uvicorn process against the same seeded database, and a pool of
+# concurrent clients hits a mix of product / offers / history / listing requests.
+# usage: python -m benchmarks.async_routes [--products 5000] [--concurrency 10,100] [--seconds 10]
+#        [--database-url postgresql://...]   (default: a throwaway sqlite file)
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from random import Random
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Response
+from sqlalchemy.orm import Session
+
+from benchmarks._common import make_session, seed_catalog
+from database import get_db
+from app.routes.products import _product_to_dict
+from app.schemas.price_history import PriceHistorySchema
+from app.schemas.product import ProductSchema
+from app.services.business import ProductService, PriceHistoryService
+from typing import List, Optional
+
+# the same endpoints as sync def handlers, the way they were before the async session
+legacy_app = FastAPI()
+
+
+@legacy_app.get("/health")
+def legacy_health():
+    return {"status": "ok"}
+
+
+@legacy_app.get("/api/products/", response_model=list)
+def legacy_products(response: Response, limit: Optional[int] = None, cursor: Optional[int] = None,
+                    db: Session = Depends(get_db)):
+    products = ProductService.get_products_page(db, limit=limit, after_id=cursor)
+    product_ids = [p.id for p in products] if limit or cursor is not None else None
+    latest = PriceHistoryService.get_current_offers(db, product_ids)
+    if limit and len(products) == limit:
+        response.headers["X-Next-Cursor"] = str(products[-1].id)
+    return [_product_to_dict(product, latest.get(product.id, [])) for product in products]
+
+
+@legacy_app.get("/api/products/{product_id}", response_model=ProductSchema)
+def legacy_product(product_id: int, db: Session = Depends(get_db)):
+    product = ProductService.get_product_by_id(db, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+
+@legacy_app.get("/api/prices/comparison/{product_id}", response_model=List[PriceHistorySchema])
+def legacy_comparison(product_id: int, db: Session = Depends(get_db)):
+    if not ProductService.get_product_by_id(db, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return PriceHistoryService.get_price_comparison(db, product_id)
+
+
+@legacy_app.get("/api/prices/history/{product_id}", response_model=List[PriceHistorySchema])
+def legacy_history(product_id: int, days: int = 30, db: Session = Depends(get_db)):
+    if not ProductService.get_product_by_id(db, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return PriceHistoryService.get_price_history(db, product_id, days)
+
+
+def request_mix(products, rng):
+    product_id = rng.randint(1, products)
+    return rng.choice([
+        f"/api/products/{product_id}",
+        f"/api/prices/comparison/{product_id}",
+        f"/api/prices/history/{product_id}",
+        f"/api/products/?limit=20&cursor={product_id}",
+    ])
+
+
+def start_server(app_path, port, database_url):
+    # query cache off: both apps read the database for every request
+    env = dict(os.environ, DATABASE_URL=database_url, REFRESH_WORKER_ENABLED="false", QUERY_CACHE_ENABLED="false")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning",
+         "--no-access-log"],
+        env=env, stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError(f"{app_path} exited with code {process.returncode}")
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{app_path} did not start")
+
+
+async def load(port, products, concurrency, seconds):
+    """concurrency clients sending requests back to back for `seconds`.
+    Returns (requests/sec, p50 ms, p99 ms, errors)"""
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+        stop_at = time.perf_counter() + seconds
+
+        async def worker(seed):
+            nonlocal errors
+            rng = Random(seed)
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    resp = await client.get(request_mix(products, rng))
+                    if resp.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(latencies) / elapsed, statistics.median(latencies) * 1000, p99 * 1000, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--concurrency", default="10,100")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--database-url", default=None, help="an existing, seeded database (default: new sqlite file)")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        engine, Session = make_session()
+        db = Session()
+        seed_catalog(db, args.products, points=20)
+        db.close()
+        database_url = str(engine.url)
+        engine.dispose()
+    print(f"database: {database_url}, {args.products} products")
+
+    for label, app_path, port in [("sync (threadpool)", "benchmarks.async_routes:legacy_app", 8765),
+                                  ("async", "main:app", 8766)]:
+        server = start_server(app_path, port, database_url)
+        try:
+            asyncio.run(load(port, args.products, 5, 1))  # warm up connections and caches
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                rps, p50, p99, errors = asyncio.run(load(port, args.products, concurrency, args.seconds))
+                print(f"{label:<18} concurrency {concurrency:>4}  {rps:>8.0f} req/s  p50 {p50:>7.1f} ms  "
+                      f"p99 {p99:>7.1f} ms  {errors} errors")
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,93 @@
+# catalog.py - GET /api/products/catalog vs downloading the whole catalog and filtering in the browser
+# reports time, statements and JSON payload per request, walks a few pages deep with the
+# cursor, and prints the sqlite query plan so the composite indexes can be checked.
+# usage: python -m benchmarks.catalog [--sizes 10000,100000] [--pages 20]
+
+import argparse
+import json
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed
+from app.routes.products import _product_to_dict
+from app.schemas.product import CatalogQuerySchema
+from app.services import catalog
+from app.services.business import ProductService, PriceHistoryService
+from app.services.search_index import ensure_search_index
+
+QUERIES = [
+    ("no filters, by id", {}),
+    ("no filters, cheapest first", {"sort": "price"}),
+    ("one category, cheapest first", {"category": ["Phones"], "sort": "price"}),
+    ("category + brand, best rated", {"category": ["Laptops"], "brand": ["Brand5", "Brand10"], "sort": "rating"}),
+    ("retailer, in stock, $100-500", {"retailer": ["Amazon"], "in_stock": True, "min_price": 100, "max_price": 500,
+                                      "sort": "-price"}),
+    ("tag + min rating, discount", {"tags": ["tag3"], "min_rating": 4, "sort": "discount"}),
+    ("search 'product 12', by price", {"q": "product 12", "sort": "price"}),
+]
+
+
+def full_download(db):
+    # what Products.jsx used to fetch before filtering client-side
+    products = ProductService.get_all_products(db)
+    latest = PriceHistoryService.get_current_offers(db)
+    return [_product_to_dict(p, latest.get(p.id, [])) for p in products]
+
+
+def catalog_page(db, params):
+    page = catalog.browse(db, CatalogQuerySchema(**params))
+    latest = PriceHistoryService.get_current_offers(db, [p.id for p in page["products"]])
+    return {"items": [_product_to_dict(p, latest.get(p.id, [])) for p in page["products"]],
+            "total": page["total"], "next_cursor": page["next_cursor"], "facets": page["facets"]}
+
+
+def payload_kb(body):
+    return len(json.dumps(body, default=str)) / 1024
+
+
+def run(size, pages):
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, size, points=1)
+    ensure_search_index(engine)
+    print(f"\n== {size} products x 3 retailers ==")
+
+    db.expunge_all()
+    with QueryCounter(engine) as counter, timed() as t:
+        body = full_download(db)
+    print(f"{'full catalog download':<34} {t['seconds'] * 1000:>8.1f} ms  {counter.count:>3} statements  "
+          f"{payload_kb(body):>9.1f} KB")
+
+    for label, params in QUERIES:
+        db.expunge_all()
+        with QueryCounter(engine) as counter, timed() as t:
+            body = catalog_page(db, params)
+        print(f"{label:<34} {t['seconds'] * 1000:>8.1f} ms  {counter.count:>3} statements  "
+              f"{payload_kb(body):>9.1f} KB  {body['total']:>7} matches")
+
+        # keep paging with the cursor: later pages cost the same as the first
+        seconds, walked = 0.0, 0
+        while body["next_cursor"] and walked < pages:
+            db.expunge_all()
+            with timed() as t:
+                body = catalog_page(db, dict(params, cursor=body["next_cursor"]))
+            seconds += t["seconds"]
+            walked += 1
+        if walked:
+            print(f"{'  next ' + str(walked) + ' pages':<34} {seconds * 1000 / walked:>8.1f} ms/page")
+
+    if engine.dialect.name == "sqlite":
+        stmt = catalog._page_stmt(CatalogQuerySchema(category=["Phones"], sort="price"))
+        compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+        plan = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+        print("plan for 'one category, cheapest first':", "; ".join(row[-1] for row in plan))
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+    for size in [int(s) for s in args.sizes.split(",")]:
+        run(size, args.pages)
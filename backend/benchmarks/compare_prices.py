@@ -0,0 +1,57 @@
+# compare_prices.py - sequential vs concurrent multi-retailer compare against a local mock API
+# usage: python -m benchmarks.compare_prices [--slow-source Walmart --slow-delay 5 --timeout 2]
+
+import argparse
+import asyncio
+
+import httpx
+
+from benchmarks._common import timed
+from benchmarks.mock_retailers import MockRetailers
+from app.services.aggregator import DataAggregationService, SERPAPI_ENGINES
+from app.services.search_cache import search_cache
+from config import settings
+
+
+def sequential(query):
+    # the old shape: one blocking call after another
+    results = {"eBay": DataAggregationService.search_ebay(query, limit=3)}
+    for source in SERPAPI_ENGINES:
+        results[source] = DataAggregationService.search_serpapi(source, query, limit=3)
+    return results
+
+
+async def concurrent(query, timeout):
+    async with httpx.AsyncClient() as client:
+        return await DataAggregationService.compare_prices_async(query, use_serpapi=True, timeout=timeout, client=client)
+
+
+def fresh_run(mock):
+    # both runs go upstream: without this the async run is served from what the sequential one cached
+    search_cache.backend.clear()
+    mock.calls.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slow-source", default=None, help="make one source slower than the others")
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=None, help="per-source timeout for the async run")
+    args = parser.parse_args()
+
+    delays = {args.slow_source: args.slow_delay} if args.slow_source else {}
+    with MockRetailers(delays) as mock:
+        settings.ebay_api_base = mock.url
+        settings.serpapi_base = mock.url
+        settings.serpapi_key = "mock-key"
+        print(f"mock delays (s): {mock.delays}")
+
+        fresh_run(mock)
+        with timed("sequential (sync)"):
+            sequential("iphone")
+        print(f"  upstream calls: {mock.calls}")
+
+        fresh_run(mock)
+        with timed(f"concurrent (async), timeout {args.timeout or settings.compare_source_timeout}s"):
+            result = asyncio.run(concurrent("iphone", args.timeout))
+        print(f"  retailers: {sorted(result['retailers'])}  failed: {result['failed']}  upstream calls: {mock.calls}")
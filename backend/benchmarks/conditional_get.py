@@ -0,0 +1,108 @@
+# conditional_get.py - ETag revalidation on the read routes: what a repeat request costs
+# for each cached route: a first request, a repeat with If-None-Match (must be a bodyless 304
+# that never reaches the handler or response serialization, and runs only the version query),
+# then a price write, after which the old ETag must no longer match.
+# Exits non-zero when any of that doesn't hold, so it doubles as a check.
+# usage: python -m benchmarks.conditional_get [--products 20000] [--repeats 50]
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+directory = tempfile.mkdtemp(prefix="pce-etag-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'etag.db')}"
+os.environ["REFRESH_WORKER_ENABLED"] = "false"
+
+import fastapi.routing
+import httpx
+
+import database
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed
+from app.services.business import PriceHistoryService
+from main import app
+
+ROUTES = [
+    "/api/products/?limit=50",
+    "/api/products/catalog?category=Phones&sort=price",
+    "/api/products/search?q=product",
+    "/api/products/{id}",
+    "/api/products/details?ids={id}&history_days=30",
+    "/api/prices/comparison/{id}",
+    "/api/prices/history/{id}?days=30",
+    "/api/prices/lowest/{id}",
+    "/api/prices/best-deal/{id}",
+]
+
+# count every response model serialization FastAPI does
+serialized = {"count": 0}
+_serialize_response = fastapi.routing.serialize_response
+
+
+async def counting_serialize_response(*args, **kwargs):
+    serialized["count"] += 1
+    return await _serialize_response(*args, **kwargs)
+
+
+fastapi.routing.serialize_response = counting_serialize_response
+
+
+async def timed_get(client, url, repeats, headers=None):
+    serialized["count"] = 0
+    engine = database.get_async_engine().sync_engine
+    with QueryCounter(engine) as counter, timed() as t:
+        for _ in range(repeats):
+            resp = await client.get(url, headers=headers or {})
+    return resp, t["seconds"] * 1000 / repeats, counter.count / repeats, serialized["count"] / repeats
+
+
+async def run(product_id, repeats):
+    failures = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://etag") as client:
+        print(f"{'route':<52} {'200':>9} {'stmts':>5} {'ser':>4}   {'304':>8} {'stmts':>5} {'ser':>4}")
+        for route in ROUTES:
+            url = route.format(id=product_id)
+            full, full_ms, full_statements, full_serialized = await timed_get(client, url, repeats)
+            etag = full.headers.get("etag")
+            cached, cached_ms, cached_statements, cached_serialized = await timed_get(
+                client, url, repeats, {"If-None-Match": etag or ""})
+            print(f"{url:<52} {full_ms:>7.2f}ms {full_statements:>5.1f} {full_serialized:>4.1f}   "
+                  f"{cached_ms:>6.2f}ms {cached_statements:>5.1f} {cached_serialized:>4.1f}")
+            if full.status_code != 200 or not etag:
+                failures.append(f"{url}: expected 200 with an ETag, got {full.status_code}")
+            elif cached.status_code != 304 or cached.content or cached_serialized or cached_statements > 1:
+                failures.append(f"{url}: repeat wasn't a bare 304 ({cached.status_code}, "
+                                f"{cached_serialized} serializations, {cached_statements} statements)")
+
+        # a new price has to change every per-product and list validator
+        etags = {route: (await client.get(route.format(id=product_id))).headers.get("etag") for route in ROUTES}
+        db = database.SessionLocal()
+        PriceHistoryService.add_price_record(db, product_id, "Target", 1.0)
+        db.close()
+        for route in ROUTES:
+            url = route.format(id=product_id)
+            resp = await client.get(url, headers={"If-None-Match": etags[route]})
+            if resp.status_code != 200:
+                failures.append(f"{url}: still {resp.status_code} after a price change")
+        await database.dispose_async_engine()
+
+    for failure in failures:
+        print("FAIL", failure)
+    print("ok" if not failures else f"{len(failures)} failures")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    engine, Session = make_session(os.environ["DATABASE_URL"])
+    db = Session()
+    seed_catalog(db, args.products, points=10)
+    db.close()
+    engine.dispose()
+    ok = asyncio.run(run(args.products // 2, args.repeats))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,123 @@
+# fake_redis.py - local stand-in for a redis server (RESP2, just the commands the caches use)
+# GET, SET (with PX / EX), DEL, SCAN (MATCH), PING, FLUSHDB; CLIENT / SELECT are accepted.
+# Expiry is checked on read. Point settings.query_cache_redis_url at fake.url
+
+import fnmatch
+import socket
+import socketserver
+import threading
+import time
+
+
+class FakeRedis:
+    """Runs the fake server on a background thread: with FakeRedis() as fake: fake.url"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay  # seconds added to every command, a network hop
+        self.data = {}  # key -> (value bytes, expires_at or None)
+        self.calls = {}
+        self.connections = []
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                fake.connections.append(self.request)
+
+            def _read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                if not line.startswith(b"*"):
+                    return line.split()  # inline command
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+            def handle(self):
+                while True:
+                    try:
+                        args = self._read_command()
+                    except (OSError, ValueError):
+                        return
+                    if args is None:
+                        return
+                    if fake.delay:
+                        time.sleep(fake.delay)
+                    self.wfile.write(fake.execute(args))
+                    self.wfile.flush()
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/0"
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, args):
+        command = args[0].decode().upper()
+        with self.lock:
+            self.calls[command] = self.calls.get(command, 0) + 1
+            if command == "GET":
+                entry = self._live(args[1])
+                return _bulk(entry[0] if entry else None)
+            if command == "SET":
+                expires_at = None
+                options = [a.decode().upper() for a in args[3:]]
+                if "PX" in options:
+                    expires_at = time.monotonic() + int(options[options.index("PX") + 1]) / 1000
+                elif "EX" in options:
+                    expires_at = time.monotonic() + int(options[options.index("EX") + 1])
+                self.data[args[1]] = (args[2], expires_at)
+                return b"+OK\r\n"
+            if command == "DEL":
+                removed = sum(self.data.pop(key, None) is not None for key in args[1:])
+                return b":%d\r\n" % removed
+            if command == "SCAN":
+                options = [a.decode() for a in args[2:]]
+                pattern = options[options.index("MATCH") + 1] if "MATCH" in options else "*"
+                keys = [key for key in list(self.data) if self._live(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+                return b"*2\r\n" + _bulk(b"0") + b"*%d\r\n" % len(keys) + b"".join(_bulk(key) for key in keys)
+            if command == "FLUSHDB":
+                self.data.clear()
+                return b"+OK\r\n"
+            if command == "PING":
+                return b"+PONG\r\n"
+            if command in ("CLIENT", "SELECT"):
+                return b"+OK\r\n"
+            return b"-ERR unknown command '%s'\r\n" % command.encode()
+
+    def size(self):
+        with self.lock:
+            return sum(self._live(key) is not None for key in list(self.data))
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        # like a server going away: open connections are cut too
+        self.server.shutdown()
+        self.server.server_close()
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
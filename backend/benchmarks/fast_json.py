@@ -0,0 +1,105 @@
+# fast_json.py - the big list responses with and without settings.fast_json_responses
+# calls the app for the unpaginated product list (10k products), search (200 rows, the max)
+# and one product's raw / hourly price history (10k points), once per mode, and checks both
+# modes answer with the same JSON and headers. Exits non-zero when they don't.
+# usage: python -m benchmarks.fast_json [--products 10000] [--points 10000]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+directory = tempfile.mkdtemp(prefix="pce-json-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'json.db')}"
+os.environ["REFRESH_WORKER_ENABLED"] = "false"
+
+import httpx
+from sqlalchemy import insert
+
+import database
+from benchmarks._common import make_session, seed_catalog, timed, RETAILERS
+from app.models.price_history import PriceHistory
+from app.services import fast_json
+from config import settings
+from main import app
+
+HEADERS = ["etag", "cache-control", "last-modified", "x-next-cursor", "content-type"]
+
+
+def seed_history(db, product_id, points):
+    # one product with `points` prices spread over the last 29 days
+    start = datetime.utcnow() - timedelta(days=29)
+    step = timedelta(days=29) / points
+    db.execute(insert(PriceHistory), [
+        {"product_id": product_id, "retailer": RETAILERS[i % len(RETAILERS)], "price": 100 + (i % 37) * 0.5,
+         "original_price": 120.0, "discount_percent": 10.0, "in_stock": "in_stock", "created_at": start + step * i}
+        for i in range(points)
+    ])
+    db.commit()
+
+
+async def measure(client, url, repeats):
+    with timed() as t:
+        for _ in range(repeats):
+            resp = await client.get(url)
+    return resp, t["seconds"] * 1000 / repeats
+
+
+async def run(urls, repeats):
+    failures = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://json") as client:
+        print(f"{'route':<42} {'rows':>6} {'KB':>7} {'pydantic':>10} {'fast':>9} {'speedup':>8}")
+        for url in urls:
+            settings.fast_json_responses = False
+            await client.get(url)  # warm up
+            slow, slow_ms = await measure(client, url, repeats)
+            settings.fast_json_responses = True
+            await client.get(url)
+            fast, fast_ms = await measure(client, url, repeats)
+            rows = len(slow.json())
+            print(f"{url:<42} {rows:>6} {len(slow.content) / 1024:>7.0f} {slow_ms:>8.1f}ms {fast_ms:>7.1f}ms "
+                  f"{slow_ms / fast_ms:>7.1f}x")
+            if slow.status_code != 200 or fast.status_code != 200:
+                failures.append(f"{url}: status {slow.status_code} / {fast.status_code}")
+            if json.loads(slow.content) != json.loads(fast.content):
+                failures.append(f"{url}: the fast path answered with different JSON")
+            elif slow.content != fast.content:
+                print(f"  (same JSON, different bytes - number formatting)")
+            for header in HEADERS:
+                if slow.headers.get(header) != fast.headers.get(header):
+                    failures.append(f"{url}: {header} {slow.headers.get(header)!r} vs {fast.headers.get(header)!r}")
+        await database.dispose_async_engine()
+
+    for failure in failures:
+        print("FAIL", failure)
+    print("ok" if not failures else f"{len(failures)} failures")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    engine, Session = make_session(os.environ["DATABASE_URL"])
+    db = Session()
+    seed_catalog(db, args.products, points=2)
+    seed_history(db, 1, args.points)
+    db.close()
+    engine.dispose()
+
+    print(f"orjson: {fast_json.ORJSON_AVAILABLE}")
+    urls = [
+        "/api/products/",
+        "/api/products/?limit=500&cursor=100",
+        "/api/products/search?q=bench&limit=200",
+        f"/api/prices/history/1?days=30",
+        f"/api/prices/history/1?days=30&resolution=hour",
+    ]
+    ok = asyncio.run(run(urls, args.repeats))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,98 @@
+# history_compaction.py - table size and history query cost before/after compaction
+# usage: python -m benchmarks.history_compaction [--products 200] [--days 400] [--every-hours 6]
+
+import argparse
+from datetime import datetime, timedelta
+from random import Random
+
+from sqlalchemy import insert, func
+
+from benchmarks._common import make_session, QueryCounter, timed, RETAILERS
+from app.models.product import Product
+from app.models.price_history import PriceHistory
+from app.models.price_bucket import PriceBucket
+from app.models.current_offer import CurrentOffer
+from app.services import compaction
+from app.services.business import PriceHistoryService
+
+
+def seed_history(db, products, days, every_hours, retailers=2, seed=11):
+    rng = Random(seed)
+    now = datetime.utcnow()
+    db.execute(insert(Product), [{"name": f"Long lived {i}", "description": "", "category": "Laptops",
+                                  "created_at": now, "updated_at": now} for i in range(1, products + 1)])
+    steps = days * 24 // every_hours
+    rows = []
+    for product_id in range(1, products + 1):
+        for retailer in RETAILERS[:retailers]:
+            price = rng.uniform(100, 1500)
+            for step in range(steps, -1, -1):
+                price = round(price * rng.uniform(0.97, 1.03), 2)
+                rows.append({"product_id": product_id, "retailer": retailer, "price": price,
+                             "discount_percent": 0, "in_stock": "in_stock",
+                             "created_at": now - timedelta(hours=step * every_hours)})
+            if len(rows) >= 50000:
+                db.execute(insert(PriceHistory), rows)
+                rows = []
+    if rows:
+        db.execute(insert(PriceHistory), rows)
+    db.commit()
+    PriceHistoryService.rebuild_current_offers(db)
+
+
+def history_query(db, resolution, days):
+    if resolution == "raw":
+        return PriceHistoryService.get_price_history(db, 1, days)
+    return PriceHistoryService.get_price_history_buckets(db, 1, days, resolution)
+
+
+def run(products, days, every_hours):
+    engine, Session = make_session()
+    db = Session()
+    seed_history(db, products, days, every_hours)
+    print(f"\n== {products} products x 2 retailers, a price every {every_hours}h for {days} days ==")
+
+    before = db.query(func.count(PriceHistory.id)).scalar()
+    totals = db.query(func.min(PriceHistory.price), func.max(PriceHistory.price)).filter(
+        PriceHistory.product_id == 1).one()
+    offers = dict(db.query(CurrentOffer.retailer, CurrentOffer.price_history_id).filter(
+        CurrentOffer.product_id == 1).all())
+    for resolution in ("raw", "day"):
+        db.expunge_all()
+        with QueryCounter(engine) as counter, timed() as t:
+            points = history_query(db, resolution, 365)
+        print(f"history 365d {resolution:<4} before: {len(points):>6} points {t['seconds'] * 1000:>8.1f} ms")
+
+    with timed() as t:
+        stats = compaction.compact(db)
+    print(f"compaction: {stats} in {t['seconds']:.1f}s")
+
+    after = db.query(func.count(PriceHistory.id)).scalar()
+    buckets = db.query(PriceBucket.resolution, func.count(PriceBucket.id)).group_by(PriceBucket.resolution).all()
+    print(f"price_histories rows: {before} -> {after}, buckets: {dict(buckets)}")
+
+    for resolution in ("raw", "hour", "day"):
+        db.expunge_all()
+        with timed() as t:
+            points = history_query(db, resolution, 365)
+        print(f"history 365d {resolution:<4} after:  {len(points):>6} points {t['seconds'] * 1000:>8.1f} ms")
+
+    # nothing lost: every sample is still counted, extremes survive, current offers untouched
+    day = history_query(db, "day", days + 1)
+    assert sum(b["samples"] for b in day) == (before // products), "samples lost"
+    assert min(b["low"] for b in day) == totals[0] and max(b["high"] for b in day) == totals[1]
+    for retailer, history_id in offers.items():
+        assert db.get(PriceHistory, history_id) is not None, f"current offer row for {retailer} was compacted"
+    print("samples, extremes and current offers preserved")
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--days", type=int, default=400)
+    parser.add_argument("--every-hours", type=int, default=6)
+    args = parser.parse_args()
+    run(args.products, args.days, args.every_hours)
@@ -0,0 +1,48 @@
+# http_pool.py - one-off httpx calls vs the shared pooled client, against the local mock API
+# usage: python -m benchmarks.http_pool [--requests 50]
+
+import argparse
+import asyncio
+
+import httpx
+
+from benchmarks._common import timed
+from benchmarks.mock_retailers import MockRetailers
+from app.services import http_client
+
+
+async def async_bursts(url, count, bursts=3):
+    # the first burst grows the pool, later ones reuse the kept-alive connections
+    client = http_client.get_async_client()
+    for _ in range(bursts):
+        await asyncio.gather(*[client.get(url) for _ in range(count)])
+    await http_client.aclose_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with MockRetailers({"eBay": 0.0}) as mock:
+        url = f"{mock.url}/buy/browse/v1/item_summary/search?q=pool"
+
+        before = mock.connections
+        with timed() as t:
+            for _ in range(args.requests):
+                httpx.get(url)
+        print(f"httpx.get per call      {t['seconds'] * 1000:>8.1f} ms  {mock.connections - before:>4} connections opened")
+
+        before = mock.connections
+        with timed() as t:
+            for _ in range(args.requests):
+                http_client.get_client().get(url)
+        print(f"shared sync client      {t['seconds'] * 1000:>8.1f} ms  {mock.connections - before:>4} connections opened")
+
+        before = mock.connections
+        with timed() as t:
+            asyncio.run(async_bursts(url, args.requests))
+        print(f"shared async (3 bursts) {t['seconds'] * 1000:>8.1f} ms  {mock.connections - before:>4} connections opened")
+
+        print(f"client metrics: {http_client.get_metrics()}")
+        http_client.close_client()
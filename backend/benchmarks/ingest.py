@@ -0,0 +1,58 @@
+# ingest.py - rows/sec for per-row create_product/add_price_record vs the bulk service methods
+# usage: python -m benchmarks.ingest [--products 5000] [--prices-per-product 3] [--batch-size 1000]
+
+import argparse
+
+from benchmarks._common import make_session, QueryCounter, timed, RETAILERS, CATEGORIES
+from app.services.business import ProductService, PriceHistoryService
+
+
+def make_feed(count, prices_per_product):
+    return [
+        (
+            dict(name=f"Feed Product {i}", description=f"Imported product {i}",
+                 category=CATEGORIES[i % len(CATEGORIES)], brand=f"Brand{i % 50}"),
+            [dict(retailer=RETAILERS[j], price=10.0 + i % 500 + j, original_price=20.0 + i % 500)
+             for j in range(prices_per_product)]
+        )
+        for i in range(count)
+    ]
+
+
+def per_row(db, feed, batch_size):
+    for product, prices in feed:
+        created = ProductService.create_product(db, **product)
+        for price in prices:
+            PriceHistoryService.add_price_record(db, product_id=created.id, **price)
+
+
+def bulk(db, feed, batch_size):
+    for i in range(0, len(feed), batch_size):
+        chunk = feed[i:i + batch_size]
+        ids = ProductService.bulk_create_products(db, [p for p, _ in chunk], batch_size=batch_size)
+        PriceHistoryService.bulk_add_price_records(db, [
+            dict(price, product_id=product_id)
+            for (_, prices), product_id in zip(chunk, ids)
+            for price in prices
+        ], batch_size=batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--prices-per-product", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    feed = make_feed(args.products, args.prices_per_product)
+    total_rows = args.products * (1 + args.prices_per_product)
+    print(f"{args.products} products + {args.products * args.prices_per_product} prices = {total_rows} rows")
+
+    for label, fn in [("per-row commit", per_row), (f"bulk (batch {args.batch_size})", bulk)]:
+        engine, Session = make_session()
+        db = Session()
+        with QueryCounter(engine) as counter, timed() as t:
+            fn(db, feed, args.batch_size)
+        print(f"{label:<22} {t['seconds']:>8.2f} s  {total_rows / t['seconds']:>10.0f} rows/sec  {counter.count:>7} statements")
+        db.close()
+        engine.dispose()
@@ -0,0 +1,67 @@
+# listing_refetch.py - what re-fetching the same search results costs in rows and time
+# the first round saves eBay-shaped items through save_items, every later round re-fetches
+# the same listings with a few prices changed. Known listings skip matching and product
+# creation, and only changed prices become price_histories rows.
+# usage: python -m benchmarks.listing_refetch [--listings 5000] [--rounds 5] [--changed 0.05]
+
+import argparse
+from random import Random
+
+from benchmarks._common import make_session, QueryCounter, timed
+from app.models.product import Product
+from app.models.price_history import PriceHistory
+from app.models.product_listing import ProductListing
+from app.services.aggregator import DataAggregationService
+from app.services.matching import matcher
+
+PAGE = 50  # items per search response
+
+
+def make_items(count, rng):
+    return [
+        {
+            "itemId": f"v1|{100000000 + i}|0",
+            "title": f"Acme Gadget AG{i:05d} {rng.choice(['Black', 'Silver', 'Blue'])}",
+            "price": {"value": f"{rng.uniform(20, 500):.2f}", "currency": "USD"},
+            "itemWebUrl": f"https://www.ebay.com/itm/{100000000 + i}",
+            "condition": "New",
+        }
+        for i in range(count)
+    ]
+
+
+def fetch_round(db, items, round_no):
+    # tracking params differ on every fetch, the listing id doesn't
+    for start in range(0, len(items), PAGE):
+        page = [dict(item, itemWebUrl=f"{item['itemWebUrl']}?hash=r{round_no}") for item in items[start:start + PAGE]]
+        DataAggregationService.save_ebay_items(db, page)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--changed", type=float, default=0.05, help="share of prices changed per re-fetch")
+    args = parser.parse_args()
+
+    rng = Random(7)
+    items = make_items(args.listings, rng)
+    engine, Session = make_session()
+    db = Session()
+    matcher.clear()
+
+    for round_no in range(args.rounds + 1):
+        if round_no:
+            for item in rng.sample(items, int(len(items) * args.changed)):
+                item["price"] = dict(item["price"], value=f"{float(item['price']['value']) * 0.95:.2f}")
+        with QueryCounter(engine) as counter, timed() as t:
+            fetch_round(db, items, round_no)
+        label = "first fetch" if not round_no else f"re-fetch {round_no}"
+        print(f"{label:<12} {t['seconds']:>6.2f} s  {counter.count:>6} statements  "
+              f"products {db.query(Product).count():>6}  listings {db.query(ProductListing).count():>6}  "
+              f"price rows {db.query(PriceHistory).count():>7}")
+
+    append_only = args.listings * (args.rounds + 1)
+    print(f"append-only ingestion would hold {append_only} products and {append_only} price rows")
+    db.close()
+    engine.dispose()
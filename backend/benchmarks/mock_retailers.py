@@ -0,0 +1,99 @@
+# mock_retailers.py - local stand-in for the eBay and SerpAPI endpoints
+# answers the same paths as the real APIs after a configurable delay per source,
+# point settings.ebay_api_base / settings.serpapi_base at it
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# seconds to wait before answering, per source
+DEFAULT_DELAYS = {"eBay": 0.4, "Amazon": 0.6, "Walmart": 0.3, "Google Shopping": 0.5}
+
+ENGINE_SOURCES = {"amazon": "Amazon", "walmart": "Walmart", "google_shopping": "Google Shopping"}
+
+
+def _items(source, query, count=3):
+    if source == "eBay":
+        return {"itemSummaries": [
+            {"itemId": f"v1|{i}|0", "title": f"{query} listing {i}", "price": {"value": str(100 + i), "currency": "USD"},
+             "itemWebUrl": f"https://ebay.example/{i}", "image": {"imageUrl": ""}}
+            for i in range(count)
+        ]}
+    if source == "Google Shopping":
+        return {"shopping_results": [
+            {"title": f"{query} result {i}", "extracted_price": 95.0 + i, "product_link": f"https://shop.example/{i}"}
+            for i in range(count)
+        ]}
+    if source == "Walmart":
+        return {"organic_results": [
+            {"title": f"{query} item {i}", "primary_offer": {"offer_price": 97.0 + i},
+             "product_page_url": f"https://walmart.example/{i}", "us_item_id": str(1000 + i)}
+            for i in range(count)
+        ]}
+    return {"organic_results": [
+        {"title": f"{query} item {i}", "price": f"${99 + i}.99", "link": f"https://amazon.example/{i}", "asin": f"B00{i}"}
+        for i in range(count)
+    ]}
+
+
+class MockRetailers:
+    """Runs the mock API on a background thread: with MockRetailers() as mock: mock.url"""
+
+    def __init__(self, delays: dict = None):
+        self.delays = dict(DEFAULT_DELAYS, **(delays or {}))
+        self.calls = {}
+        self.connections = 0
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible
+
+            def setup(self):
+                super().setup()
+                # headers and body go out as separate writes, don't let Nagle delay the body
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                mock.connections += 1
+
+            def _reply(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                self._reply({"access_token": "mock-token", "expires_in": 7200})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                if url.path.endswith("/item_summary/search"):
+                    source, query = "eBay", params.get("q", [""])[0]
+                else:
+                    engine = params.get("engine", ["amazon"])[0]
+                    source = ENGINE_SOURCES.get(engine, "Amazon")
+                    query = (params.get("k") or params.get("query") or params.get("q") or [""])[0]
+                mock.calls[source] = mock.calls.get(source, 0) + 1
+                time.sleep(mock.delays.get(source, 0))
+                self._reply(_items(source, query))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,61 @@
+# price_analytics.py - per-product stats: python loop over ORM rows vs columnar numpy batch
+# usage: python -m benchmarks.price_analytics [--products 5000] [--points 30] [--batch 2000]
+
+import argparse
+import statistics
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed
+from app.services import analytics
+from app.services.business import PriceHistoryService
+
+
+def legacy_stats(db, product_ids, days):
+    # what a client had to do before: pull /history per product and loop over the rows
+    result = {}
+    for product_id in product_ids:
+        by_retailer = {}
+        for row in PriceHistoryService.get_price_history(db, product_id, days):
+            by_retailer.setdefault(row.retailer, []).append(row.price)
+        result[product_id] = {
+            retailer: {"min": min(p), "max": max(p), "mean": statistics.fmean(p),
+                       "median": statistics.median(p), "std": statistics.pstdev(p)}
+            for retailer, p in by_retailer.items()
+        }
+    return result
+
+
+def run(products, points, batch):
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, products, points=points)
+    product_ids = list(range(1, batch + 1))
+    print(f"\n== {products} products x 3 retailers x {points} points, stats for {batch} products ==")
+
+    for label, fn in [("legacy loop", lambda: legacy_stats(db, product_ids, 30)),
+                      ("numpy batch", lambda: analytics.price_stats(db, product_ids, 30, 7))]:
+        db.expunge_all()
+        with QueryCounter(engine) as counter, timed() as t:
+            result = fn()
+        print(f"{label:<14} {len(result):>6} products {counter.count:>6} queries {t['seconds'] * 1000:>9.1f} ms")
+
+    # both agree on the basics
+    legacy = legacy_stats(db, product_ids[:50], 30)
+    fast = analytics.price_stats(db, product_ids[:50], 30, 7)
+    for product_id, retailers in legacy.items():
+        for retailer, expected in retailers.items():
+            got = fast[product_id]["retailers"][retailer]
+            for key in ("min", "max", "mean", "median", "std"):
+                assert abs(got[key] - expected[key]) < 0.01, (product_id, retailer, key)
+    print("numpy results match the python loop")
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--points", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.products, args.points, args.batch)
@@ -0,0 +1,72 @@
+# product_details.py - the product page: one request per widget vs GET /api/products/details
+# the per-widget path replays what the five old requests ran (each looks the product up
+# again, three of them re-read the comparison); the composite path shares one query per table.
+# usage: python -m benchmarks.product_details [--products 10000] [--points 20] [--batch 20]
+
+import argparse
+from random import Random
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed
+from app.services.business import ProductService, PriceHistoryService
+from app.services.query_cache import query_cache
+
+
+def per_widget(db, product_id, days):
+    # /products/{id}, /prices/comparison, /history, /lowest, /best-deal - separate requests,
+    # so separate sessions: nothing carries over in the identity map
+    requests = [
+        lambda: None,
+        lambda: PriceHistoryService.get_price_comparison(db, product_id),
+        lambda: PriceHistoryService.get_price_history(db, product_id, days),
+        lambda: PriceHistoryService.get_lowest_price(db, product_id),
+        lambda: PriceHistoryService.get_best_deal(db, product_id),
+    ]
+    for request in requests:
+        db.expunge_all()
+        ProductService.get_product_by_id(db, product_id)
+        request()
+
+
+def measure(engine, db, label, fn, repeats):
+    with QueryCounter(engine) as counter, timed() as t:
+        for _ in range(repeats):
+            db.expunge_all()  # a new request starts with an empty session
+            fn()
+    print(f"{label:<40} {t['seconds'] * 1000 / repeats:>8.2f} ms  {counter.count / repeats:>6.1f} queries  per call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--points", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    # both shapes are measured against the database: with the query cache on, the repeated
+    # lookups of the per-widget path would be answered from memory
+    query_cache.enabled = False
+    query_cache.clear()
+
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, args.products, points=args.points)
+    rng = Random(3)
+    ids = [rng.randint(1, args.products) for _ in range(args.repeats)]
+    print(f"{args.products} products x 3 retailers x {args.points} points")
+
+    it = iter(ids * 2)
+    measure(engine, db, "per widget (5 requests), 1 product", lambda: per_widget(db, next(it), 30), args.repeats)
+    it = iter(ids * 2)
+    measure(engine, db, "details, 1 product", lambda: ProductService.get_product_details(db, [next(it)], 30),
+            args.repeats)
+    batch = sorted(set(rng.randint(1, args.products) for _ in range(args.batch)))
+    measure(engine, db, f"per widget, {len(batch)} products",
+            lambda: [per_widget(db, product_id, 30) for product_id in batch], 5)
+    measure(engine, db, f"details, {len(batch)} products in one call",
+            lambda: ProductService.get_product_details(db, batch, 30), 5)
+    measure(engine, db, f"details, {len(batch)} products, hourly history",
+            lambda: ProductService.get_product_details(db, batch, 30, "hour"), 5)
+
+    db.close()
+    engine.dispose()
@@ -0,0 +1,143 @@
+# product_matching.py - listing -> canonical product matching: quality, speed, rows saved
+# usage: python -m benchmarks.product_matching [--items 2000] [--listings-per-item 5] [--filler 50000]
+
+import argparse
+from itertools import combinations
+from random import Random
+
+from benchmarks._common import make_session, timed
+from app.models.product import Product
+from app.models.price_history import PriceHistory
+from app.services.aggregator import DataAggregationService
+from app.services.matching import ProductMatcher, Fingerprint, matcher, score
+
+LINES = [
+    ("Apple", "iPhone {g}{e}", ["13", "14", "15", "16"], ["128GB", "256GB", "512GB"], ["", " Pro", " Pro Max", " Plus"]),
+    ("Samsung", "Galaxy S{g}{e}", ["22", "23", "24"], ["128GB", "256GB"], ["", "+", " Ultra"]),
+    ("Google", "Pixel {g}{e}", ["7", "8", "9"], ["128GB", "256GB"], ["", " Pro", "a"]),
+    ("Lenovo", "ThinkPad X1 Carbon Gen {g}{e}", ["9", "10", "11", "12"], ["512GB", "1TB"], ["", " i7"]),
+    ("Apple", "MacBook Air 13 M{g}{e}", ["1", "2", "3"], ["256GB", "512GB"], [""]),
+    ("Dell", "XPS {g}{e}", ["13", "14", "15", "17"], ["512GB", "1TB"], ["", " OLED"]),
+]
+SONY_MODELS = ["WH-1000XM4", "WH-1000XM5", "WF-1000XM4", "WF-1000XM5", "WH-CH720N", "WH-XB910N"]
+COLORS = ["Black", "Silver", "Blue", "Midnight", "Graphite", "White"]
+NOISE = ["Brand New", "Unlocked", "Free Shipping", "(Renewed)", "- Excellent Condition", "Sealed", "US Version"]
+RETAILERS = ["eBay", "Amazon", "Walmart", "Google Shopping"]
+
+
+def make_items(rng, count):
+    items = []
+    for brand, line, generations, capacities, editions in LINES:
+        for generation in generations:
+            for capacity in capacities:
+                for edition in editions:
+                    items.append({"brand": brand, "core": line.format(g=generation, e=edition), "capacity": capacity})
+    for model in SONY_MODELS:
+        items.append({"brand": "Sony", "core": model, "capacity": ""})
+    rng.shuffle(items)
+    return items[:count]
+
+
+def make_listing(rng, item):
+    # different retailers word the same item differently
+    capacity = item["capacity"]
+    if capacity and rng.random() < 0.5:
+        capacity = capacity.replace("GB", " GB").replace("TB", " TB")
+    parts = [item["core"], capacity, rng.choice(COLORS)]
+    if rng.random() < 0.7:
+        parts.insert(0, item["brand"] if rng.random() < 0.5 else item["brand"].upper())
+    if rng.random() < 0.6:
+        parts.append(rng.choice(NOISE))
+    title = " ".join(p for p in parts if p)
+    if rng.random() < 0.3:
+        title = title.replace(" ", ", ", 1)
+    return title
+
+
+WORDS = ["wireless", "portable", "smart", "mini", "gaming", "charger", "cable", "stand", "case", "hub",
+         "keyboard", "mouse", "router", "drive", "speaker", "lamp", "adapter", "dock", "tripod", "light"]
+MAKERS = ["Anker", "Logitech", "Belkin", "TP-Link", "Razer", "Corsair", "UGREEN", "Baseus", "Netgear"]
+
+
+def make_filler(rng, count):
+    # unrelated catalog products the matcher has to search past
+    return [f"{rng.choice(MAKERS)} {' '.join(rng.sample(WORDS, 3))} {rng.choice('ABCDEFGH')}{rng.randint(100, 9999)}"
+            for _ in range(count)]
+
+
+def pairs(groups):
+    result = set()
+    for members in groups.values():
+        result.update(combinations(sorted(members), 2))
+    return result
+
+
+def run(items, per_item, filler):
+    rng = Random(5)
+    catalog = make_items(rng, items)
+    listings = []
+    for truth, item in enumerate(catalog):
+        for _ in range(rng.randint(2, per_item * 2 - 2)):
+            listings.append((make_listing(rng, item), truth))
+    rng.shuffle(listings)
+    print(f"\n== {len(catalog)} real products, {len(listings)} listings, {filler} other products indexed ==")
+
+    fingerprints = [Fingerprint(title) for title, _ in listings]
+    truth_groups = {}
+    for i, (_, truth) in enumerate(listings):
+        truth_groups.setdefault(truth, []).append(i)
+
+    index = ProductMatcher()
+    for i, title in enumerate(make_filler(rng, filler)):
+        index.add(("filler", i), Fingerprint(title))
+    with timed() as t:
+        found = {}
+        for i, fingerprint in enumerate(fingerprints):
+            key, _ = index.find(fingerprint)
+            if key is None:
+                index.add(i, fingerprint)
+                key = i
+            found.setdefault(key, []).append(i)
+    metrics = index.get_metrics()
+    brute_force = len(listings) * (filler + len(found) // 2)
+    print(f"LSH matching: {t['seconds'] * 1000:.0f} ms, {metrics['candidates_scored']} candidate scores "
+          f"(brute force: {brute_force})")
+
+    expected, got = pairs(truth_groups), pairs(found)
+    precision = len(expected & got) / len(got) if got else 1.0
+    recall = len(expected & got) / len(expected) if expected else 1.0
+    print(f"clusters: {len(found)} (truth {len(truth_groups)}), pair precision {precision:.3f}, recall {recall:.3f}")
+
+    sample = fingerprints[:300]
+    with timed() as t:
+        for a, b in combinations(sample, 2):
+            score(a, b)
+    per_pair = t["seconds"] / (len(sample) * (len(sample) - 1) / 2)
+    print(f"brute force estimate for the same run: {per_pair * brute_force:.1f} s")
+
+    # what lands in the database through the save path
+    engine, Session = make_session()
+    db = Session()
+    parsed = [
+        ({"name": title, "description": "", "category": "x"},
+         {"retailer": RETAILERS[i % len(RETAILERS)], "price": 100.0 + i % 50, "original_price": None,
+          "url": "", "in_stock": "in_stock"})
+        for i, (title, _) in enumerate(listings)
+    ]
+    matcher.clear()
+    with timed() as t:
+        for start in range(0, len(parsed), 20):  # search results arrive in small batches
+            DataAggregationService.save_items(db, parsed[start:start + 20])
+    print(f"save path: {len(listings)} listings -> {db.query(Product).count()} products, "
+          f"{db.query(PriceHistory).count()} price rows in {t['seconds']:.1f}s")
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--listings-per-item", type=int, default=5)
+    parser.add_argument("--filler", type=int, default=50000)
+    args = parser.parse_args()
+    run(args.items, args.listings_per_item, args.filler)
@@ -0,0 +1,61 @@
+# product_search.py - ILIKE '%term%' scan vs the full-text index for ProductService.search_products
+# usage: python -m benchmarks.product_search [--products 100000] [--limit 20]
+
+import argparse
+from datetime import datetime
+from random import Random
+
+from sqlalchemy import insert
+
+from benchmarks._common import make_session, timed
+from app.models.product import Product
+from app.services import search_index
+from app.services.business import ProductService
+
+BRANDS = ["Samsung", "Apple", "Sony", "Dell", "Lenovo", "Bose", "Canon", "LG", "Asus", "Garmin"]
+NOUNS = ["Phone", "Laptop", "Headphones", "Monitor", "Camera", "Tablet", "Smartwatch", "Speaker", "Router", "Keyboard"]
+ADJECTIVES = ["Pro", "Ultra", "Mini", "Max", "Plus", "Lite", "Wireless", "Gaming", "Portable", "Refurbished"]
+QUERIES = ["samsung phone", "sony wireless headphones", "gam", "canon camera pro", "zzzz"]
+
+
+def seed(db, count, rng):
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        brand, noun = rng.choice(BRANDS), rng.choice(NOUNS)
+        name = f"{brand} {rng.choice(ADJECTIVES)} {noun} {rng.randint(100, 9999)}"
+        rows.append(dict(name=name, description=f"{name} - {rng.choice(ADJECTIVES).lower()} {noun.lower()} by {brand}",
+                         category=noun, brand=brand, created_at=now, updated_at=now))
+    db.execute(insert(Product), rows)
+    db.commit()
+
+
+def ilike_search(db, query, limit):
+    # force the old path
+    available, search_index._available[db.get_bind()] = search_index._available.get(db.get_bind()), False
+    try:
+        return ProductService.search_products(db, query, limit=limit)
+    finally:
+        search_index._available[db.get_bind()] = available
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=20, help="0 = every match")
+    args = parser.parse_args()
+
+    engine, Session = make_session()
+    search_index.ensure_search_index(engine)
+    db = Session()
+    seed(db, args.products, Random(7))
+    print(f"{args.products} products, " + (f"top {args.limit} results per query" if args.limit else "every match"))
+
+    for query in QUERIES:
+        with timed() as slow:
+            old = ilike_search(db, query, args.limit or None)
+        with timed() as fast:
+            new = ProductService.search_products(db, query, limit=args.limit or None)
+        print(f"{query!r:<28} ILIKE {slow['seconds'] * 1000:>8.1f} ms ({len(old):>3} rows)   "
+              f"full-text {fast['seconds'] * 1000:>7.1f} ms ({len(new):>3} rows)"
+              + (f"   top: {new[0].name}" if new else ""))
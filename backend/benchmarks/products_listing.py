@@ -0,0 +1,72 @@
+# products_listing.py - GET /api/products/: N+1 vs windowed latest-offer query vs current_offers
+# usage: python -m benchmarks.products_listing [--sizes 1000,10000,100000] [--points 5]
+
+import argparse
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed
+from app.models.price_history import PriceHistory
+from app.routes.products import _product_to_dict
+from app.services.business import ProductService, PriceHistoryService
+
+
+def legacy_listing(db):
+    # the old N+1 version: one full history scan per product
+    result = []
+    for product in ProductService.get_all_products(db):
+        price_entries = db.query(PriceHistory).filter(
+            PriceHistory.product_id == product.id
+        ).order_by(PriceHistory.created_at.desc()).all()
+        prices_by_retailer = {}
+        for price in price_entries:
+            if price.retailer not in prices_by_retailer:
+                prices_by_retailer[price.retailer] = price
+        result.append(_product_to_dict(product, prices_by_retailer.values()))
+    return result
+
+
+def windowed_listing(db, limit=None, cursor=None):
+    products = ProductService.get_products_page(db, limit=limit, after_id=cursor)
+    product_ids = [p.id for p in products] if limit or cursor is not None else None
+    latest = PriceHistoryService.get_latest_prices_for_products(db, product_ids)
+    return [_product_to_dict(p, latest.get(p.id, [])) for p in products]
+
+
+def current_offers_listing(db, limit=None, cursor=None):
+    products = ProductService.get_products_page(db, limit=limit, after_id=cursor)
+    product_ids = [p.id for p in products] if limit or cursor is not None else None
+    latest = PriceHistoryService.get_current_offers(db, product_ids)
+    return [_product_to_dict(p, latest.get(p.id, [])) for p in products]
+
+
+def run(size, points, page_size, skip_legacy_above):
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, size, points=points)
+    print(f"\n== {size} products x 3 retailers x {points} points ==")
+
+    runs = [("windowed (all)", lambda: windowed_listing(db)),
+            (f"windowed (page of {page_size})", lambda: windowed_listing(db, limit=page_size, cursor=size // 2)),
+            ("current_offers (all)", lambda: current_offers_listing(db)),
+            (f"current_offers (page of {page_size})", lambda: current_offers_listing(db, limit=page_size, cursor=size // 2))]
+    if size <= skip_legacy_above:
+        runs.insert(0, ("legacy N+1", lambda: legacy_listing(db)))
+
+    for label, fn in runs:
+        db.expunge_all()
+        with QueryCounter(engine) as counter, timed() as t:
+            rows = fn()
+        print(f"{label:<34} {len(rows):>7} rows  {counter.count:>7} queries  {t['seconds'] * 1000:>10.1f} ms")
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--points", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--skip-legacy-above", type=int, default=100000)
+    args = parser.parse_args()
+    for size in [int(s) for s in args.sizes.split(",")]:
+        run(size, args.points, args.page_size, args.skip_legacy_above)
@@ -0,0 +1,139 @@
+# query_cache.py - read-through cache for get_product_by_id / get_price_comparison
+# replays what the /api/prices/comparison, /lowest and /best-deal routes call (each looks the
+# product up, then reads the offers) for a skewed stream of product ids, with the cache off,
+# local tier only, and local + shared tier (FakeRedis). Then checks what the cache must keep
+# right: writes invalidate both tiers, a second process fills from the shared tier, and a
+# dead redis only means misses. Exits non-zero when a check fails.
+# usage: python -m benchmarks.query_cache [--products 20000] [--requests 5000]
+
+import argparse
+import asyncio
+import sys
+from itertools import accumulate
+from random import Random
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed
+from benchmarks.fake_redis import FakeRedis
+from app.services import business
+from app.services.business import ProductService, PriceHistoryService
+from app.services.query_cache import QueryCache, RedisTier
+from app.services.search_cache import MemoryBackend
+
+
+def product_routes(db, product_id):
+    # comparison, lowest, best-deal: three requests, three sessions
+    for service in (PriceHistoryService.get_price_comparison, PriceHistoryService.get_lowest_price,
+                    PriceHistoryService.get_best_deal):
+        db.expunge_all()
+        if ProductService.get_product_by_id(db, product_id):
+            service(db, product_id)
+
+
+def run(engine, db, label, cache, ids):
+    business.query_cache = cache
+    with QueryCounter(engine) as counter, timed() as t:
+        for product_id in ids:
+            product_routes(db, product_id)
+    metrics = cache.get_metrics()
+    print(f"{label:<28} {t['seconds'] * 1000 / len(ids):>7.3f} ms  {counter.count / len(ids):>5.2f} queries"
+          f"  per product view   hit ratio {metrics['hit_ratio']:.3f}  evictions {metrics['evictions']}")
+
+
+def new_cache(max_entries, shared=None, enabled=True):
+    return QueryCache(MemoryBackend(max_entries), 30.0, shared, 300.0, enabled=enabled)
+
+
+async def async_reads(url, product_id):
+    engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    async with AsyncSession(engine) as db:
+        product = await ProductService.get_product_by_id_async(db, product_id)
+        offers = await PriceHistoryService.get_price_comparison_async(db, product_id)
+    await business.query_cache.aclose()
+    await engine.dispose()
+    return product, offers
+
+
+def check(failures, ok, message):
+    print(("ok   " if ok else "FAIL ") + message)
+    if not ok:
+        failures.append(message)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--max-entries", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, args.products, points=10)
+
+    # zipf-ish: a few products get most of the views
+    rng = Random(5)
+    cum_weights = list(accumulate(1 / rank for rank in range(1, args.products + 1)))
+    ids = rng.choices(range(1, args.products + 1), cum_weights=cum_weights, k=args.requests)
+    print(f"{args.products} products, {args.requests} product views, {len(set(ids))} distinct, "
+          f"local tier {args.max_entries} entries")
+
+    with FakeRedis() as fake:
+        run(engine, db, "no cache", new_cache(args.max_entries, enabled=False), ids)
+        run(engine, db, "local LRU", new_cache(args.max_entries), ids)
+        run(engine, db, "local LRU + redis", new_cache(args.max_entries, RedisTier(fake.url)), ids)
+        # a second process: empty local tier, the shared one is already warm
+        run(engine, db, "2nd process, warm redis", new_cache(args.max_entries, RedisTier(fake.url)), ids)
+        print(f"redis: {fake.size()} keys, calls {fake.calls}")
+
+        failures = []
+        hot = ids[0]
+        one, other = new_cache(args.max_entries, RedisTier(fake.url)), new_cache(args.max_entries, RedisTier(fake.url))
+        for cache in (one, other):
+            business.query_cache = cache
+            PriceHistoryService.get_price_comparison(db, hot)
+            ProductService.get_product_by_id(db, hot)
+
+        business.query_cache = one
+        PriceHistoryService.add_price_record(db, hot, "Target", 0.5)
+        db.expunge_all()
+        check(failures, PriceHistoryService.get_lowest_price(db, hot).price == 0.5,
+              "add_price_record: the writing process sees the new price")
+        business.query_cache = other
+        check(failures, other.shared.get(other.key("product", hot)) is None,
+              "add_price_record: the redis entries were invalidated")
+        other.local.clear()  # what its short local TTL does on its own
+        check(failures, PriceHistoryService.get_lowest_price(db, hot).price == 0.5,
+              "add_price_record: another process sees it once its local entry is gone (redis was invalidated)")
+        business.query_cache.check_versions({hot: ("moved",)})
+        check(failures, other.local.get(other.key("offers", hot)) is None,
+              "check_versions drops entries older than the ETag's data version")
+
+        business.query_cache = one
+        missing_id = args.products + 1
+        check(failures, ProductService.get_product_by_id(db, missing_id) is None, "a missing product is a miss")
+        created = ProductService.create_product(db, "Cache Test", "new", "Phones")
+        check(failures, ProductService.get_product_by_id(db, created.id).name == "Cache Test",
+              "create_product: the new product is found")
+
+        product, offers = asyncio.run(async_reads(str(engine.url), hot))
+        check(failures, product is not None and product.id == hot and min(o.price for o in offers) == 0.5,
+              "async reads share the cache")
+
+        # redis going away: every call still answers, from the database
+        fake.stop()
+        business.query_cache = other
+        other.local.clear()
+        errors_before = other.shared.errors
+        check(failures, PriceHistoryService.get_lowest_price(db, hot).price == 0.5 and
+              ProductService.get_product_by_id(db, ids[1]) is not None,
+              "redis down: reads fall back to the database")
+        check(failures, other.shared.errors == errors_before + 1 and not other.shared._up(),
+              "redis down: one error, then the tier is skipped until the retry time")
+        print(other.get_metrics())
+
+    db.close()
+    engine.dispose()
+    print("ok" if not failures else f"{len(failures)} failures")
+    sys.exit(0 if not failures else 1)
@@ -0,0 +1,107 @@
+# read_replicas.py - read routing against a primary and two replica sqlite files
+# the replicas are copies of the primary with product 1 renamed, so every response shows
+# which database served it. Checks round-robin, a dead replica dropping out and coming
+# back after the retry interval, and everything falling back to the primary.
+# usage: python -m benchmarks.read_replicas [--products 200] [--requests 40]
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+directory = tempfile.mkdtemp(prefix="pce-replicas-")
+PRIMARY = os.path.join(directory, "primary.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{PRIMARY}"
+os.environ["REFRESH_WORKER_ENABLED"] = "false"
+# product 1 has to come from whichever database was asked, not the query cache
+os.environ["QUERY_CACHE_ENABLED"] = "false"
+
+from collections import Counter
+
+import httpx
+from sqlalchemy import text
+
+import database
+from benchmarks._common import make_session, seed_catalog, timed
+from main import app
+
+DEAD = f"sqlite:///{os.path.join(directory, 'missing', 'replica.db')}"  # directory doesn't exist
+
+
+def make_replica(name):
+    path = os.path.join(directory, f"{name}.db")
+    shutil.copyfile(PRIMARY, path)
+    engine, Session = make_session(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE products SET name = :name WHERE id = 1"), {"name": name})
+    engine.dispose()
+    return f"sqlite:///{path}"
+
+
+def use_replicas(urls, retry_seconds=1.0):
+    database.read_router = database.ReplicaRouter(urls, retry_seconds)
+
+
+async def served_by(client, requests):
+    """Who answered `requests` reads, half on the async and half on the sync routes"""
+    seen = Counter()
+    for i in range(requests):
+        if i % 2:
+            seen[(await client.get("/api/products/1")).json()["name"]] += 1
+        else:
+            resp = await client.get("/api/products/debug/all-products")
+            seen[resp.json()[0]["name"]] += 1
+    return dict(seen)
+
+
+async def report(label, client, requests):
+    with timed() as t:
+        seen = await served_by(client, requests)
+    metrics = database.read_router.get_metrics()
+    health = ", ".join(f"{r['url'].rsplit('/', 1)[-1]} {'up' if r['healthy'] else 'down'}" for r in metrics["replicas"])
+    print(f"{label:<34} {seen}  [{health or 'no replicas'}]  {t['seconds'] * 1000 / requests:.1f} ms/request")
+
+
+async def run(replica_1, replica_2, requests):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replicas") as client:
+        use_replicas([])
+        await report("no replicas", client, requests)
+
+        use_replicas([replica_1, replica_2])
+        await report("two replicas", client, requests)
+
+        use_replicas([replica_1, DEAD, replica_2])
+        await report("one of three replicas dead", client, requests)
+
+        use_replicas([DEAD])
+        await report("only replica dead", client, requests)
+
+        # the dead replica's file shows up: it is retried after retry_seconds and rejoins
+        use_replicas([replica_1, DEAD])
+        await report("dead replica, before it recovers", client, requests)
+        dead_path = DEAD[len("sqlite:///"):]
+        os.makedirs(os.path.dirname(dead_path))
+        shutil.copyfile(replica_2[len("sqlite:///"):], dead_path)
+        time.sleep(1.1)
+        await report("after retry interval", client, requests)
+        await database.dispose_async_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=40)
+    args = parser.parse_args()
+
+    engine, Session = make_session(os.environ["DATABASE_URL"])
+    db = Session()
+    seed_catalog(db, args.products, points=5)
+    db.execute(text("UPDATE products SET name = 'primary' WHERE id = 1"))
+    db.commit()
+    db.close()
+    engine.dispose()
+    replica_1, replica_2 = make_replica("replica-1"), make_replica("replica-2")
+    asyncio.run(run(replica_1, replica_2, args.requests))
+    shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,82 @@
+# recommendations.py - per-request generate_recommendations vs the offline batch build
+# usage: python -m benchmarks.recommendations [--products 20000] [--legacy-sample 200] [--top-k 10]
+
+import argparse
+
+from benchmarks._common import make_session, seed_catalog, QueryCounter, timed
+from app.models.product import Product
+from app.models.recommendation import Recommendation
+from app.services import recommender
+from app.services.business import ProductService, PriceHistoryService, RecommendationService
+from sqlalchemy import and_
+
+
+def legacy_generate(db, product_id, limit):
+    # the old version: category scan + get_price_comparison per candidate, first `limit` only
+    current_product = ProductService.get_product_by_id(db, product_id)
+    prices = PriceHistoryService.get_price_comparison(db, product_id)
+    if not prices:
+        return []
+    avg_price = sum(p.price for p in prices) / len(prices)
+    similar_products = db.query(Product).filter(and_(
+        Product.category == current_product.category, Product.id != product_id)).all()
+    db.query(Recommendation).filter(Recommendation.product_id == product_id).delete()
+    recs = []
+    for similar_product in similar_products[:limit]:
+        similar_prices = PriceHistoryService.get_price_comparison(db, similar_product.id)
+        if similar_prices:
+            avg_similar = sum(p.price for p in similar_prices) / len(similar_prices)
+            score = 0.9 if avg_price * 0.7 <= avg_similar <= avg_price * 1.3 else 0.6
+            rec = Recommendation(product_id=product_id, recommended_product_id=similar_product.id,
+                                 recommendation_type="similar", score=score)
+            db.add(rec)
+            recs.append(rec)
+    db.commit()
+    return recs
+
+
+def legacy_serve(db, product_id):
+    recs = db.query(Recommendation).filter(Recommendation.product_id == product_id).all()
+    return [ProductService.get_product_by_id(db, rec.recommended_product_id) for rec in recs]
+
+
+def run(products, legacy_sample, top_k):
+    engine, Session = make_session()
+    db = Session()
+    seed_catalog(db, products, points=1)
+    print(f"\n== {products} products, top {top_k} ==")
+
+    if legacy_sample:
+        with QueryCounter(engine) as counter, timed() as t:
+            for product_id in range(1, legacy_sample + 1):
+                legacy_generate(db, product_id, top_k)
+        print(f"legacy generate x{legacy_sample:<8} {counter.count:>8} queries {t['seconds'] * 1000:>10.1f} ms "
+              f"(~{t['seconds'] / legacy_sample * products:.0f} s for the whole catalog)")
+        db.expunge_all()
+        with QueryCounter(engine) as counter, timed() as t:
+            legacy_serve(db, 1)
+        print(f"legacy serve (1 product)      {counter.count:>8} queries {t['seconds'] * 1000:>10.1f} ms")
+
+    with QueryCounter(engine) as counter, timed() as t:
+        rows = recommender.build_all(db, k=top_k)
+    print(f"batch build (all products)     {counter.count:>8} queries {t['seconds'] * 1000:>10.1f} ms  {rows} rows")
+
+    db.expunge_all()
+    with QueryCounter(engine) as counter, timed() as t:
+        recs = RecommendationService.get_recommendations_for_product(db, 1)
+    print(f"joined serve (1 product)      {counter.count:>8} queries {t['seconds'] * 1000:>10.1f} ms  {len(recs)} recs")
+    for rec in recs[:3]:
+        print(f"  -> {rec['product'].name} ({rec['product'].brand}, {rec['product'].tags}) "
+              f"{rec['type']} {rec['score']}")
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--legacy-sample", type=int, default=200, help="0 skips the legacy version")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    run(args.products, args.legacy_sample, args.top_k)
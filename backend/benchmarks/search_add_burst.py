@@ -0,0 +1,68 @@
+# search_add_burst.py - many concurrent POST /api/products/search-add for the same query
+# counts upstream eBay calls and inserted products with and without request coalescing.
+# Exits non-zero if the coalesced run made more than one upstream call or insert batch.
+# usage: python -m benchmarks.search_add_burst [--clients 50]
+
+import argparse
+import sys
+import tempfile
+import threading
+
+from benchmarks._common import make_session, timed
+from benchmarks.mock_retailers import MockRetailers
+from app.models.product import Product
+from app.services import aggregator
+from app.services.aggregator import DataAggregationService
+from app.services.search_cache import search_cache
+from app.services.singleflight import SingleFlight
+from config import settings
+
+
+def burst(Session, clients, query):
+    barrier = threading.Barrier(clients)
+    results = [None] * clients
+
+    def client(i):
+        db = Session()
+        try:
+            barrier.wait()
+            results[i] = sorted(p.id for p in DataAggregationService.search_products(query, db))
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    args = parser.parse_args()
+
+    failed = False
+    with MockRetailers({"eBay": 0.3}) as mock:
+        settings.ebay_api_base = mock.url
+        for label, flight in [("no coalescing", None), ("single-flight", SingleFlight(remember_for=30))]:
+            engine, Session = make_session(f"sqlite:///{tempfile.mkdtemp()}/burst.db?timeout=30")
+            search_cache.backend.clear()
+            mock.calls.clear()
+            # "no coalescing" runs every request straight through
+            aggregator.search_flight = flight or type("NoFlight", (), {"do": staticmethod(lambda key, fn: fn())})()
+
+            with timed() as t:
+                results = burst(Session, args.clients, "trending gadget")
+            db = Session()
+            inserted = db.query(Product).count()
+            db.close()
+            same = all(r == results[0] for r in results)
+            print(f"{label:<14} {args.clients} clients  {t['seconds'] * 1000:>7.1f} ms  "
+                  f"upstream calls {mock.calls.get('eBay', 0):>3}  products inserted {inserted:>4}  "
+                  f"all clients got the same rows: {same}")
+            if flight is not None:
+                failed = mock.calls.get("eBay", 0) != 1 or inserted != len(results[0]) or not same
+            engine.dispose()
+    sys.exit(1 if failed else 0)
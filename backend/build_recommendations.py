@@ -0,0 +1,26 @@
+# build_recommendations.py
+# Recomputes the top-k similar products for the whole catalog and stores them
+# in the recommendations table. Run after imports or on a nightly schedule.
+import argparse
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from database import SessionLocal, Base, engine
+from app.services import recommender
+import app.services.business  # registers every model
+from config import settings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild product recommendations")
+    parser.add_argument("--top-k", type=int, default=settings.recommendation_top_k,
+                        help="recommendations kept per product")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    start = time.perf_counter()
+    print("Building recommendations...")
+    count = recommender.build_all(db, k=args.top_k)
+    db.close()
+    print(f"Done. {count} recommendations in {time.perf_counter() - start:.1f}s.")
@@ -0,0 +1,21 @@
+# compact_price_history.py
+# Applies the price history retention policy: old raw prices become hourly buckets,
+# old hourly buckets become daily ones (see history_* settings). Safe to run repeatedly.
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from database import SessionLocal, Base, engine
+from app.services import compaction
+import app.services.business  # registers every model
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    start = time.perf_counter()
+    print("Compacting price history...")
+    stats = compaction.compact(db)
+    db.close()
+    for name, value in stats.items():
+        print(f"  {name}: {value}")
+    print(f"Done in {time.perf_counter() - start:.1f}s.")
@@ -1,8 +1,11 @@
 # create_tables_postgres.py
 # Run this script once after updating your DATABASE_URL to PostgreSQL
 from database import Base, engine
+from app.services.search_index import ensure_search_index
+import app.services.business  # noqa: F401 - registers every model on Base.metadata
 
 if __name__ == "__main__":
     print("Creating all tables in the PostgreSQL database...")
     Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
     print("Done.")
@@ -1,17 +1,297 @@
 # database.py - postgres connection setup
 # uses SQLAlchemy ORM, connection string from .env file
+# there's a sync engine (scripts, write routes, background jobs) and an asyncio engine for
+# the async read routes, pointing at the same database through asyncpg / aiosqlite.
+# Pool size / overflow / timeout / recycle / pre-ping and the statement timeout come from
+# config.Settings (db_*), and every pool records checkout waits for /metrics.
+# Read-only routes can use get_read_db / get_async_read_db instead, which round-robin over
+# settings.read_replica_urls and fall back to the primary when no replica answers.
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import functools
+import inspect
+import itertools
+import threading
+import time
+from collections import deque
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from config import settings
 
 DATABASE_URL = settings.database_url
 
-engine = create_engine(DATABASE_URL, echo=False)
+# recent checkout waits kept for the percentiles
+WAIT_SAMPLES = 1000
+
+
+class PoolStats:
+    """Checkout counters for one pool: how long callers waited for a connection,
+    how many gave up (pool timeout) and the most connections ever checked out at once"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def record(self, seconds: float, checked_out: int = None, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.waits.append(seconds)
+            if checked_out is not None:
+                self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self.waits)
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "peak_checked_out": self.peak_checked_out,
+                "wait_ms": {
+                    "avg": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                    "p50": round(waits[len(waits) // 2] * 1000, 3) if waits else 0.0,
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+                    "max": round(self.wait_max * 1000, 3),
+                },
+            }
+
+
+class _TimedCheckout:
+    # times Pool.connect(): waiting for a free slot, opening a new connection and the pre-ping
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool, keep the counters
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, is_async: bool = False):
+    """create_engine / create_async_engine keyword arguments for this url from the db_* settings"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # in-memory sqlite lives inside a single connection, leave SQLAlchemy's pool alone
+        return {}
+
+    # (for file sqlite this also replaces aiosqlite's default NullPool, which opens a
+    # connection and a thread per request)
+    options = dict(
+        poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    timeout_ms = settings.db_statement_timeout_ms
+    if backend == "postgresql" and timeout_ms:
+        # the server cancels any statement on these connections that runs longer than this
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout_ms}"}
+    return options
+
+
+def pool_metrics(engine):
+    """Size, current use and checkout waits of an engine's pool"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    metrics = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "overflow_in_use": max(pool.overflow(), 0),
+        "utilization": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        metrics.update(stats.snapshot())
+    return metrics
+
+
+engine = create_engine(DATABASE_URL, echo=False, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# asyncio driver per database
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(url: str):
+    """Same database, asyncio driver (postgresql+asyncpg, sqlite+aiosqlite), None if we don't know one"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return None
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = settings.async_database_url or async_database_url(DATABASE_URL)
+
+# created on first use, so scripts that never touch it don't need the async driver installed
+async_engine = None
+AsyncSessionLocal = None
+
+
+def get_async_engine():
+    global async_engine, AsyncSessionLocal
+    if async_engine is None:
+        if not ASYNC_DATABASE_URL:
+            raise RuntimeError("No async driver for this database, set ASYNC_DATABASE_URL")
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False,
+                                           **engine_options(ASYNC_DATABASE_URL, is_async=True))
+        # objects stay readable after the session closes, there's no lazy loading in async code
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return async_engine
+
+
+class Replica:
+    """One read replica: its own sync engine, an async engine made on first use, and health"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_engine(url, echo=False, **engine_options(url))
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_url = async_database_url(url)
+        self.async_engine = None
+        self.async_sessionmaker = None
+        self.healthy = True
+        self.retry_at = 0.0
+        self.reads = 0
+        self.failures = 0
+        self.last_error = None
+
+    def get_async_sessionmaker(self):
+        if self.async_engine is None:
+            if not self.async_url:
+                raise RuntimeError(f"No async driver for replica {self.name}")
+            self.async_engine = create_async_engine(self.async_url, echo=False,
+                                                    **engine_options(self.async_url, is_async=True))
+            self.async_sessionmaker = async_sessionmaker(self.async_engine, autoflush=False,
+                                                         expire_on_commit=False)
+        return self.async_sessionmaker
+
+
+class ReplicaRouter:
+    """Round-robin over the read replicas. A replica that fails to connect is skipped for
+    retry_seconds, then the next request that lands on it is its health check."""
+
+    def __init__(self, urls, retry_seconds: float = 30.0):
+        self.replicas = [Replica(url) for url in urls]
+        self.retry_seconds = retry_seconds
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+
+    def candidates(self):
+        """Replicas to try for one read, in round-robin order, skipping ones that are down"""
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._turn)
+        ordered = self.replicas[start % len(self.replicas):] + self.replicas[:start % len(self.replicas)]
+        return [replica for replica in ordered if replica.healthy or now >= replica.retry_at]
+
+    def mark_up(self, replica: Replica):
+        with self._lock:
+            replica.reads += 1
+            if replica.healthy:
+                return
+            replica.healthy = True
+        print(f"Read replica {replica.name} is back")
+
+    def mark_down(self, replica: Replica, error):
+        with self._lock:
+            replica.failures += 1
+            replica.last_error = f"{type(error).__name__}: {str(error)[:200]}"
+            replica.retry_at = time.monotonic() + self.retry_seconds
+            was_healthy, replica.healthy = replica.healthy, False
+        if was_healthy:
+            print(f"Read replica {replica.name} is down, reads go elsewhere for {self.retry_seconds:g}s: {error}")
+
+    def count_primary_read(self):
+        with self._lock:
+            self.primary_reads += 1
+
+    def get_metrics(self):
+        return {
+            "primary_reads": self.primary_reads,
+            "replicas": [
+                {"url": replica.name, "healthy": replica.healthy, "reads": replica.reads,
+                 "failures": replica.failures, "last_error": replica.last_error,
+                 "pool": pool_metrics(replica.engine),
+                 **({"async_pool": pool_metrics(replica.async_engine.sync_engine)} if replica.async_engine else {})}
+                for replica in self.replicas
+            ],
+        }
+
+
+read_router = ReplicaRouter(settings.read_replica_urls, settings.read_replica_retry_seconds)
+
+
+async def dispose_async_engine():
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = AsyncSessionLocal = None
+    for replica in read_router.replicas:
+        if replica.async_engine is not None:
+            await replica.async_engine.dispose()
+            replica.async_engine = replica.async_sessionmaker = None
+
+
+def get_metrics():
+    """Pool metrics for /metrics"""
+    metrics = {"primary": pool_metrics(engine)}
+    if async_engine is not None:
+        metrics["async"] = pool_metrics(async_engine.sync_engine)
+    if read_router.replicas:
+        metrics["read_replicas"] = read_router.get_metrics()
+    return metrics
+
 
 def get_db():
     db = SessionLocal()
@@ -19,3 +299,99 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _closes_sessions(endpoint):
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            for value in kwargs.values():
+                if isinstance(value, Session):
+                    value.close()
+    return wrapper
+
+
+class SessionRoute(APIRoute):
+    """Route class for the routers: a sync handler's session is closed as soon as the handler
+    returns. Otherwise its connection stays checked out until the response is serialized
+    (another threadpool job) and get_db's cleanup runs - under load the threadpool fills up
+    with handlers waiting for a connection, the requests holding them can't finish and the
+    pool times out. Handlers must return loaded data, nothing that lazy-loads afterwards."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _closes_sessions(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _replica_failed(replica, error):
+    # a replica that can't be reached is taken out of rotation, other errors are the caller's
+    if replica is not None and isinstance(error, exc.DBAPIError) and (
+            error.connection_invalidated or isinstance(error, exc.OperationalError)):
+        read_router.mark_down(replica, error)
+
+
+def get_read_db():
+    """get_db for read-only routes: a session on the next healthy read replica, or on the
+    primary when no replicas are configured or none of them connects. Never write with it."""
+    db, replica = None, None
+    for candidate in read_router.candidates():
+        session = candidate.sessionmaker()
+        try:
+            session.connection()  # checkout + pre-ping, so a dead replica fails here
+        except exc.DBAPIError as e:
+            session.close()
+            read_router.mark_down(candidate, e)
+            continue
+        read_router.mark_up(candidate)
+        db, replica = session, candidate
+        break
+    if db is None:
+        read_router.count_primary_read()
+        db = SessionLocal()
+    try:
+        yield db
+    except Exception as e:
+        _replica_failed(replica, e)
+        raise
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """Async get_read_db"""
+    db, replica = None, None
+    for candidate in read_router.candidates():
+        try:
+            session = candidate.get_async_sessionmaker()()
+        except RuntimeError as e:
+            read_router.mark_down(candidate, e)
+            continue
+        try:
+            await session.connection()
+        except (exc.DBAPIError, OSError) as e:
+            await session.close()
+            read_router.mark_down(candidate, e)
+            continue
+        read_router.mark_up(candidate)
+        db, replica = session, candidate
+        break
+    if db is None:
+        read_router.count_primary_read()
+        get_async_engine()
+        db = AsyncSessionLocal()
+    try:
+        yield db
+    except Exception as e:
+        _replica_failed(replica, e)
+        raise
+    finally:
+        await db.close()
@@ -0,0 +1,49 @@
+# dedupe_products.py
+# Finds products that are the same item listed by different retailers (or listed twice)
+# with the matching engine in app/services/matching.py and merges each group into its
+# oldest product. Use --dry-run first to see what would be merged.
+import argparse
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from database import SessionLocal, Base, engine
+from app.models.product import Product
+from app.services.business import ProductService
+from app.services.matching import ProductMatcher, Fingerprint, matcher
+from config import settings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge duplicate products")
+    parser.add_argument("--dry-run", action="store_true", help="only print the groups")
+    parser.add_argument("--threshold", type=float, default=settings.match_threshold)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    start = time.perf_counter()
+
+    # oldest product first, so it becomes the canonical one for its group
+    index = ProductMatcher(args.threshold)
+    groups = {}
+    names = {}
+    for product_id, name, brand in db.query(Product.id, Product.name, Product.brand).order_by(Product.id):
+        fingerprint = Fingerprint(name, brand)
+        canonical_id, _ = index.find(fingerprint)
+        names[product_id] = name
+        if canonical_id is None:
+            index.add(product_id, fingerprint)
+        else:
+            groups.setdefault(canonical_id, []).append(product_id)
+
+    merged = 0
+    for canonical_id, duplicate_ids in groups.items():
+        print(f"{canonical_id} {names[canonical_id]!r} <- {[names[d] for d in duplicate_ids]}")
+        if not args.dry_run:
+            merged += ProductService.merge_products(db, canonical_id, duplicate_ids)
+            for duplicate_id in duplicate_ids:
+                matcher.remove(duplicate_id)
+    db.close()
+
+    print(f"Done in {time.perf_counter() - start:.1f}s. {len(groups)} groups, "
+          f"{sum(len(d) for d in groups.values())} duplicates" + ("" if args.dry_run else f", {merged} merged."))
@@ -4,19 +4,56 @@
 from dotenv import load_dotenv
 load_dotenv()  # Load .env file
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import Base, engine
+import database
+from database import Base, engine, SessionLocal, dispose_async_engine
 from app.routes import products, prices, alerts, recommendations
+from app.services.business import PriceHistoryService
+from app.services.search_index import ensure_search_index
+from app.services.catalog import ensure_catalog
+from app.services import http_client
+from app.services.search_cache import search_cache
+from app.services.quota import quotas
+from app.services.aggregator import search_flight
+from app.services.refresh_worker import refresh_worker
+from app.services.alert_index import alert_index
+from app.services.notifier import notifier
+from app.services.matching import matcher
+from app.services import http_cache
+from app.services.query_cache import query_cache
 from config import settings
 
 # creates all the database tables if they dont exist
 Base.metadata.create_all(bind=engine)
+ensure_search_index(engine)
+ensure_catalog(engine)
+
+# fill current_offers from history the first time it exists
+with SessionLocal() as _db:
+    PriceHistoryService.ensure_current_offers(_db)
+
+
+# startup / shutdown hooks
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.refresh_worker_enabled:
+        refresh_worker.start()
+    yield
+    refresh_worker.stop()
+    notifier.stop()
+    # close pooled upstream connections cleanly
+    await http_client.aclose_clients()
+    await query_cache.aclose()
+    await dispose_async_engine()
+
 
 # create the fastapi app
 app = FastAPI(
     title="Price Comparison API",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # allow frontend to talk to backend (cors)
@@ -26,6 +63,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # register all the api routes
@@ -49,3 +87,20 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+# runtime counters - upstream connection pool usage etc
+@app.get("/metrics")
+def metrics():
+    return {
+        "http_client": http_client.get_metrics(),
+        "search_cache": search_cache.get_metrics(),
+        "quota": quotas.get_metrics(),
+        "search_coalescing": search_flight.get_metrics(),
+        "price_refresh": refresh_worker.get_metrics(),
+        "alerts": {"index": alert_index.get_metrics(), "notifier": notifier.get_metrics()},
+        "product_matching": matcher.get_metrics(),
+        "http_cache": http_cache.get_metrics(),
+        "query_cache": query_cache.get_metrics(),
+        "database": database.get_metrics()
+    }
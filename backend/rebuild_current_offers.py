@@ -0,0 +1,13 @@
+# rebuild_current_offers.py
+# Rebuilds the current_offers table (latest price per product per retailer)
+# from price_histories. Run after bulk imports that wrote history directly.
+from database import SessionLocal, Base, engine
+from app.services.business import PriceHistoryService
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    print("Rebuilding current_offers from price history...")
+    count = PriceHistoryService.rebuild_current_offers(db)
+    db.close()
+    print(f"Done. {count} current offers.")
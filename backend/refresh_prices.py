@@ -0,0 +1,29 @@
+# refresh_prices.py
+# Runs the background price refresh outside the api process (cron / systemd / a spare box).
+# --once does a single cycle and exits, otherwise it loops every refresh_poll_seconds.
+import argparse
+from dotenv import load_dotenv
+load_dotenv()
+
+from database import Base, engine
+from app.services.refresh_worker import refresh_worker
+from config import settings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh stale prices for tracked products")
+    parser.add_argument("--once", action="store_true", help="run one cycle and exit")
+    parser.add_argument("--batch-size", type=int, default=settings.refresh_batch_size,
+                        help="products per cycle")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    if args.once:
+        written = refresh_worker.run_once(args.batch_size)
+        print(f"Done. {written} prices written, {refresh_worker.queue_depth()} products still due.")
+        print(refresh_worker.get_metrics())
+    else:
+        settings.refresh_batch_size = args.batch_size
+        try:
+            refresh_worker.run_forever()
+        except KeyboardInterrupt:
+            print("Stopping.")
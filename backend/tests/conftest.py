@@ -0,0 +1,19 @@
+# conftest.py - the app under test runs on a throwaway sqlite file, set before anything imports config
+# run from backend/: python -m pytest -q
+
+import os
+import tempfile
+
+directory = tempfile.mkdtemp(prefix="pce-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'tests.db')}"
+os.environ["REFRESH_WORKER_ENABLED"] = "false"
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tables():
+    # what main.py does on startup, for tests that don't import the app
+    import database
+    from app.services.business import PriceHistoryService  # registers every model on Base.metadata
+    database.Base.metadata.create_all(bind=database.engine)
@@ -0,0 +1,40 @@
+# test_bulk_prices.py - PriceHistoryService.bulk_add_price_records with several records for one slot
+
+import pytest
+
+import database
+from app.models.current_offer import CurrentOffer
+from app.models.price_history import PriceHistory
+from app.services.business import ProductService, PriceHistoryService
+
+
+@pytest.fixture
+def db():
+    with database.SessionLocal() as db:
+        yield db
+
+
+def test_duplicate_slots_keep_the_cheapest(db):
+    product = ProductService.create_product(db, "Bulk Duplicate", "bulk test", "Phones")
+    ids = PriceHistoryService.bulk_add_price_records(db, [
+        {"product_id": product.id, "retailer": "Unknown", "price": 20.0},
+        {"product_id": product.id, "retailer": "Unknown", "price": 15.0},
+        {"product_id": product.id, "retailer": "Amazon", "price": 30.0},
+        {"product_id": product.id, "retailer": "Unknown", "price": 18.0},
+    ])
+    assert ids[0] is None and ids[3] is None
+    assert ids[1] is not None and ids[2] is not None
+
+    rows = db.query(PriceHistory.retailer, PriceHistory.price).filter(PriceHistory.product_id == product.id).all()
+    assert sorted(rows) == [("Amazon", 30.0), ("Unknown", 15.0)]
+    offer = db.query(CurrentOffer).filter_by(product_id=product.id, retailer="Unknown").one()
+    assert offer.price == 15.0
+
+
+def test_distinct_timestamps_are_all_written(db):
+    product = ProductService.create_product(db, "Bulk History", "bulk test", "Phones")
+    first = {"product_id": product.id, "retailer": "Amazon", "price": 10.0}
+    ids = PriceHistoryService.bulk_add_price_records(db, [first])
+    ids += PriceHistoryService.bulk_add_price_records(db, [dict(first, price=9.0)])
+    assert None not in ids
+    assert db.query(PriceHistory).filter(PriceHistory.product_id == product.id).count() == 2
@@ -0,0 +1,76 @@
+# test_conditional_get.py - a matching If-None-Match is answered 304 before the route runs (app/services/http_cache.py)
+
+import asyncio
+
+import httpx
+import pytest
+
+import database
+from app.services.business import ProductService, PriceHistoryService
+from main import app
+
+
+@pytest.fixture(scope="module")
+def product_id():
+    with database.SessionLocal() as db:
+        product = ProductService.create_product(db, "Conditional Phone", "etag test", "Phones")
+        PriceHistoryService.add_price_record(db, product.id, "Amazon", 499.0)
+        return product.id
+
+
+@pytest.fixture
+def route_calls(monkeypatch):
+    # counts the lookups GET /api/products/{id} makes, i.e. whether its handler ran
+    calls = []
+    original = ProductService.get_product_by_id_async
+
+    async def counting(db, product_id):
+        calls.append(product_id)
+        return await original(db, product_id)
+
+    monkeypatch.setattr(ProductService, "get_product_by_id_async", staticmethod(counting))
+    return calls
+
+
+def get_twice(url, second_headers=None, between=None):
+    """GET url, optionally run between(), then GET it again with the first ETag (plus second_headers)"""
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            first = await client.get(url)
+            if between is not None:
+                between()
+            headers = {"If-None-Match": first.headers["etag"], **(second_headers or {})}
+            second = await client.get(url, headers=headers)
+        await database.dispose_async_engine()
+        return first, second
+    return asyncio.run(go())
+
+
+def test_matching_etag_returns_304_without_running_the_route(product_id, route_calls):
+    first, second = get_twice(f"/api/products/{product_id}")
+    assert first.status_code == 200 and first.json()["name"] == "Conditional Phone"
+    assert route_calls == [product_id]
+
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == first.headers["etag"]
+    assert route_calls == [product_id]  # the handler didn't run for the 304
+
+
+def test_stale_etag_gets_a_full_response(product_id, route_calls):
+    first, second = get_twice(f"/api/products/{product_id}", {"If-None-Match": 'W/"stale"'})
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert len(route_calls) == 2
+
+
+def test_a_write_changes_the_etag(product_id):
+    def new_price():
+        with database.SessionLocal() as db:
+            PriceHistoryService.add_price_record(db, product_id, "Walmart", 450.0)
+
+    first, second = get_twice(f"/api/prices/comparison/{product_id}", between=new_price)
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert {offer["retailer"] for offer in second.json()} == {"Amazon", "Walmart"}
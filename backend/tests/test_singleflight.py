@@ -0,0 +1,107 @@
+# test_singleflight.py - concurrent identical work runs once (app/services/singleflight.py)
+
+import threading
+import time
+
+import pytest
+
+from benchmarks.mock_retailers import MockRetailers
+from app.services import aggregator
+from app.services.aggregator import DataAggregationService
+from app.services.search_cache import search_cache
+from app.services.singleflight import SingleFlight
+from database import SessionLocal
+from config import settings
+
+
+def run_concurrently(n, fn):
+    """fn(i) on n threads released together -> their results in order"""
+    barrier = threading.Barrier(n)
+    results, errors = [None] * n, []
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    executions = []
+
+    def fetch():
+        executions.append(1)
+        time.sleep(0.2)  # still running when the others ask
+        return ["result"]
+
+    results, errors = run_concurrently(20, lambda i: flight.do("iphone", fetch))
+    assert not errors
+    assert len(executions) == 1
+    assert results == [["result"]] * 20
+    assert flight.get_metrics()["shared"] == 19
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    def fetch(key):
+        time.sleep(0.2)
+        return [key]
+
+    results, errors = run_concurrently(4, lambda i: flight.do(i % 2, lambda: fetch(i % 2)))
+    assert not errors
+    assert flight.get_metrics()["executions"] == 2
+    assert results == [[0], [1], [0], [1]]
+
+
+def test_error_reaches_every_waiter_and_is_not_remembered():
+    flight = SingleFlight(remember_for=30)
+
+    def fail():
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    results, errors = run_concurrently(5, lambda i: flight.do("q", fail))
+    assert len(errors) == 5 and all(str(e) == "upstream down" for e in errors)
+    assert flight.do("q", lambda: ["ok"]) == ["ok"]
+
+
+def test_result_is_remembered_for_staggered_callers():
+    flight = SingleFlight(remember_for=30)
+    executions = []
+    flight.do("q", lambda: executions.append(1) or ["first"])
+    assert flight.do("q", lambda: executions.append(1) or ["second"]) == ["first"]
+    assert len(executions) == 1
+
+
+@pytest.fixture
+def mock_ebay(monkeypatch):
+    with MockRetailers({"eBay": 0.3}) as mock:
+        monkeypatch.setattr(settings, "ebay_api_base", mock.url)
+        monkeypatch.setattr(aggregator, "search_flight", SingleFlight(remember_for=30))
+        search_cache.backend.clear()
+        yield mock
+    search_cache.backend.clear()
+
+
+def test_search_add_burst_makes_one_upstream_call(mock_ebay):
+    def search_add(i):
+        db = SessionLocal()
+        try:
+            return sorted(p.id for p in DataAggregationService.search_products("single flight gadget", db))
+        finally:
+            db.close()
+
+    results, errors = run_concurrently(20, search_add)
+    assert not errors
+    assert mock_ebay.calls.get("eBay") == 1
+    assert results[0] and all(result == results[0] for result in results)
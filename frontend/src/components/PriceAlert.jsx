@@ -5,7 +5,8 @@ import React, { useState, useEffect } from 'react';
 import { alertService, priceService } from '../services/api';
 import './PriceAlert.css';
 
-export default function PriceAlert({ productId, onAlertCreated }) {
+// lowestPrice skips the /lowest request when the page already has it
+export default function PriceAlert({ productId, lowestPrice, onAlertCreated }) {
   // form data and existing alerts
   const [threshold, setThreshold] = useState('');
   const [retailer, setRetailer] = useState('');
@@ -15,8 +16,12 @@ export default function PriceAlert({ productId, onAlertCreated }) {
   // load alerts and current price when page opens
   useEffect(() => {
     fetchAlerts();
-    fetchCurrentPrice();
-  }, [productId]);
+    if (lowestPrice !== undefined) {
+      setCurrentPrice(lowestPrice);
+    } else {
+      fetchCurrentPrice();
+    }
+  }, [productId, lowestPrice]);
 
   // get all alerts from database
   const fetchAlerts = async () => {
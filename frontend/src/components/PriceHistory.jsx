@@ -4,12 +4,19 @@ import React, { useState, useEffect } from 'react';
 import { priceService } from '../services/api';
 import './PriceHistory.css';
 
-export default function PriceHistory({ productId }) {
-  const [history, setHistory] = useState([]);
-  const [loading, setLoading] = useState(true);
+// pass history to skip the request (the product page already loads it)
+export default function PriceHistory({ productId, history: loadedHistory }) {
+  const [history, setHistory] = useState(loadedHistory || []);
+  const [loading, setLoading] = useState(!loadedHistory);
 
   // get price history when page loads
   useEffect(() => {
+    if (loadedHistory) {
+      setHistory(loadedHistory);
+      setLoading(false);
+      return;
+    }
+
     const fetchHistory = async () => {
       try {
         // get last 30 days of prices
@@ -25,7 +32,7 @@ export default function PriceHistory({ productId }) {
     if (productId) {
       fetchHistory();
     }
-  }, [productId]);
+  }, [productId, loadedHistory]);
 
   if (loading) return <div className="no-data">Loading history...</div>;
   if (!history || history.length === 0) {
@@ -2,7 +2,7 @@
 
 import React, { useState, useEffect } from 'react';
 import { useParams } from 'react-router-dom';
-import { productService, priceService } from '../services/api';
+import { productService } from '../services/api';
 import PriceComparison from '../components/PriceComparison';
 import PriceHistory from '../components/PriceHistory';
 import PriceAlert from '../components/PriceAlert';
@@ -12,22 +12,25 @@ export default function ProductDetail() {
   // get the product id from the url (like /product/3)
   const { productId } = useParams();
   
-  // store the product info and prices
+  // store the product info, prices and history
   const [product, setProduct] = useState(null);
   const [prices, setPrices] = useState([]);
+  const [history, setHistory] = useState([]);
+  const [lowest, setLowest] = useState(null);
   const [loading, setLoading] = useState(true);
 
-  // runs when page opens, fetches product data
+  // runs when page opens, one request for everything on the page
   useEffect(() => {
     const fetchData = async () => {
       try {
-        // get the product details
-        const productRes = await productService.getById(productId);
-        setProduct(productRes.data);
-
-        // get prices from all retailers
-        const pricesRes = await priceService.getComparison(productId);
-        setPrices(pricesRes.data);
+        const res = await productService.getDetails([productId], 30);
+        const details = res.data.results[productId];
+        if (details) {
+          setProduct(details.product);
+          setPrices(details.offers);
+          setHistory(details.history);
+          setLowest(details.lowest);
+        }
       } catch (error) {
         console.error('Error fetching data:', error);
       } finally {
@@ -59,8 +62,8 @@ export default function ProductDetail() {
 
       {/* these are separate components for each section */}
       <PriceComparison prices={prices} />
-      <PriceHistory productId={productId} />
-      <PriceAlert productId={productId} />
+      <PriceHistory productId={productId} history={history} />
+      <PriceAlert productId={productId} lowestPrice={lowest ? lowest.price : null} />
     </div>
   );
 }
@@ -1,56 +1,102 @@
 // Products.jsx - shows all tracked products with search
+// filtering, sorting and paging happen on the server (/api/products/catalog),
+// the page only holds what has been loaded so far
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { productService } from '../services/api';
 import ProductCard from '../components/ProductCard';
 import './Products.css';
 
+const SORTS = [
+  { value: 'id', label: 'Recently added' },
+  { value: 'price', label: 'Lowest price' },
+  { value: '-price', label: 'Highest price' },
+  { value: 'discount', label: 'Biggest discount' },
+  { value: 'rating', label: 'Best rated' }
+];
+
 export default function Products() {
-  // state for products and filtering
+  // loaded products, the facet counts from the first page and the cursor for the next one
   const [products, setProducts] = useState([]);
-  const [filtered, setFiltered] = useState([]);
+  const [facets, setFacets] = useState(null);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // filters
   const [searchTerm, setSearchTerm] = useState('');
   const [category, setCategory] = useState('');
+  const [brand, setBrand] = useState('');
+  const [retailer, setRetailer] = useState('');
+  const [priceRange, setPriceRange] = useState('');
+  const [inStock, setInStock] = useState(false);
+  const [sort, setSort] = useState('id');
   const nav = useNavigate();
+  const request = useRef(0);
 
-  // load all products when page opens
+  const buildParams = () => {
+    const range = facets?.price.find(b => b.value === priceRange);
+    return {
+      q: searchTerm || undefined,
+      category: category ? [category] : undefined,
+      brand: brand ? [brand] : undefined,
+      retailer: retailer ? [retailer] : undefined,
+      min_price: range ? range.min : undefined,
+      max_price: range && range.max !== null ? range.max : undefined,
+      in_stock: inStock || undefined,
+      sort
+    };
+  };
+
+  // reload the first page whenever a filter changes (typing waits a moment)
   useEffect(() => {
-    loadProducts();
-  }, []);
+    const timer = setTimeout(loadProducts, searchTerm ? 250 : 0);
+    return () => clearTimeout(timer);
+  }, [searchTerm, category, brand, retailer, priceRange, inStock, sort]);
 
   const loadProducts = async () => {
+    const id = ++request.current;
+    setLoading(true);
     try {
-      const res = await productService.getAll();
-      setProducts(res.data);
-      setFiltered(res.data);
+      const res = await productService.getCatalog(buildParams());
+      if (id !== request.current) return;  // a newer filter change won
+      setProducts(res.data.items);
+      setFacets(res.data.facets);
+      setTotal(res.data.total);
+      setNextCursor(res.data.next_cursor);
     } catch (e) {
       console.log('failed to load products', e);
     } finally {
-      setLoading(false);
+      if (id === request.current) setLoading(false);
     }
   };
 
-  // filter products based on search and category
-  const handleFilter = () => {
-    let result = products;
-    
-    if (searchTerm) {
-      result = result.filter(p => 
-        p.name.toLowerCase().includes(searchTerm.toLowerCase())
-      );
-    }
-    
-    if (category) {
-      result = result.filter(p => p.category === category);
+  const loadMore = async () => {
+    const id = request.current;
+    setLoadingMore(true);
+    try {
+      const res = await productService.getCatalog({ ...buildParams(), cursor: nextCursor });
+      if (id !== request.current) return;
+      setProducts(prev => [...prev, ...res.data.items]);
+      setNextCursor(res.data.next_cursor);
+    } catch (e) {
+      console.log('failed to load more products', e);
+    } finally {
+      setLoadingMore(false);
     }
-    
-    setFiltered(result);
   };
 
-  // get unique categories from products
-  const categories = [...new Set(products.map(p => p.category))];
+  // dropdown of facet values with their counts
+  const facetSelect = (name, value, setValue, allLabel) => (
+    <select value={value} onChange={(e) => setValue(e.target.value)}>
+      <option value="">{allLabel}</option>
+      {(facets?.[name] || []).map(f => (
+        <option key={f.value} value={f.value}>{f.value} ({f.count})</option>
+      ))}
+    </select>
+  );
 
   return (
     <div className="products-page">
@@ -65,45 +111,52 @@ export default function Products() {
           type="text"
           placeholder="Filter by name..."
           value={searchTerm}
-          onChange={(e) => {
-            setSearchTerm(e.target.value);
-            setTimeout(handleFilter, 100);
-          }}
+          onChange={(e) => setSearchTerm(e.target.value)}
         />
-        <select
-          value={category}
-          onChange={(e) => {
-            setCategory(e.target.value);
-            setTimeout(handleFilter, 100);
-          }}
-        >
-          <option value="">All Categories</option>
-          {categories.map(cat => (
-            <option key={cat} value={cat}>{cat}</option>
+        {facetSelect('category', category, setCategory, 'All Categories')}
+        {facetSelect('brand', brand, setBrand, 'All Brands')}
+        {facetSelect('retailer', retailer, setRetailer, 'All Stores')}
+        {facetSelect('price', priceRange, setPriceRange, 'Any Price')}
+        <select value={sort} onChange={(e) => setSort(e.target.value)}>
+          {SORTS.map(s => (
+            <option key={s.value} value={s.value}>{s.label}</option>
           ))}
         </select>
+        <label className="stock-toggle">
+          <input type="checkbox" checked={inStock} onChange={(e) => setInStock(e.target.checked)} />
+          In stock only
+        </label>
       </div>
 
       {/* products grid */}
       {loading ? (
         <div className="loading">Loading...</div>
       ) : (
-        <div className="products-grid">
-          {filtered.length > 0 ? (
-            filtered.map(p => (
-              <ProductCard
-                key={p.id}
-                product={p}
-                onClick={() => nav(`/product/${p.id}`)}
-              />
-            ))
-          ) : (
-            <div className="no-results">
-              <p>No products tracked yet</p>
-              <p>Search for a product on the home page to start tracking prices</p>
+        <>
+          <div className="products-grid">
+            {products.length > 0 ? (
+              products.map(p => (
+                <ProductCard
+                  key={p.id}
+                  product={p}
+                  onClick={() => nav(`/product/${p.id}`)}
+                />
+              ))
+            ) : (
+              <div className="no-results">
+                <p>No products tracked yet</p>
+                <p>Search for a product on the home page to start tracking prices</p>
+              </div>
+            )}
+          </div>
+          {nextCursor && (
+            <div className="load-more">
+              <button onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : `Show more (${products.length} of ${total})`}
+              </button>
             </div>
           )}
-        </div>
+        </>
       )}
     </div>
   );
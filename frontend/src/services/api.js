@@ -14,10 +14,17 @@ const api = axios.create({
 
 export const productService = {
   getAll: () => api.get('/products/'),
+  // one filtered/sorted page + facet counts; list filters go out as ?category=a&category=b
+  getCatalog: (params) => api.get('/products/catalog', { params, paramsSerializer: { indexes: null } }),
   getTrending: () => api.get('/products/trending'),
   search: (query, category) => api.get('/products/search', { params: { q: query, category } }),
   searchAndAdd: (query) => api.post(`/products/search-add?q=${encodeURIComponent(query)}`),
   getById: (id) => api.get(`/products/${id}`),
+  // product + offers + lowest + best deal (+ history with historyDays) for one or many ids
+  getDetails: (ids, historyDays) => api.get('/products/details', {
+    params: { ids, history_days: historyDays },
+    paramsSerializer: { indexes: null }
+  }),
   create: (data) => api.post('/products/', data)
 };
 